@@ -3,11 +3,16 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import os
 import datetime
-from openpyxl import load_workbook
+from openpyxl import Workbook
 from openpyxl.drawing.image import Image as ExcelImage
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.chart import BarChart, Reference
 from matplotlib.backends.backend_pdf import PdfPages
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import (
+    TemplateWorkbook, read_raw_data_stream, read_sheet_stream, sum_hours, export_frame,
+    build_hours_cube, split_by_project, hours_by_project, build_config, sanitize_filename, MONTH_ORDER,
+    shard_policy, plan_shards, count_shards, shard_sheet_title, shard_file_path, manifest_entry,
+    write_manifest, write_shard_workbook, SHARD_ROW_BUDGET,
+    write_frame, bar_chart, unique_sheet_title, use_sheet_assembly, DeferredSheet, save_workbook,
+)
 
 sns.set(style="whitegrid")
 
@@ -24,9 +29,11 @@ def setup_paths():
     }
 
 def read_configs(path_dict):
-    year_mode_df = pd.read_excel(path_dict['template_file'], sheet_name='Config_Year_Mode', engine='openpyxl')
-    project_filter_df = pd.read_excel(path_dict['template_file'], sheet_name='Config_Project_Filter', engine='openpyxl')
+    year_mode_df = read_sheet_stream(path_dict['template_file'], 'Config_Year_Mode')
+    project_filter_df = read_sheet_stream(path_dict['template_file'], 'Config_Project_Filter')
+    return parse_configs(year_mode_df, project_filter_df)
 
+def parse_configs(year_mode_df, project_filter_df):
     if 'Key' not in year_mode_df.columns or 'Value' not in year_mode_df.columns:
         raise ValueError("⚠️ 'Config_Year_Mode' must have 'Key' and 'Value' columns.")
 
@@ -35,41 +42,18 @@ def read_configs(path_dict):
         if year_mode_df[year_mode_df['Key'].str.lower() == key].empty:
             raise ValueError(f"⚠️ Missing required key: '{key}' in 'Config_Year_Mode'")
 
-    mode = year_mode_df.loc[year_mode_df['Key'].str.lower() == 'mode', 'Value'].values[0].strip().lower()
-
-    year_row = year_mode_df.loc[year_mode_df['Key'].str.lower() == 'year', 'Value']
-    year = None
-    if not year_row.empty and pd.notna(year_row.values[0]):
-        try:
-            year = int(year_row.values[0])
-        except ValueError:
-            pass
-
-    months_row = year_mode_df.loc[year_mode_df['Key'].str.lower() == 'months', 'Value']
-    months = []
-    if not months_row.empty and pd.notna(months_row.values[0]):
-        months_raw = months_row.values[0]
-        months = [m.strip().capitalize() for m in str(months_raw).split(',') if m.strip()]
+    # Same parsing as the app (build_config); a missing year means all years here
+    config = build_config(year_mode_df, project_filter_df, all_years=True)
 
     print("⚙️ Loaded config:")
-    print("  Mode:", mode)
-    print("  Year:", year if year is not None else "All")
-    print("  Months:", months)
-
-    return {
-        'mode': mode,
-        'year': year,
-        'months': months,
-        'project_filter_df': project_filter_df
-    }
+    print("  Mode:", config['mode'])
+    print("  Year:", config['year'] if config['year'] is not None else "All")
+    print("  Months:", config['months'])
+    return config
 
 def load_raw_data(path_dict):
-    df = pd.read_excel(path_dict['template_file'], sheet_name='Raw Data', engine='openpyxl')
-    df.rename(columns={'Team member': 'Employee', 'Hou': 'Hours'}, inplace=True)
-    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-    df['Year'] = df['Date'].dt.year
-    df['MonthName'] = df['Date'].dt.month_name()
-    df['Week'] = df['Date'].dt.isocalendar().week
+    # Streamed read-only parse, including the derived Year/MonthName/Week columns
+    df = read_raw_data_stream(path_dict['template_file'])
     print(f"📥 Loaded raw data: {len(df)} rows")
     return df
 
@@ -78,28 +62,31 @@ def save_chart(fig, path):
     fig.savefig(path)
     plt.close(fig)
 
-def generate_general_charts(df, chart_dir):
+def generate_general_charts(cube, chart_dir):
+    # All charts roll up from the hours cube (see build_hours_cube)
     os.makedirs(chart_dir, exist_ok=True)
 
     fig, ax = plt.subplots(figsize=(10, 6))
-    df.groupby('Project name')['Hours'].sum().sort_values().plot(kind='barh', ax=ax, color='skyblue')
+    sum_hours(cube, 'Project name').sort_values().plot(kind='barh', ax=ax, color='skyblue')
     ax.set_title('Total Hours by Project')
     save_chart(fig, os.path.join(chart_dir, '1_project_hours.png'))
 
     fig, ax = plt.subplots(figsize=(10, 6))
-    df.groupby('Workcentre')['Hours'].sum().sort_values().plot(kind='barh', ax=ax, color='orange')
+    sum_hours(cube, 'Workcentre').sort_values().plot(kind='barh', ax=ax, color='orange')
     ax.set_title('Total Hours by Workcentre')
     save_chart(fig, os.path.join(chart_dir, '2_workcentre_hours.png'))
 
     fig, ax = plt.subplots(figsize=(10, 6))
-    df.groupby(df['Date'].dt.to_period('M'))['Hours'].sum().plot(marker='o', ax=ax, color='green')
+    monthly = sum_hours(cube, ['Year', 'MonthName'])
+    monthly.index = [f"{year}-{MONTH_ORDER.index(month) + 1:02d}" for year, month in monthly.index]
+    monthly.plot(marker='o', ax=ax, color='green')
     ax.set_title('Monthly Trend')
     save_chart(fig, os.path.join(chart_dir, '3_monthly_trend.png'))
 
-def generate_project_chart(df_proj, project_name, chart_project_dir):
+def generate_project_chart(workcentre_hours, project_name, chart_project_dir):
     os.makedirs(chart_project_dir, exist_ok=True)
     fig, ax = plt.subplots(figsize=(10, 6))
-    df_proj.groupby('Workcentre')['Hours'].sum().sort_values().plot(kind='barh', ax=ax, color='teal')
+    workcentre_hours.sort_values().plot(kind='barh', ax=ax, color='teal')
     ax.set_title(f'{project_name} - Hours by Workcentre')
     path = os.path.join(chart_project_dir, f"{project_name[:31]}.png")
     save_chart(fig, path)
@@ -126,32 +113,47 @@ def apply_filters(df, config):
     print(f"🔎 Filtered data: {len(df_filtered)} rows")
     return df_filtered
 
-def add_project_analysis_sheet(wb, df_project, project_name):
-    ws = wb.create_sheet(title=project_name[:31])
-
-    for r in dataframe_to_rows(df_project, index=False, header=True):
-        ws.append(r)
-
-    start_row = len(df_project) + 3
-    ws.cell(row=start_row, column=1, value="Workcentre")
-    ws.cell(row=start_row, column=2, value="Total Hours")
-
-    workcentre_summary = df_project.groupby('Workcentre')['Hours'].sum().reset_index()
-    for i, row in enumerate(workcentre_summary.itertuples(index=False), start=start_row + 1):
-        ws.cell(row=i, column=1, value=row.Workcentre)
-        ws.cell(row=i, column=2, value=row.Hours)
-
-    chart = BarChart()
-    chart.title = f"{project_name} - Hours by Workcentre"
-    chart.y_axis.title = "Hours"
-    chart.x_axis.title = "Workcentre"
-
-    data_ref = Reference(ws, min_col=2, min_row=start_row, max_row=i)
-    cats_ref = Reference(ws, min_col=1, min_row=start_row + 1, max_row=i)
-    chart.add_data(data_ref, titles_from_data=True)
-    chart.set_categories(cats_ref)
+def add_project_analysis_sheet(ws, df_project, workcentre_hours, project_name):
+    # Raw rows, one blank row, then the Workcentre table with its chart beside it
+    start_row = write_frame(ws, df_project) + 2
+    ws.append([])
+    ws.append(["Workcentre", "Total Hours"])
+    end_row = start_row + write_frame(ws, workcentre_hours.reset_index(), header=False)
+    if end_row > start_row:
+        ws.add_chart(bar_chart(ws, f"{project_name} - Hours by Workcentre", "Workcentre", "Hours",
+                               2, 1, start_row, end_row), f"E{start_row}")
+    return ws
+
+def add_charts_sheet(wb, chart_dirs):
+    ws = wb.create_sheet("Charts")
+    row = 1
+    col_offset = 7
+    sample_data = [("A", 10), ("B", 20), ("C", 15)]
 
-    ws.add_chart(chart, f"E{start_row}")
+    for folder in chart_dirs:
+        for chart_file in sorted(os.listdir(folder)):
+            chart_path = os.path.join(folder, chart_file)
+            if not os.path.isfile(chart_path):
+                continue
+            try:
+                img = ExcelImage(chart_path)
+            except Exception as e:
+                print(f"⚠️ Could not insert image/chart for {chart_file}: {e}")
+                continue
+            img.width = 640
+            img.height = 360
+            ws.add_image(img, f"A{row}")
+
+            # Write-only rows go top to bottom: the sample table, then blank rows up to the next image
+            padding = [None] * (col_offset - 1)
+            ws.append(padding + ["Workcentre", "Hours"])
+            for wc, hrs in sample_data:
+                ws.append(padding + [wc, hrs])
+            ws.add_chart(bar_chart(ws, f"Editable chart from {chart_file[:25]}", "Workcentre", "Hours",
+                                   col_offset + 1, col_offset, row, row + len(sample_data)), f"H{row}")
+            for _ in range(20 - len(sample_data) - 1):
+                ws.append([])
+            row += 20
 
 def export_all_charts_to_pdf(path_dict):
     chart_paths = []
@@ -179,70 +181,82 @@ def export_all_charts_to_pdf(path_dict):
 
 def export_report(df, config, path_dict):
     mode = config['mode']
+    # Summaries and charts roll up from one aggregate instead of re-grouping the raw rows
+    cube = build_hours_cube(df)
     if mode == 'year':
-        summary = df.groupby(['Year', 'Project name'])['Hours'].sum().reset_index()
+        summary = sum_hours(cube, ['Year', 'Project name']).reset_index()
     elif mode == 'month':
-        summary = df.groupby(['Year', 'MonthName', 'Project name'])['Hours'].sum().reset_index()
+        summary = sum_hours(cube, ['Year', 'MonthName', 'Project name']).reset_index()
     else:
-        summary = df.groupby(['Year', 'Week', 'Project name'])['Hours'].sum().reset_index()
-
-    generate_general_charts(df, path_dict['chart_dir'])
-
-    with pd.ExcelWriter(path_dict['output_file'], engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Raw_Data', index=False)
-        summary.to_excel(writer, sheet_name='Summary', index=False)
-
-    wb = load_workbook(path_dict['output_file'])
-
-    for project in df['Project name'].unique():
-        df_proj = df[df['Project name'] == project]
-        generate_project_chart(df_proj, project, path_dict['chart_project_dir'])
-        add_project_analysis_sheet(wb, df_proj, project)
-
-    ws = wb.create_sheet("Charts")
-    row = 1
-    col_offset = 7
-
-    for folder in [path_dict['chart_dir'], path_dict['chart_project_dir']]:
-        for chart_file in sorted(os.listdir(folder)):
-            chart_path = os.path.join(folder, chart_file)
-            if os.path.isfile(chart_path):
-                try:
-                    img = ExcelImage(chart_path)
-                    img.width = 640
-                    img.height = 360
-                    ws.add_image(img, f"A{row}")
-
-                    ws.cell(row=row, column=col_offset, value="Workcentre")
-                    ws.cell(row=row, column=col_offset + 1, value="Hours")
-                    sample_data = [("A", 10), ("B", 20), ("C", 15)]
-                    for i, (wc, hrs) in enumerate(sample_data, start=row + 1):
-                        ws.cell(row=i, column=col_offset, value=wc)
-                        ws.cell(row=i, column=col_offset + 1, value=hrs)
-
-                    chart = BarChart()
-                    chart.title = f"Editable chart from {chart_file[:25]}"
-                    chart.x_axis.title = "Workcentre"
-                    chart.y_axis.title = "Hours"
-                    data = Reference(ws, min_col=col_offset + 1, min_row=row, max_row=row + len(sample_data))
-                    cats = Reference(ws, min_col=col_offset, min_row=row + 1, max_row=row + len(sample_data))
-                    chart.add_data(data, titles_from_data=True)
-                    chart.set_categories(cats)
-                    ws.add_chart(chart, f"H{row}")
-
-                    row += 20
-                except Exception as e:
-                    print(f"⚠️ Could not insert image/chart for {chart_file}: {e}")
+        summary = sum_hours(cube, ['Year', 'Week', 'Project name']).reset_index()
+
+    generate_general_charts(cube, path_dict['chart_dir'])
+    df = export_frame(df)
+
+    # Raw rows beyond the row budget go to several sheets, or to separate streamed workbooks
+    shard_by, row_budget, target = shard_policy(config)
+    to_files = target == 'files'
+    sharded = to_files or shard_by != 'none' or count_shards(df, shard_by, row_budget) > 1
+    manifest = []
+
+    # Write-only workbook, every sheet streamed once in order; large data sheets are rendered
+    # in parallel and assembled into the package on save (see save_workbook)
+    wb = Workbook(write_only=True)
+    deferred = []
+    assemble = use_sheet_assembly(df)
+
+    def data_sheet(title):
+        ws = wb.create_sheet(title)
+        if assemble:
+            ws = DeferredSheet(ws)
+            deferred.append(ws)
+        return ws
+
+    for label, part in plan_shards(df, shard_by, row_budget):
+        if to_files:
+            part_path = shard_file_path(path_dict['output_file'], label)
+            manifest.extend(write_shard_workbook(part_path, part, label, raw_title='Raw_Data'))
+        else:
+            sheet = shard_sheet_title('Raw_Data', label)
+            write_frame(data_sheet(sheet), part)
+            manifest.append(manifest_entry(path_dict['output_file'], sheet, 'Raw_Data', label, part))
+    write_frame(wb.create_sheet('Summary'), summary)
+
+    # Split the rows by project once and get every project's Workcentre totals in one groupby
+    workcentre_hours = hours_by_project(cube, 'Workcentre')
+    for project, df_proj in split_by_project(df):
+        project_hours = workcentre_hours.get(project, pd.Series(name='Hours', index=pd.Index([], name='Workcentre')))
+        generate_project_chart(project_hours, project, path_dict['chart_project_dir'])
+        ws_proj = data_sheet(unique_sheet_title(wb, sanitize_filename(project)))
+        if to_files:
+            # The project's raw rows live in the part workbooks (see Manifest)
+            add_project_analysis_sheet(ws_proj, df_proj.iloc[:0], project_hours, project)
+            continue
+        # The Workcentre table sits below the first piece, so that piece leaves room for it
+        project_budget = min(row_budget, SHARD_ROW_BUDGET - len(project_hours) - 3)
+        for i, (label, part) in enumerate(plan_shards(df_proj, shard_by, project_budget)):
+            if i == 0:
+                add_project_analysis_sheet(ws_proj, part, project_hours, project)
+            else:
+                ws_proj = data_sheet(unique_sheet_title(wb, sanitize_filename(project)))
+                write_frame(ws_proj, part)
+            if sharded:
+                manifest.append(manifest_entry(path_dict['output_file'], ws_proj.title, project, label, part))
+
+    add_charts_sheet(wb, [path_dict['chart_dir'], path_dict['chart_project_dir']])
 
     ws_config = wb.create_sheet("Config_Info")
-    ws_config['A1'], ws_config['B1'] = "Mode", config['mode']
-    ws_config['A2'], ws_config['B2'] = "Year", str(config['year']) if config['year'] is not None else "All"
-    ws_config['A3'], ws_config['B3'] = "Months", ', '.join(config['months']) if config['months'] else 'All'
-    ws_config['A4'], ws_config['B4'] = "Included Projects", ', '.join(
+    ws_config.append(["Mode", config['mode']])
+    ws_config.append(["Year", str(config['year']) if config['year'] is not None else "All"])
+    ws_config.append(["Months", ', '.join(config['months']) if config['months'] else 'All'])
+    ws_config.append(["Included Projects", ', '.join(
         config['project_filter_df'][config['project_filter_df']['Include'].str.lower() == 'yes']['Project Name']
-    )
+    )])
+    if sharded:
+        ws_config.append(["Sharding", f"{shard_by} / {row_budget} rows / {target}"])
+        write_manifest(wb.create_sheet("Manifest"), manifest)
 
-    wb.save(path_dict['output_file'])
+    save_workbook(wb, path_dict['output_file'], deferred)
     print(f"✅ Excel report saved: {path_dict['output_file']}")
 
     export_all_charts_to_pdf(path_dict)
@@ -252,8 +266,10 @@ def main():
     if not os.path.exists(path_dict['template_file']):
         print(f"❌ Template file not found: {path_dict['template_file']}")
         return
-    df_raw = load_raw_data(path_dict)
-    config = read_configs(path_dict)
+    with TemplateWorkbook(path_dict['template_file']) as template:
+        df_raw = template.read_raw_data()
+        config = parse_configs(template.read_year_mode(), template.read_project_filter())
+    print(f"📥 Loaded raw data: {len(df_raw)} rows")
     df_filtered = apply_filters(df_raw, config)
     if df_filtered.empty:
         print("⚠️ No data after filtering. Please check your config.")
@@ -1,19 +1,43 @@
 import pandas as pd
 from datetime import datetime
 import os
-from openpyxl import load_workbook
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import Cell, WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.utils.datetime import to_excel
+from openpyxl.styles.numbers import builtin_format_code, is_date_format, is_timedelta_format
+from openpyxl.styles import Font
 from openpyxl.chart import BarChart, Reference, LineChart
-from openpyxl.utils.dataframe import dataframe_to_rows
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
+from openpyxl.worksheet.filters import AutoFilter
+from openpyxl.worksheet.hyperlink import Hyperlink
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
 from fpdf import FPDF
 from matplotlib import pyplot as plt
 import tempfile
 import re
+import warnings
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape, quoteattr
 import shutil
 from pandas import Series
 import traceback
 import numpy as np
+from pandas.api.types import union_categoricals
 import smtplib
+import hashlib
+import json
+import io
+import glob
+import sqlite3
+import threading
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque, OrderedDict
 from email.mime.text import MIMEText
+import pyarrow.parquet as pq
 
 # Hàm hỗ trợ làm sạch tên file/sheet
 def sanitize_filename(name):
@@ -24,16 +48,30 @@ def sanitize_filename(name):
     s = ''.join(c for c in s if c.isprintable())
     return s[:31] # Giới hạn 31 ký tự cho tên sheet trong Excel
 
-def setup_paths():
-    """Thiết lập các đường dẫn file đầu vào và đầu ra."""
+# Biến môi trường chỉ định nguồn dữ liệu: một file, một thư mục hoặc glob (vd: "data/Time_report_*.xlsm")
+TEMPLATE_SOURCE_ENV = "TIME_REPORT_SOURCE"
+
+def setup_paths(template_source=None):
+    """Thiết lập các đường dẫn file đầu vào và đầu ra.
+
+    `template_source` có thể là một file template, một thư mục hoặc một mẫu glob chứa nhiều
+    workbook (vd: mỗi năm / mỗi site một file); mặc định lấy từ biến môi trường TIME_REPORT_SOURCE.
+    """
     today = datetime.today().strftime('%Y%m%d')
     return {
-        'template_file': "Time_report.xlsm",
+        'template_file': template_source or os.environ.get(TEMPLATE_SOURCE_ENV, "Time_report.xlsm"),
         'output_file': f"Time_report_Standard_{today}.xlsx",
         'pdf_report': f"Time_report_Standard_{today}.pdf",
         'comparison_output_file': f"Time_report_Comparison_{today}.xlsx",
         'comparison_pdf_report': f"Time_report_Comparison_{today}.pdf",
-        'logo_path': "triac_logo.png" # Thêm đường dẫn logo
+        'logo_path': "triac_logo.png", # Thêm đường dẫn logo
+        # "memory" (mặc định): DataFrame trong bộ nhớ; "sqlite": TimesheetStore dùng chung
+        'backend': os.environ.get("TIME_REPORT_BACKEND", "memory"),
+        # "chunked": dữ liệu thô được nạp và tổng hợp theo từng khối (dùng SQLite store, xem load_store)
+        'aggregation': os.environ.get("TIME_REPORT_AGGREGATION", "memory"),
+        # Cache file báo cáo đã xuất (xem ReportCache); dung lượng tối đa tính bằng MB
+        'report_cache_dir': os.environ.get("TIME_REPORT_CACHE_DIR", REPORT_CACHE_DIR),
+        'report_cache_mb': int(os.environ.get("TIME_REPORT_CACHE_MB", REPORT_CACHE_MAX_MB)),
     }
 def get_comparison_pdf_path(comparison_mode, base_path):
     if comparison_mode in ["So Sánh Dự Án Trong Một Tháng", "Compare Projects in a Month"]:
@@ -55,90 +93,2615 @@ def get_comparison_excel_path(comparison_mode, base_path):
     else:
         return base_path
 
-def read_configs(template_file):
-    """Đọc cấu hình từ file template Excel."""
+def _default_config():
+    return {'mode': 'year', 'year': datetime.now().year, 'months': [], 'project_filter_df': pd.DataFrame(columns=['Project Name', 'Include'])}
+
+def build_config(year_mode_df, project_filter_df, all_years=False):
+    """Dựng dict cấu hình từ hai sheet 'Config_Year_Mode' và 'Config_Project_Filter'.
+
+    Thiếu năm (hoặc năm không hợp lệ): năm hiện tại, hoặc None (mọi năm) nếu `all_years`.
+    """
+    # Xử lý mode, year, months an toàn hơn
+    mode_row = year_mode_df.loc[year_mode_df['Key'].str.lower() == 'mode', 'Value']
+    mode = str(mode_row.values[0]).strip().lower() if not mode_row.empty and pd.notna(mode_row.values[0]) else 'year'
+
+    year_row = year_mode_df.loc[year_mode_df['Key'].str.lower() == 'year', 'Value']
+    year = None if all_years else datetime.now().year
+    if not year_row.empty and pd.notna(year_row.values[0]):
+        try:
+            year = int(year_row.values[0])
+        except (TypeError, ValueError):
+            pass
+
+    months_row = year_mode_df.loc[year_mode_df['Key'].str.lower() == 'months', 'Value']
+    months = [m.strip().capitalize() for m in str(months_row.values[0]).split(',') if m.strip()] \
+        if not months_row.empty and pd.notna(months_row.values[0]) else []
+
+    if 'Include' in project_filter_df.columns:
+        project_filter_df['Include'] = project_filter_df['Include'].astype(str).str.lower()
+
+    config = {
+        'mode': mode,
+        'year': year,
+        'months': months,
+        'project_filter_df': project_filter_df
+    }
+    # Khóa tùy chọn: chính sách chia nhỏ dữ liệu thô (xem shard_policy) và bố cục file Excel (EXCEL_LAYOUTS)
+    for key in ('shard_by', 'shard_rows', 'shard_target', 'layout'):
+        row = year_mode_df.loc[year_mode_df['Key'].str.lower() == key, 'Value']
+        if not row.empty and pd.notna(row.values[0]):
+            config[key] = str(row.values[0]).strip()
+    return config
+
+def read_configs(template_file, engine="stream"):
+    """Đọc cấu hình từ file template Excel (với nguồn nhiều workbook: từ workbook cấu hình)."""
     try:
-        year_mode_df = pd.read_excel(template_file, sheet_name='Config_Year_Mode', engine='openpyxl')
-        project_filter_df = pd.read_excel(template_file, sheet_name='Config_Project_Filter', engine='openpyxl')
-
-        # Xử lý mode, year, months an toàn hơn
-        mode_row = year_mode_df.loc[year_mode_df['Key'].str.lower() == 'mode', 'Value']
-        mode = str(mode_row.values[0]).strip().lower() if not mode_row.empty and pd.notna(mode_row.values[0]) else 'year'
-
-        year_row = year_mode_df.loc[year_mode_df['Key'].str.lower() == 'year', 'Value']
-        year = int(year_row.values[0]) if not year_row.empty and pd.notna(year_row.values[0]) and pd.api.types.is_number(year_row.values[0]) else datetime.datetime.now().year
-        
-        months_row = year_mode_df.loc[year_mode_df['Key'].str.lower() == 'months', 'Value']
-        months = [m.strip().capitalize() for m in str(months_row.values[0]).split(',')] if not months_row.empty and pd.notna(months_row.values[0]) else []
-        
-        if 'Include' in project_filter_df.columns:
-            project_filter_df['Include'] = project_filter_df['Include'].astype(str).str.lower()
-
-        return {
-            'mode': mode,
-            'year': year,
-            'months': months,
-            'project_filter_df': project_filter_df
-        }
+        template_file = config_workbook(template_file)
+        if engine == "stream":
+            year_mode_df = read_sheet_stream(template_file, 'Config_Year_Mode')
+            project_filter_df = read_sheet_stream(template_file, 'Config_Project_Filter')
+        else:
+            year_mode_df = pd.read_excel(template_file, sheet_name='Config_Year_Mode', engine='openpyxl')
+            project_filter_df = pd.read_excel(template_file, sheet_name='Config_Project_Filter', engine='openpyxl')
+        return build_config(year_mode_df, project_filter_df)
     except FileNotFoundError:
         print(f"Lỗi: Không tìm thấy file template tại {template_file}")
-        return {'mode': 'year', 'year': datetime.datetime.now().year, 'months': [], 'project_filter_df': pd.DataFrame(columns=['Project Name', 'Include'])}
+        return _default_config()
     except Exception as e:
         print(f"Lỗi khi đọc cấu hình: {e}")
-        return {'mode': 'year', 'year': datetime.datetime.now().year, 'months': [], 'project_filter_df': pd.DataFrame(columns=['Project Name', 'Include'])}
+        return _default_config()
+
+# Các cột phân loại dạng chữ trong sheet 'Raw Data' (sau khi đổi tên cột)
+DIMENSION_COLUMNS = ['Project name', 'Workcentre', 'Task', 'Job', 'Team', 'Team leader', 'Employee']
+MONTH_ORDER = ['January', 'February', 'March', 'April', 'May', 'June',
+               'July', 'August', 'September', 'October', 'November', 'December']
+
+# Schema gọn cho DataFrame dữ liệu thô trong bộ nhớ:
+# - các cột phân loại + MonthName: category (MonthName có thứ tự cố định theo tháng)
+# - Hours: float32, Year: int16, Week: int8 (tuần ISO <= 53)
+NUMERIC_SCHEMA = {'Hours': 'float32', 'Year': 'int16', 'Week': 'int8', 'Sheet row': 'int32'}
+# Số dòng gốc trong sheet 'Raw Data' của mỗi dòng dữ liệu (truy vết cảnh báo); không ghi ra báo cáo
+SHEET_ROW_COLUMN = 'Sheet row'
+MONTH_DTYPE = pd.CategoricalDtype(MONTH_ORDER, ordered=True)
+# Số chữ số thập phân giữ lại khi cộng giờ (bỏ nhiễu float32)
+HOURS_DECIMALS = 4
+
+def apply_compact_schema(df):
+    """Ép DataFrame dữ liệu thô về schema gọn (category / float32 / số nguyên nhỏ)."""
+    for col in DIMENSION_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            # Tập category được sắp xếp để mã category ổn định giữa các lần load
+            categories = sorted(df[col].dropna().unique())
+            # Khối toàn giá trị trống vẫn giữ kiểu chuỗi cho category, để ghép (union) được với khối khác
+            categories = pd.Index(categories) if categories else pd.Index([], dtype=str)
+            df[col] = df[col].astype(pd.CategoricalDtype(categories))
+    if 'MonthName' in df.columns and df['MonthName'].dtype != MONTH_DTYPE:
+        df['MonthName'] = df['MonthName'].astype(MONTH_DTYPE)
+    for col, dtype in NUMERIC_SCHEMA.items():
+        if col in df.columns:
+            df[col] = df[col].astype(dtype)
+    return df
+
+def concat_compact(frames):
+    """Ghép nhiều DataFrame cùng schema gọn, hợp nhất category thay vì rơi về kiểu object."""
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    # Các workbook có thể thiếu cột (vd: file cũ không có 'Team leader') -> lấy hợp các cột
+    all_columns = list(dict.fromkeys(col for f in frames for col in f.columns))
+    columns = {}
+    for col in all_columns:
+        parts = [f[col] if col in f.columns else pd.Series(np.nan, index=f.index, dtype=object) for f in frames]
+        dtypes = {p.dtype for p in parts}
+        if len(dtypes) > 1 and all(isinstance(d, pd.CategoricalDtype) and not d.ordered for d in dtypes):
+            columns[col] = pd.Series(union_categoricals(parts, sort_categories=True), name=col)
+        else:
+            columns[col] = pd.concat(parts, ignore_index=True)
+    return apply_compact_schema(pd.DataFrame(columns))
+
+def sum_hours(df, by, sort=True):
+    """Tổng giờ theo nhóm `by` (tên cột hoặc danh sách tên cột).
+
+    Nhóm trên mã category (observed=True: chỉ các tổ hợp có dữ liệu) và cộng dồn bằng
+    float64 vì cột 'Hours' được lưu dạng float32.
+    """
+    keys = [df[c] for c in by] if isinstance(by, (list, tuple)) else df[by]
+    return df['Hours'].astype('float64').groupby(keys, observed=True, sort=sort).sum().round(HOURS_DECIMALS)
+
+def export_frame(df):
+    """Bản sao để ghi ra Excel: cột giờ float32 được đổi lại float64 đã làm tròn (tránh 5.78000020980835).
+
+    Cột số dòng gốc (SHEET_ROW_COLUMN) chỉ dùng nội bộ nên được bỏ.
+    """
+    if SHEET_ROW_COLUMN in df.columns:
+        df = df.drop(columns=SHEET_ROW_COLUMN)
+    hour_cols = [c for c in ('Hours', 'Total Hours') if c in df.columns and df[c].dtype == 'float32']
+    if not hour_cols:
+        return df
+    return df.assign(**{c: df[c].astype('float64').round(HOURS_DECIMALS) for c in hour_cols})
+
+# =======================================
+# CUBE GIỜ CÔNG (TỔNG HỢP SẴN)
+# =======================================
+# Độ chi tiết của cube: mọi biểu đồ / báo cáo chỉ cần group theo các cột này
+CUBE_DIMENSIONS = ['Year', 'MonthName', 'Week', 'Project name', 'Team', 'Team leader',
+                   'Workcentre', 'Task', 'Job', 'Employee']
+
+def build_hours_cube(df):
+    """Tổng giờ theo CUBE_DIMENSIONS, dựng một lần cho mỗi phiên bản dữ liệu.
+
+    Cube có cùng tên cột với dữ liệu thô nên các hàm lọc / biểu đồ (apply_filters, sum_hours, ...)
+    dùng được trực tiếp trên cube. Dòng có chiều bị trống vẫn được giữ (dropna=False) để tổng khớp.
+    """
+    dims = [c for c in CUBE_DIMENSIONS if c in df.columns]
+    if df.empty or 'Hours' not in df.columns:
+        return pd.DataFrame(columns=dims + ['Hours'])
+    cube = (df['Hours'].astype('float64')
+            .groupby([df[c] for c in dims], observed=True, dropna=False, sort=False).sum()
+            .reset_index())
+    print(f"🧊 Cube giờ công: {len(df)} dòng -> {len(cube)} dòng")
+    return apply_compact_schema(cube)
+
+def split_by_project(df):
+    """Chia frame theo 'Project name' trong một lần groupby: các cặp (dự án, frame con).
+
+    Thứ tự dự án theo lần xuất hiện đầu tiên (như `unique()`); dòng không có dự án bị bỏ qua.
+    """
+    if df.empty or 'Project name' not in df.columns:
+        return []
+    return df.groupby('Project name', sort=False, observed=True)
+
+def hours_by_project(df, by):
+    """Tổng giờ theo `by` cho từng dự án, tính bằng một groupby cho mọi dự án.
+
+    Trả về dict dự án -> Series giờ (index là `by`, cùng thứ tự với `sum_hours`).
+    """
+    if df.empty or 'Project name' not in df.columns or by not in df.columns:
+        return {}
+    totals = sum_hours(df, ['Project name', by])
+    return {project: part.droplevel(0) for project, part in totals.groupby(level=0, sort=False, observed=True)}
+
+# =======================================
+# PIVOT GIỜ CÔNG (MA TRẬN + DÒNG / CỘT TỔNG)
+# =======================================
+def pivot_dimension(df, dim):
+    """Cột dùng làm chiều pivot; 'YearMonth' được dựng từ Year + MonthName dạng "YYYY-MM" (đúng thứ tự thời gian)."""
+    if dim != 'YearMonth' or 'YearMonth' in df.columns:
+        return df[dim]
+    month_num = df['MonthName'].astype(MONTH_DTYPE).cat.codes.astype('int64') + 1
+    label = df['Year'].astype('int64').astype(str) + '-' + month_num.astype(str).str.zfill(2)
+    return label.where(month_num > 0).rename('YearMonth')
+
+def pivot_hours(df, rows, columns=None, measure='Hours', margins=True, margins_name='Total', row_label=None):
+    """Ma trận giờ dày đặc `rows` x `columns` (tháng, YearMonth, tuần, task, workcentre, dự án, ...).
+
+    Một groupby + unstack cho toàn bộ ma trận; với `margins`, cột tổng (`margins_name`) và dòng tổng
+    (nhãn `row_label`, mặc định `margins_name`, ở cột `rows` đầu tiên) được cộng bằng numpy.
+    Không có `columns` -> một cột giá trị tên `margins_name`.
+    Trả về DataFrame phẳng: các cột `rows`, các cột giá trị, cột tổng.
+    """
+    rows = [rows] if isinstance(rows, str) else list(rows)
+    keys = [pivot_dimension(df, r) for r in rows] + ([pivot_dimension(df, columns)] if columns else [])
+    totals = pd.to_numeric(df[measure], errors='coerce').astype('float64').groupby(
+        keys, observed=True, sort=True).sum()
+    if columns:
+        matrix = totals.unstack(fill_value=0)
+        matrix.columns = matrix.columns.astype(object)
+        matrix.columns.name = None
+        if margins:
+            matrix[margins_name] = matrix.to_numpy().sum(axis=1)
+    else:
+        matrix = totals.to_frame(margins_name)
+    matrix = matrix.round(HOURS_DECIMALS)
+
+    table = matrix.reset_index()
+    table[rows] = table[rows].astype(object)
+    if margins:
+        total_row = dict(zip(rows, [row_label or margins_name] + [''] * (len(rows) - 1)))
+        total_row.update(zip(matrix.columns, matrix.to_numpy().sum(axis=0).round(HOURS_DECIMALS)))
+        table.loc[len(table)] = total_row
+    return table
+
+# =======================================
+# CHÊNH LỆCH GIỮA HAI KỲ (PERIOD OVER PERIOD)
+# =======================================
+# Các chiều có thể dùng để tính chênh lệch; một kỳ là (năm, tháng) hoặc (năm, None) cho cả năm
+DELTA_DIMENSIONS = ['Project name', 'Workcentre', 'Task', 'Employee']
+DELTA_COLUMNS = ['Previous Hours', 'Current Hours', 'Change', 'Change %']
+
+def previous_period(period):
+    """Kỳ liền trước: tháng trước (qua năm nếu là January) hoặc năm trước nếu kỳ là cả năm."""
+    year, month = period
+    if not month:
+        return (year - 1, None)
+    index = MONTH_ORDER.index(month)
+    return (year - 1, MONTH_ORDER[-1]) if index == 0 else (year, MONTH_ORDER[index - 1])
+
+def period_label(period):
+    """Nhãn hiển thị của kỳ: "June 2025" hoặc "2025"."""
+    year, month = period
+    return f"{month} {year}" if month else str(year)
+
+def period_mask(df, period):
+    year, month = period
+    mask = df['Year'].astype('int64') == int(year)
+    if month:
+        mask &= df['MonthName'] == month
+    return mask
+
+def compute_period_delta(df, current, previous=None, by='Project name'):
+    """Giờ của hai kỳ và chênh lệch theo `by` (một hoặc nhiều cột trong DELTA_DIMENSIONS).
+
+    Dòng của hai kỳ được gắn nhãn bằng mask rồi cộng trong một lần pivot (`by` x kỳ), nên các nhóm
+    chỉ có ở một kỳ vẫn thẳng hàng với 0 giờ ở kỳ kia; Change / Change % là một phép trừ trên cả
+    cột. Change % để trống khi kỳ trước bằng 0. Dòng cuối 'Total' là tổng của hai kỳ.
+    """
+    previous = previous or previous_period(current)
+    by = [by] if isinstance(by, str) else list(by)
+    is_current, is_previous = period_mask(df, current), period_mask(df, previous)
+    in_periods = is_current | is_previous
+    tagged = df[in_periods].assign(
+        Period=np.where(is_current[in_periods], 'Current Hours', 'Previous Hours'))
+
+    table = pivot_hours(tagged, by, 'Period', margins_name='Total', row_label='Total').drop(columns='Total')
+    table = table.reindex(columns=by + DELTA_COLUMNS[:2], fill_value=0.0)
+    previous_hours, current_hours = table['Previous Hours'].to_numpy(), table['Current Hours'].to_numpy()
+    change = current_hours - previous_hours
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change_pct = np.where(previous_hours != 0, change / previous_hours * 100, np.nan)
+    table['Change'] = change.round(HOURS_DECIMALS)
+    table['Change %'] = change_pct.round(1)
+    return table
+
+# =======================================
+# DỮ LIỆU PHÂN CẤP CHO TREEMAP
+# =======================================
+# Số nút con giữ lại dưới mỗi nút cha (mặc định); phần còn lại gộp vào nút "Other"
+HIERARCHY_TOP_N = 15
+HIERARCHY_OTHER_LABEL = "Other"
+HIERARCHY_UNKNOWN_LABEL = "Unknown"
+
+def _aggregate_hierarchy(table, path_levels):
+    grouped = table.groupby(path_levels, dropna=False, observed=True, sort=False)
+    return grouped.agg({'Hours': 'sum', 'Team leader': 'first'}).reset_index()
+
+def build_hierarchy_table(df, path_levels, top_n=None, other_label=HIERARCHY_OTHER_LABEL):
+    """Bảng lá (leaf) của cây phân cấp: một dòng cho mỗi đường dẫn `path_levels`, cộng sẵn giờ.
+
+    Với `top_n`, ở mỗi cấp chỉ giữ `top_n` nút con nhiều giờ nhất của mỗi nút cha; các nút còn lại
+    gộp vào một nút lá `other_label` (các cấp sâu hơn để trống). Số dòng tỉ lệ với số nút hiển thị.
+    """
+    leader = df['Team leader'] if 'Team leader' in df.columns else HIERARCHY_UNKNOWN_LABEL
+    table = pd.DataFrame({col: df[col].astype(object).fillna(HIERARCHY_UNKNOWN_LABEL) for col in path_levels})
+    table['Hours'] = df['Hours'].astype('float64').to_numpy()
+    table['Team leader'] = pd.Series(leader, index=df.index).astype(object).fillna(HIERARCHY_UNKNOWN_LABEL)
+    table = _aggregate_hierarchy(table, path_levels)
+
+    if top_n:
+        for i, col in enumerate(path_levels):
+            parents = path_levels[:i]
+            active = table[col].notna()
+            nodes = table[active].groupby(parents + [col], observed=True, sort=False)['Hours'].sum()
+            if parents:
+                rank = nodes.groupby(level=list(range(len(parents))), sort=False).rank(method='first', ascending=False)
+            else:
+                rank = nodes.rank(method='first', ascending=False)
+            folded_nodes = rank.index[rank.to_numpy() > top_n]
+            if len(folded_nodes) == 0:
+                continue
+            if parents:
+                in_folded = pd.MultiIndex.from_frame(table[parents + [col]]).isin(folded_nodes)
+            else:
+                in_folded = table[col].isin(folded_nodes).to_numpy()
+            folded = active.to_numpy() & in_folded
+            table.loc[folded, col] = other_label
+            table.loc[folded, path_levels[i + 1:]] = None
+            table = _aggregate_hierarchy(table, path_levels)
+
+    table['Hours'] = table['Hours'].round(HOURS_DECIMALS)
+    return table[table['Hours'] != 0].reset_index(drop=True)
+
+# =======================================
+# BẢNG LỊCH (CALENDAR DIMENSION)
+# =======================================
+# Các cột lịch được gắn vào dữ liệu thô
+CALENDAR_COLUMNS = ['Year', 'MonthName', 'Week']
+
+def build_calendar_table(dates):
+    """Bảng lịch theo ngày: Year, MonthNum, MonthName, Week (ISO), WeekStart/WeekEnd, WeekLabel.
+
+    Chỉ tính trên các ngày khác nhau (vài trăm) thay vì trên từng dòng dữ liệu.
+    """
+    # to_datetime: danh sách rỗng (sheet không có cột 'Date') cũng thành cột ngày giờ
+    days = pd.DatetimeIndex(pd.to_datetime(pd.Series(dates)).dropna().dt.normalize().unique()).sort_values()
+    week = days.isocalendar().week.to_numpy().astype('int8')
+    week_start = days - pd.to_timedelta(days.weekday, unit='D')
+    week_end = week_start + pd.Timedelta(days=6)
+    calendar_df = pd.DataFrame({
+        'Date': days,
+        'Year': days.year.astype('int16'),
+        'MonthNum': days.month.astype('int8'),
+        'MonthName': pd.Categorical(days.month_name(), dtype=MONTH_DTYPE),
+        'Week': week,
+        'WeekStart': week_start,
+        'WeekEnd': week_end,
+    })
+    calendar_df['WeekLabel'] = ("Week " + calendar_df['Week'].astype(str)
+                                + " (" + calendar_df['WeekStart'].dt.strftime('%d/%m')
+                                + " → " + calendar_df['WeekEnd'].dt.strftime('%d/%m') + ")")
+    return calendar_df
+
+def add_calendar_columns(df):
+    """Gắn Year/MonthName/Week cho từng dòng bằng cách join theo ngày với bảng lịch."""
+    codes, days = pd.factorize(df['Date'].dt.normalize(), sort=True)
+    calendar_df = build_calendar_table(days)
+    # `days` đã là các ngày khác nhau, sắp xếp tăng dần -> mã factorize chính là vị trí trong bảng lịch
+    for col in CALENDAR_COLUMNS:
+        df[col] = calendar_df[col].array.take(codes)
+    return df
+
+def week_labels(calendar_df, year, month_num):
+    """{tuần ISO: nhãn 'Week N (dd/mm → dd/mm)'} cho các tuần có ngày thuộc tháng `month_num` năm `year`."""
+    days = calendar_df[(calendar_df['Year'] == year) & (calendar_df['MonthNum'] == month_num)]
+    days = days.drop_duplicates('Week')
+    return dict(zip(days['Week'].astype(int), days['WeekLabel']))
 
-def load_raw_data(template_file):
-    """Tải dữ liệu thô từ file template Excel."""
+# =======================================
+# KIỂM TRA DỮ LIỆU KHI NẠP (VALIDATION)
+# =======================================
+# Dòng bị loại ('rejected') không vào dataset; dòng 'warning' vẫn được giữ nhưng được liệt kê
+HOURS_RANGE = (0, 24)
+REQUIRED_DIMENSIONS = ['Project name']
+# Thiếu một trong các cột này thì không dòng nào dùng được: cả sheet bị loại, lỗi ghi ở dòng header
+REQUIRED_COLUMNS = ['Date', 'Hours'] + REQUIRED_DIMENSIONS
+HEADER_ROW = 1
+DUPLICATE_REASON = "Duplicate row"
+# Các cột giữ lại trong bảng dòng bị loại (giá trị gốc dạng chuỗi)
+REJECTED_VALUE_COLUMNS = ['Date', 'Employee', 'Project name', 'Task', 'Hours']
+REJECTED_COLUMNS = ['Row', 'Severity', 'Reason'] + REJECTED_VALUE_COLUMNS
+
+def _issue_rows(df, mask, severity, reason):
+    """Các dòng thỏa `mask` dưới dạng bảng lỗi gọn; index của df là số dòng trong sheet."""
+    bad = df.loc[mask]
+    issues = pd.DataFrame({'Row': pd.array(bad.index, dtype='Int64'), 'Severity': severity, 'Reason': reason})
+    for col in REJECTED_VALUE_COLUMNS:
+        values = bad[col] if col in bad.columns else pd.Series(None, index=bad.index, dtype=object)
+        issues[col] = values.astype(object).map(str, na_action='ignore').to_numpy()
+    return issues
+
+def validate_raw_frame(df, dates, hours):
+    """Kiểm tra một khối dữ liệu thô bằng mask trên cả cột (không lặp từng dòng).
+
+    Trả về (mask_dòng_bị_loại, danh sách bảng lỗi).
+    """
+    checks = [('rejected', "Invalid or missing date", dates.isna()),
+              ('rejected', "Missing or non-numeric hours", hours.isna())]
+    for col in REQUIRED_DIMENSIONS:
+        values = df[col] if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+        missing = values.isna() | (values.astype(str).str.strip() == '')
+        checks.append(('rejected', f"Missing {col}", missing))
+    low, high = HOURS_RANGE
+    checks.append(('warning', f"Hours outside {low}-{high}", hours.notna() & ~hours.between(low, high)))
+
+    rejected = pd.Series(False, index=df.index)
+    issues = []
+    for severity, reason, mask in checks:
+        if mask.any():
+            issues.append(_issue_rows(df, mask, severity, reason))
+            if severity == 'rejected':
+                rejected |= mask
+    return rejected, issues
+
+def missing_column_issues(columns, missing):
+    """Bảng lỗi khi sheet thiếu cột bắt buộc: một dòng lỗi cho mỗi cột thiếu, gắn với dòng header."""
+    found = ', '.join(map(str, columns)) or "none"
+    issues = pd.DataFrame({
+        'Row': pd.array([HEADER_ROW] * len(missing), dtype='Int64'),
+        'Severity': 'rejected',
+        'Reason': [f"Missing required column '{col}' (all rows rejected; columns found: {found})" for col in missing],
+    })
+    for col in REJECTED_VALUE_COLUMNS:
+        issues[col] = None
+    return issues
+
+def find_duplicate_rows(df):
+    """Cảnh báo các dòng trùng hoàn toàn với một dòng trước đó (dòng vẫn được giữ).
+
+    Số dòng gốc lấy từ cột SHEET_ROW_COLUMN (không tính cột này khi so trùng).
+    """
+    if df.empty:
+        return pd.DataFrame(columns=REJECTED_COLUMNS)
+    values = df.drop(columns=SHEET_ROW_COLUMN, errors='ignore')
+    duplicated = values.duplicated(keep='first')
+    issues = _issue_rows(values, duplicated, 'warning', DUPLICATE_REASON)
+    if SHEET_ROW_COLUMN in df.columns:
+        issues['Row'] = pd.array(df.loc[duplicated, SHEET_ROW_COLUMN].to_numpy(), dtype='Int64')
+    else:
+        issues['Row'] = pd.array([pd.NA] * len(issues), dtype='Int64')
+    return issues
+
+def build_rejected_rows(df, rejects):
+    """Gộp lỗi của từng khối với cảnh báo dòng trùng trên toàn bộ dataset."""
+    parts = [r for r in rejects if not r.empty] + [find_duplicate_rows(df)]
+    parts = [p for p in parts if not p.empty]
+    if not parts:
+        return pd.DataFrame(columns=REJECTED_COLUMNS)
+    # Lỗi thiếu cột được mỗi khối ghi lại một lần -> bỏ dòng lỗi trùng
+    rejected_rows = pd.concat(parts, ignore_index=True)[REJECTED_COLUMNS].drop_duplicates(ignore_index=True)
+    rejected_rows['Row'] = rejected_rows['Row'].astype('Int64')
+    for reason in rejected_rows.loc[rejected_rows['Row'] == HEADER_ROW, 'Reason']:
+        print(f"❌ Sheet 'Raw Data': {reason}")
+    return rejected_rows.sort_values('Row', kind='stable', ignore_index=True)
+
+def _normalize_raw_frame(df, rejects=None):
+    """Chuẩn hóa tên cột, kiểu dữ liệu và các cột dẫn xuất (Year/MonthName/Week, lấy từ bảng lịch).
+
+    Dòng không hợp lệ bị loại (xem `validate_raw_frame`); nếu truyền list `rejects` thì bảng lỗi
+    của khối được thêm vào đó. Index của `df` (số dòng trong sheet) được giữ lại ở cột SHEET_ROW_COLUMN.
+    Thiếu cột bắt buộc (REQUIRED_COLUMNS) -> mọi dòng bị loại, trả về DataFrame rỗng.
+    """
+    df.columns = df.columns.astype(str).str.strip()
+    df.rename(columns={'Hou': 'Hours', 'Team member': 'Employee', 'Project Name': 'Project name'}, inplace=True)
+
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        if rejects is not None:
+            rejects.append(missing_column_issues(df.columns, missing))
+        return pd.DataFrame()
+
+    dates = pd.to_datetime(df['Date'], errors='coerce')
+    hours = pd.to_numeric(df['Hours'], errors='coerce')
+    rejected, issues = validate_raw_frame(df, dates, hours)
+    if rejects is not None:
+        rejects.extend(issues)
+
+    keep = ~rejected
+    df = df[keep].copy()
+    df['Date'] = dates[keep]
+    df['Hours'] = hours[keep]
+    df[SHEET_ROW_COLUMN] = df.index
+
+    add_calendar_columns(df)
+
+    # Cột phân loại có thể lẫn số và chữ (vd: 'Job') -> luôn đưa về chuỗi để kiểu dữ liệu ổn định
+    for col in DIMENSION_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+
+    return apply_compact_schema(df.infer_objects())
+
+def load_raw_data(template_file, use_snapshot=True, engine="stream", chunk_size=None, incremental=True):
+    """Tải dữ liệu thô từ file template Excel.
+
+    Nếu snapshot của sheet 'Raw Data' còn khớp fingerprint của file template thì đọc
+    snapshot (parquet) thay vì parse lại XML; ngược lại parse file và ghi snapshot mới.
+    `engine="stream"` đọc sheet bằng openpyxl read-only theo từng khối dòng (ít tốn RAM),
+    `engine="pandas"` dùng pd.read_excel như trước.
+    Với engine stream và `incremental=True`, khi file đổi chỉ các dòng mới nối thêm được parse.
+    `template_file` cũng có thể là thư mục hoặc glob nhiều workbook (xem `load_workbooks`).
+    """
     try:
-        df = pd.read_excel(template_file, sheet_name='Raw Data', engine='openpyxl')
-        df.columns = df.columns.str.strip()
-        df.rename(columns={'Hou': 'Hours', 'Team member': 'Employee', 'Project Name': 'Project name'}, inplace=True)
-        
-        df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-        df = df.dropna(subset=['Date']) # Loại bỏ hàng không có ngày hợp lệ
-        
-        df['Year'] = df['Date'].dt.year
-        df['MonthName'] = df['Date'].dt.month_name()
-        df['Week'] = df['Date'].dt.isocalendar().week.astype(int)
-        
-        # Đảm bảo cột 'Hours' là số
-        df['Hours'] = pd.to_numeric(df['Hours'], errors='coerce').fillna(0)
-        
+        if is_multi_workbook_source(template_file):
+            paths = resolve_workbooks(template_file)
+            return load_workbooks(paths, use_snapshot, chunk_size, incremental, with_config=False, engine=engine)[0]
+
+        fingerprint = None
+        if use_snapshot:
+            df, fingerprint = load_raw_data_snapshot(template_file)
+            if df is not None:
+                return df
+
+        ingest_state = None
+        if engine == "stream":
+            previous = load_previous_snapshot(template_file) if use_snapshot and incremental else None
+            rejects = []
+            with TemplateWorkbook(template_file, chunk_size) as template:
+                df, ingest_state = _ingest_raw_data(template, previous, rejects)
+            rejected_rows = build_rejected_rows(df, rejects)
+        else:
+            df = pd.read_excel(template_file, sheet_name='Raw Data', engine='openpyxl', dtype=object)
+            df.index = df.index + 2  # số dòng trong sheet (dòng 1 là header)
+            rejects = []
+            df = _normalize_raw_frame(df, rejects).reset_index(drop=True)
+            rejected_rows = build_rejected_rows(df, rejects)
+
+        if use_snapshot:
+            save_raw_data_snapshot(template_file, df, fingerprint, ingest_state=ingest_state,
+                                   rejected_rows=rejected_rows)
         return df
     except Exception as e:
         print(f"Lỗi khi tải dữ liệu thô: {e}")
         return pd.DataFrame()
 
-def apply_filters(df, config):
-    """Áp dụng các bộ lọc dữ liệu dựa trên cấu hình."""
-    df_filtered = df.copy()
+# =======================================
+# ĐỌC STREAMING (openpyxl read-only)
+# =======================================
+# Số dòng mỗi khối khi đọc streaming; RAM đỉnh ~ một khối + các cột kết quả
+RAW_DATA_CHUNK_SIZE = 5000
+
+def _sheet_columns(header_row):
+    return [str(c).strip() if c is not None else f"Unnamed: {i}" for i, c in enumerate(header_row)]
+
+def iter_sheet_chunks(ws, chunk_size=RAW_DATA_CHUNK_SIZE, min_row=None):
+    """Đọc worksheet (read-only) theo từng khối `chunk_size` dòng, mỗi khối là một DataFrame kiểu object.
+
+    Dòng đầu tiên là header; các dòng trống hoàn toàn bị bỏ qua. Index của mỗi khối là số dòng trong sheet.
+    `min_row` (tùy chọn): chỉ đọc các dòng dữ liệu từ dòng này trở đi.
+    """
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = _sheet_columns(header)
+    n_cols = len(columns)
+    start = 2
+    if min_row is not None and min_row > start:
+        rows.close()
+        rows, start = ws.iter_rows(min_row=min_row, values_only=True), min_row
+
+    chunk, row_numbers = [], []
+    for idx, row in enumerate(rows, start=start):
+        if not any(v is not None for v in row):
+            continue
+        if len(row) != n_cols:
+            row = (tuple(row) + (None,) * n_cols)[:n_cols]
+        chunk.append(row)
+        row_numbers.append(idx)
+        if len(chunk) >= chunk_size:
+            yield pd.DataFrame(chunk, columns=columns, index=row_numbers, dtype=object)
+            chunk, row_numbers = [], []
+    if chunk:
+        yield pd.DataFrame(chunk, columns=columns, index=row_numbers, dtype=object)
+
+def _sheet_to_frame(ws):
+    """Đọc toàn bộ một sheet nhỏ (vd: sheet cấu hình) thành DataFrame."""
+    chunks = list(iter_sheet_chunks(ws))
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks, ignore_index=True).infer_objects()
+
+def _read_raw_data_sheet(ws, chunk_size=RAW_DATA_CHUNK_SIZE, rejects=None, min_row=None):
+    """Chuyển sheet 'Raw Data' thành DataFrame: mỗi khối được chuẩn hóa kiểu rồi dồn vào buffer theo cột."""
+    column_buffers = {}
+    for chunk in iter_sheet_chunks(ws, chunk_size, min_row):
+        typed = _normalize_raw_frame(chunk, rejects)
+        for col in typed.columns:
+            column_buffers.setdefault(col, []).append(typed[col])
+        del chunk, typed
+
+    if not column_buffers:
+        return pd.DataFrame()
 
-    # ✅ Lọc theo nhiều năm nếu có
-    if 'years' in config and config['years']:  # Dành cho so sánh nhiều năm
-        df_filtered = df_filtered[df_filtered['Year'].isin(config['years'])]
+    # Ghép từng cột một rồi giải phóng buffer của cột đó ngay; cột category được hợp nhất
+    # (union) để không bị chuyển về object
+    columns = {}
+    for col in list(column_buffers):
+        parts = column_buffers.pop(col)
+        if len({p.dtype for p in parts}) > 1 and isinstance(parts[0].dtype, pd.CategoricalDtype):
+            columns[col] = pd.Series(union_categoricals(parts, sort_categories=True), name=col)
+        else:
+            columns[col] = pd.concat(parts, ignore_index=True)
+    return apply_compact_schema(pd.DataFrame(columns))
 
-    # ✅ Lọc theo 1 hoặc nhiều năm nếu là báo cáo tiêu chuẩn
-    elif 'year' in config and config['year']:  # Dành cho báo cáo tiêu chuẩn
-        if isinstance(config['year'], list):
-            df_filtered = df_filtered[df_filtered['Year'].isin(config['year'])]
+def read_raw_data_stream(template_file, chunk_size=RAW_DATA_CHUNK_SIZE):
+    """Đọc sheet 'Raw Data' bằng openpyxl read-only (iter_rows values_only) theo từng khối dòng."""
+    wb = load_workbook(template_file, read_only=True, data_only=True)
+    try:
+        df = _read_raw_data_sheet(wb['Raw Data'], chunk_size)
+    finally:
+        wb.close()
+    print(f"📥 Đọc streaming dữ liệu thô: {len(df)} dòng")
+    return df
+
+def read_sheet_stream(template_file, sheet_name):
+    """Đọc một sheet bằng openpyxl read-only, không dựng toàn bộ DOM của workbook."""
+    wb = load_workbook(template_file, read_only=True, data_only=True)
+    try:
+        return _sheet_to_frame(wb[sheet_name])
+    finally:
+        wb.close()
+
+# =======================================
+# INGEST TĂNG DẦN (CHỈ ĐỌC CÁC DÒNG MỚI NỐI THÊM)
+# =======================================
+# XML của sheet 'Raw Data' được đọc thẳng từ gói zip theo từng khối cố định (RAM không phụ thuộc kích
+# thước sheet). Phần đã ingest (header đến dòng có dữ liệu cuối cùng) được nhận diện bằng digest:
+# XML các dòng với chỉ số shared string được thay bằng chính chuỗi đó (Excel đánh số lại bảng shared
+# strings mỗi lần lưu), kèm các style ngày / giờ. Mọi sửa / xóa ở bất kỳ dòng cũ nào -> đọc lại toàn bộ.
+# Các dòng mới vẫn do openpyxl đọc (xem _AppendedRowsWorksheet), chỉ các dòng cũ bị bỏ khỏi luồng XML.
+SHEET_XML_BLOCK_SIZE = 1 << 20
+_XML_ROW_START = re.compile(rb'<row[\s>]')
+_XML_ROW_NUMBER = re.compile(rb'\sr="(\d+)"')
+_XML_SHARED_STRING_REF = re.compile(rb'( t="s"[^>]*>\s*<v>)(\d+)</v>')
+_XML_SHARED_STRING_INDEX = re.compile(rb' t="s"[^>]*>\s*<v>(\d+)</v>')
+_XML_CELL_CONTENT = re.compile(rb'<v>|<is>')
+_XML_SHEET_DATA_END = re.compile(rb'</sheetData>|<sheetData\s*/>')
+
+def cell_date_styles(archive):
+    """Style (chỉ số cellXfs) có định dạng ngày / giờ: {style: True nếu là khoảng thời gian}.
+
+    Đọc thẳng xl/styles.xml, cùng quy tắc với openpyxl khi đọc workbook.
+    """
+    try:
+        styles = ET.fromstring(archive.read('xl/styles.xml'))
+    except KeyError:
+        return {}
+    custom = {int(fmt.get('numFmtId')): fmt.get('formatCode')
+              for fmt in styles.iterfind('main:numFmts/main:numFmt', XLSX_NS)}
+    cell_xfs = styles.find('main:cellXfs', XLSX_NS)
+    date_styles = {}
+    for idx, xf in enumerate(cell_xfs if cell_xfs is not None else []):
+        fmt_id = int(xf.get('numFmtId', 0))
+        fmt = custom.get(fmt_id) or builtin_format_code(fmt_id)
+        if fmt and is_date_format(fmt):
+            date_styles[idx] = is_timedelta_format(fmt)
+    return date_styles
+
+def iter_sheet_xml(src, block_size=None):
+    """Đọc XML một worksheet (file-like) theo khối `block_size` byte, cắt đúng ranh giới thẻ <row>.
+
+    Trả về các (loại, bytes): 'head' (trước thẻ <row> đầu tiên), 'rows' (một hoặc nhiều thẻ <row>
+    trọn vẹn) và 'tail' (từ </sheetData> đến hết).
+    """
+    block_size = block_size or SHEET_XML_BLOCK_SIZE
+    buffer, in_rows = b'', False
+    for block in iter(lambda: src.read(block_size), b''):
+        buffer += block
+        if not in_rows:
+            first_row = _XML_ROW_START.search(buffer)
+            data_end = _XML_SHEET_DATA_END.search(buffer)
+            if data_end and (first_row is None or data_end.start() < first_row.start()):
+                # Sheet không có dòng nào
+                yield 'head', buffer
+                buffer = b''
+                break
+            if first_row is None:
+                continue
+            yield 'head', buffer[:first_row.start()]
+            buffer, in_rows = buffer[first_row.start():], True
+        data_end = _XML_SHEET_DATA_END.search(buffer)
+        if data_end:
+            yield 'rows', buffer[:data_end.start()]
+            buffer = buffer[data_end.start():]
+            break
+        # Thẻ <row> cuối cùng có thể chưa trọn -> giữ lại cho khối sau
+        cut = buffer.rfind(b'<row')
+        while cut > 0 and buffer[cut + 4:cut + 5] not in (b' ', b'>', b'\t', b'\r', b'\n'):
+            cut = buffer.rfind(b'<row', 0, cut)
+        if cut > 0:
+            yield 'rows', buffer[:cut]
+            buffer = buffer[cut:]
+    for block in iter(lambda: src.read(block_size), b''):
+        buffer += block
+    if buffer:
+        yield ('rows' if in_rows and not _XML_SHEET_DATA_END.match(buffer) else 'tail'), buffer
+
+def _row_starts(xml):
+    return [m.start() for m in _XML_ROW_START.finditer(xml)]
+
+def _row_number(xml, start):
+    """Số dòng của thẻ <row> bắt đầu tại `start` (thuộc tính r); ValueError nếu thiếu."""
+    match = _XML_ROW_NUMBER.search(xml, start, xml.find(b'>', start))
+    if match is None:
+        raise ValueError("thẻ <row> thiếu số dòng")
+    return int(match.group(1))
+
+def _first_row_after(xml, starts, row):
+    """Chỉ số (trong `starts`) của thẻ <row> đầu tiên có số dòng > `row` (các dòng luôn tăng dần)."""
+    lo, hi = 0, len(starts)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if _row_number(xml, starts[mid]) <= row:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+class _RowsDigest:
+    """Digest các dòng có dữ liệu của sheet, cộng dồn theo từng đoạn XML (đã cắt đúng ranh giới <row>)."""
+
+    def __init__(self, shared_strings, date_styles):
+        self._strings = [str(s).encode('utf-8') + b'\x00' for s in shared_strings]
+        self._styles = repr(sorted(date_styles.items())).encode('utf-8')
+        self._xml, self._text = hashlib.sha1(), hashlib.sha1()
+        self._pending = []
+        self.last_data_row = 0
+
+    def update(self, xml):
+        # Dòng trống ở cuối chưa được tính: chỉ cộng vào digest khi phía sau còn dòng có dữ liệu
+        content = max(xml.rfind(b'<v>'), xml.rfind(b'<is>'))
+        if content < 0:
+            self._pending.append(xml)
+            return
+        next_row = _XML_ROW_START.search(xml, content)
+        end = next_row.start() if next_row else len(xml)
+        data = b''.join(self._pending) + xml[:end]
+        self._pending = [xml[end:]] if end < len(xml) else []
+        self._xml.update(_XML_SHARED_STRING_REF.sub(rb'\1</v>', data))
+        self._text.update(b''.join(self._strings[int(i)] for i in _XML_SHARED_STRING_INDEX.findall(data)))
+        row_start = max(start for start in _row_starts(xml[:end]) if start <= content)
+        self.last_data_row = _row_number(xml, row_start)
+
+    def hexdigest(self):
+        return hashlib.sha1(self._xml.digest() + self._text.digest() + self._styles).hexdigest()
+
+def scan_sheet_rows(src, shared_strings, date_styles, prefix_row=None):
+    """Quét XML sheet (file-like, theo khối) và tính digest các dòng có dữ liệu.
+
+    Trả về (state, prefix_digest): state = {'last_data_row', 'digest'} của cả sheet (None nếu sheet
+    không có dòng nào); prefix_digest là digest tính đến hết dòng `prefix_row` (None nếu không yêu cầu).
+    """
+    digest = _RowsDigest(shared_strings, date_styles)
+    prefix_digest = None
+    for kind, xml in iter_sheet_xml(src):
+        if kind != 'rows':
+            continue
+        if prefix_row is not None and prefix_digest is None:
+            starts = _row_starts(xml)
+            split = _first_row_after(xml, starts, prefix_row)
+            if split < len(starts):
+                digest.update(xml[:starts[split]])
+                prefix_digest = digest.hexdigest()
+                xml = xml[starts[split]:]
+        digest.update(xml)
+    if prefix_row is not None and prefix_digest is None:
+        prefix_digest = digest.hexdigest()
+    if not digest.last_data_row:
+        return None, prefix_digest
+    return {'last_data_row': digest.last_data_row, 'digest': digest.hexdigest()}, prefix_digest
+
+class _AppendedRowsSource(io.RawIOBase):
+    """Luồng XML của sheet đã bỏ các dòng sau header có số dòng <= `after_row`."""
+
+    def __init__(self, src, after_row):
+        self._src = src
+        self._parts = self._iter_parts(after_row)
+        self._view, self._pos = memoryview(b''), 0
+
+    def _iter_parts(self, after_row):
+        header_kept = False
+        for kind, xml in iter_sheet_xml(self._src):
+            if kind != 'rows':
+                yield xml
+                continue
+            starts = _row_starts(xml)
+            if not header_kept and starts:
+                header_kept = True
+                header_end = starts[1] if len(starts) > 1 else len(xml)
+                yield xml[:header_end]
+                xml, starts = xml[header_end:], [s - header_end for s in starts[1:]]
+            split = _first_row_after(xml, starts, after_row)
+            if split < len(starts):
+                yield xml[starts[split]:]
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._pos >= len(self._view):
+            part = next(self._parts, None)
+            if part is None:
+                return 0
+            self._view, self._pos = memoryview(part), 0
+        n = min(len(b), len(self._view) - self._pos)
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def close(self):
+        self._src.close()
+        super().close()
+
+class _AppendedRowsWorksheet(ReadOnlyWorksheet):
+    """Worksheet read-only của openpyxl chỉ nhìn thấy header và các dòng sau `after_row`.
+
+    openpyxl vẫn parse từng dòng trước `min_row` của iter_rows, nên các dòng cũ được bỏ ngay khỏi
+    luồng XML; kiểu dữ liệu, shared strings, ngày giờ do openpyxl xử lý như khi đọc cả sheet.
+    """
+
+    def __init__(self, parent_workbook, title, worksheet_path, shared_strings, after_row):
+        self.after_row = after_row
+        super().__init__(parent_workbook, title, worksheet_path, shared_strings)
+
+    def _get_source(self):
+        return _AppendedRowsSource(super()._get_source(), self.after_row)
+
+def _ingest_raw_data(template, previous=None, rejects=None):
+    """Đọc 'Raw Data' từ TemplateWorkbook đang mở. Trả về (df_raw, ingest_state).
+
+    `previous` = (df_snapshot_cũ, ingest_state_cũ, bảng_dòng_bị_loại_cũ): thử ingest tăng dần trước,
+    nếu phần dữ liệu cũ đã bị sửa thì quay về đọc lại toàn bộ.
+    `rejects` (list, tùy chọn) nhận các bảng lỗi validation.
+    """
+    state = None
+    if previous is not None:
+        df_prev, prev_state, prev_rejected = previous
+        last_row = prev_state.get('last_data_row', 0)
+        state, prefix_digest = template.scan_raw_data(last_row)
+        if state is not None and prefix_digest == prev_state.get('digest'):
+            delta_rejects = []
+            delta = pd.DataFrame()
+            if state['last_data_row'] > last_row:
+                delta = template.read_raw_data(delta_rejects, min_row=last_row + 1)
+            if rejects is not None:
+                # Lỗi của phần cũ giữ nguyên; cảnh báo dòng trùng được tính lại trên toàn bộ dataset
+                rejects.append(prev_rejected[prev_rejected['Reason'] != DUPLICATE_REASON])
+                rejects.extend(delta_rejects)
+            print(f"➕ Ingest tăng dần: {len(delta)} dòng mới")
+            if delta.empty:
+                return df_prev, state
+            return concat_compact([df_prev, delta]), state
+        print("♻️ Dữ liệu cũ trong 'Raw Data' đã bị sửa -> đọc lại toàn bộ sheet")
+
+    df = template.read_raw_data(rejects)
+    if previous is None:
+        state, _ = template.scan_raw_data()
+    return df, state
+
+# =======================================
+# ĐỌC TEMPLATE MỘT LẦN CHO TẤT CẢ CÁC SHEET
+# =======================================
+class TemplateWorkbook:
+    """Mở file template một lần (openpyxl read-only) và đọc 'Raw Data' cùng hai sheet cấu hình.
+
+    Shared strings và styles chỉ bị giải nén/parse một lần thay vì mỗi sheet một lần.
+
+        with TemplateWorkbook("Time_report.xlsm") as template:
+            loaded = template.load()
+    """
+    RAW_DATA_SHEET = 'Raw Data'
+    YEAR_MODE_SHEET = 'Config_Year_Mode'
+    PROJECT_FILTER_SHEET = 'Config_Project_Filter'
+
+    def __init__(self, template_file, chunk_size=None):
+        self.template_file = template_file
+        self.chunk_size = chunk_size or RAW_DATA_CHUNK_SIZE
+        self._wb = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self):
+        if self._wb is None:
+            self._wb = load_workbook(self.template_file, read_only=True, data_only=True)
+        return self._wb
+
+    def close(self):
+        if self._wb is not None:
+            self._wb.close()
+            self._wb = None
+
+    def read_raw_data(self, rejects=None, min_row=None):
+        """Đọc 'Raw Data'; với `min_row`, chỉ các dòng dữ liệu từ dòng đó trở đi được đưa vào openpyxl."""
+        wb = self.open()
+        ws = wb[self.RAW_DATA_SHEET]
+        if min_row is not None:
+            # Cùng phần XML và bảng shared strings mà openpyxl đã gắn cho sheet
+            ws = _AppendedRowsWorksheet(wb, ws.title, ws._worksheet_path, ws._shared_strings, min_row - 1)
+        return _read_raw_data_sheet(ws, self.chunk_size, rejects, min_row)
+
+    def scan_raw_data(self, prefix_row=None):
+        """(ingest_state, prefix_digest) của 'Raw Data' (xem scan_sheet_rows); (None, None) nếu không quét được."""
+        try:
+            ws = self.open()[self.RAW_DATA_SHEET]
+            with zipfile.ZipFile(self.template_file) as archive:
+                with archive.open(ws._worksheet_path) as src:
+                    return scan_sheet_rows(src, ws._shared_strings, cell_date_styles(archive), prefix_row)
+        except Exception as e:
+            print(f"⚠️ Không tính được trạng thái ingest tăng dần: {e}")
+            return None, None
+
+    def read_year_mode(self):
+        return _sheet_to_frame(self.open()[self.YEAR_MODE_SHEET])
+
+    def read_project_filter(self):
+        return _sheet_to_frame(self.open()[self.PROJECT_FILTER_SHEET])
+
+    def load(self, previous=None):
+        """Đọc cả ba sheet trong cùng một lần mở file.
+
+        `previous` = (df_snapshot_cũ, ingest_state_cũ, bảng_dòng_bị_loại_cũ) để chỉ đọc các dòng mới
+        của 'Raw Data'.
+        """
+        rejects = []
+        raw_data, ingest_state = _ingest_raw_data(self, previous, rejects)
+        year_mode_df = self.read_year_mode()
+        project_filter_df = self.read_project_filter()
+        print(f"📥 Đọc template một lần: {len(raw_data)} dòng dữ liệu thô")
+        return {
+            'raw_data': raw_data,
+            'year_mode_df': year_mode_df,
+            'project_filter_df': project_filter_df,
+            'ingest_state': ingest_state,
+            'rejected_rows': build_rejected_rows(raw_data, rejects),
+        }
+
+def load_template(template_file, use_snapshot=True, chunk_size=None, incremental=True):
+    """Tải dữ liệu thô và cấu hình với một lần mở workbook. Trả về (df_raw, config).
+
+    Nếu snapshot (gồm cả hai sheet cấu hình) còn khớp fingerprint thì không mở workbook.
+    Nếu file đã đổi và `incremental=True`, chỉ các dòng mới nối vào cuối 'Raw Data' được parse.
+    """
+    try:
+        if is_multi_workbook_source(template_file):
+            return load_workbooks(resolve_workbooks(template_file), use_snapshot, chunk_size, incremental)
+
+        fingerprint = None
+        if use_snapshot:
+            df_raw, fingerprint = load_raw_data_snapshot(template_file)
+            config_sheets = load_config_snapshot(template_file) if df_raw is not None else None
+            if config_sheets is not None:
+                return df_raw, build_config(config_sheets['year_mode_df'], config_sheets['project_filter_df'])
+
+        previous = load_previous_snapshot(template_file) if use_snapshot and incremental else None
+        with TemplateWorkbook(template_file, chunk_size) as template:
+            loaded = template.load(previous)
+
+        if use_snapshot:
+            save_raw_data_snapshot(template_file, loaded['raw_data'], fingerprint, config_sheets={
+                'year_mode_df': loaded['year_mode_df'],
+                'project_filter_df': loaded['project_filter_df'],
+            }, ingest_state=loaded['ingest_state'], rejected_rows=loaded['rejected_rows'])
+        return loaded['raw_data'], build_config(loaded['year_mode_df'], loaded['project_filter_df'])
+    except FileNotFoundError:
+        print(f"Lỗi: Không tìm thấy file template tại {template_file}")
+        return pd.DataFrame(), _default_config()
+    except Exception as e:
+        print(f"Lỗi khi tải file template: {e}")
+        return pd.DataFrame(), _default_config()
+
+# =======================================
+# NHIỀU WORKBOOK (THƯ MỤC / GLOB)
+# =======================================
+WORKBOOK_EXTENSIONS = ('.xlsm', '.xlsx')
+
+def is_multi_workbook_source(template_source):
+    """True nếu nguồn dữ liệu là thư mục hoặc mẫu glob thay vì một file."""
+    return os.path.isdir(template_source) or any(ch in template_source for ch in '*?[')
+
+def resolve_workbooks(template_source):
+    """Danh sách workbook (sắp xếp theo đường dẫn) của một file, một thư mục hoặc một mẫu glob."""
+    if not is_multi_workbook_source(template_source):
+        return [template_source]
+    if os.path.isdir(template_source):
+        paths = [os.path.join(template_source, name) for name in os.listdir(template_source)]
+    else:
+        paths = glob.glob(template_source)
+    # Bỏ qua file khóa tạm của Excel (~$...)
+    return sorted(p for p in paths
+                  if os.path.isfile(p) and p.lower().endswith(WORKBOOK_EXTENSIONS)
+                  and not os.path.basename(p).startswith('~$'))
+
+def config_workbook(template_source):
+    """Workbook chứa hai sheet cấu hình: workbook cuối cùng theo thứ tự tên (vd: file năm hiện tại)."""
+    paths = resolve_workbooks(template_source)
+    return paths[-1] if paths else template_source
+
+def _load_one_workbook(path, with_config, use_snapshot, chunk_size, incremental, engine):
+    """Tải một workbook (chạy trong process con). Trả về (df_raw, config hoặc None)."""
+    if with_config:
+        return load_template(path, use_snapshot, chunk_size, incremental)
+    return load_raw_data(path, use_snapshot, engine, chunk_size, incremental), None
+
+def load_workbooks(paths, use_snapshot=True, chunk_size=None, incremental=True, with_config=True,
+                   engine="stream", max_workers=None):
+    """Tải 'Raw Data' của nhiều workbook và ghép lại với cùng schema. Trả về (df_raw, config).
+
+    Mỗi workbook có snapshot riêng: workbook chưa đổi được đọc thẳng từ parquet, chỉ các
+    workbook đã đổi (thường chỉ file của năm hiện tại) mới được parse, song song trong
+    process pool. Cấu hình (nếu `with_config`) lấy từ workbook cuối cùng.
+    """
+    if not paths:
+        raise FileNotFoundError("Không tìm thấy workbook nào trong nguồn dữ liệu")
+    config_path = paths[-1] if with_config else None
+
+    results, stale = {}, []
+    for path in paths:
+        df = load_raw_data_snapshot(path)[0] if use_snapshot else None
+        config = None
+        if df is not None and path == config_path:
+            config_sheets = load_config_snapshot(path)
+            config = build_config(config_sheets['year_mode_df'], config_sheets['project_filter_df']) if config_sheets else None
+            if config is None:
+                df = None
+        if df is None:
+            stale.append(path)
         else:
-            df_filtered = df_filtered[df_filtered['Year'] == config['year']]
+            results[path] = (df, config)
+
+    jobs = {path: (path, path == config_path, use_snapshot, chunk_size, incremental, engine) for path in stale}
+    workers = min(len(jobs), max_workers or os.cpu_count() or 1)
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {path: pool.submit(_load_one_workbook, *args) for path, args in jobs.items()}
+                for path, future in futures.items():
+                    results[path] = future.result()
+            jobs = {}
+        except Exception as e:
+            print(f"⚠️ Không chạy được process pool, tải tuần tự: {e}")
+            jobs = {path: args for path, args in jobs.items() if path not in results}
+    for path, args in jobs.items():
+        results[path] = _load_one_workbook(*args)
+
+    print(f"📚 {len(paths)} workbook, parse lại {len(stale)}")
+    df_raw = concat_compact([results[path][0] for path in paths])
+    config = results[config_path][1] if config_path else None
+    return df_raw, config or _default_config()
 
-    # ✅ Lọc theo tháng (nếu có)
-    if config.get('months'):
-        df_filtered = df_filtered[df_filtered['MonthName'].isin(config['months'])]
+# =======================================
+# THEO DÕI THAY ĐỔI FILE TEMPLATE
+# =======================================
+WATCH_INTERVAL_SECONDS = 5
+
+def get_source_stat(template_source):
+    """(đường dẫn, size, mtime_ns) của từng workbook trong nguồn dữ liệu; chỉ gọi os.stat."""
+    stats = []
+    for path in resolve_workbooks(template_source):
+        try:
+            st_ = os.stat(path)
+            stats.append((os.path.abspath(path), st_.st_size, st_.st_mtime_ns))
+        except OSError:
+            continue
+    return tuple(stats)
+
+class TemplateWatcher:
+    """Thread nền kiểm tra mtime/size của workbook theo chu kỳ.
+
+    `version` chỉ đổi khi file thực sự thay đổi, dùng làm khóa cache cho dữ liệu đã tải.
+    """
+
+    def __init__(self, template_source, interval=WATCH_INTERVAL_SECONDS):
+        self.template_source = template_source
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._update(get_source_stat(template_source))
+
+    def _update(self, stats):
+        with self._lock:
+            self._stats = stats
+            self._version = hashlib.sha1(repr(stats).encode('utf-8')).hexdigest()[:8]
+            latest_mtime = max((mtime for _, _, mtime in stats), default=None)
+            self._modified_at = datetime.fromtimestamp(latest_mtime / 1e9) if latest_mtime else None
+
+    def poll(self):
+        """Kiểm tra file một lần; trả về True nếu có thay đổi."""
+        stats = get_source_stat(self.template_source)
+        with self._lock:
+            changed = stats != self._stats
+        if changed:
+            self._update(stats)
+            print(f"🔄 Template đã thay đổi -> phiên bản dữ liệu {self._version}")
+        return changed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"⚠️ Lỗi khi theo dõi template: {e}")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="TemplateWatcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def version(self):
+        with self._lock:
+            return self._version
+
+    @property
+    def modified_at(self):
+        with self._lock:
+            return self._modified_at
 
-    # ✅ Lọc theo project
-    if not config['project_filter_df'].empty:
-        selected_project_names = config['project_filter_df']['Project Name'].tolist()
-        df_filtered = df_filtered[df_filtered['Project name'].isin(selected_project_names)]
+# =======================================
+# SNAPSHOT CACHE CHO SHEET 'Raw Data'
+# =======================================
+# Snapshot được lưu cạnh file template: <thư mục template>/.time_report_cache/<tên template>/
+SNAPSHOT_DIR_NAME = ".time_report_cache"
+SNAPSHOT_FORMAT_VERSION = 7
+
+def get_snapshot_dir(template_file):
+    """Thư mục chứa snapshot của một file template."""
+    base_dir = os.path.dirname(os.path.abspath(template_file))
+    stem = os.path.splitext(os.path.basename(template_file))[0]
+    return os.path.join(base_dir, SNAPSHOT_DIR_NAME, sanitize_filename(stem))
+
+def _hash_file(path, block_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def get_workbook_fingerprint(template_file, previous=None):
+    """Fingerprint (size, mtime, sha256) của file template.
+
+    Nếu size và mtime trùng với `previous` thì dùng lại hash cũ, không cần đọc lại cả file.
+    """
+    stat = os.stat(template_file)
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if previous and previous.get('size') == stat.st_size and previous.get('mtime_ns') == stat.st_mtime_ns:
+        fingerprint['sha256'] = previous.get('sha256')
     else:
-        return pd.DataFrame(columns=df.columns)  # Trả dataframe rỗng nếu không có project
+        fingerprint['sha256'] = _hash_file(template_file)
+    return fingerprint
+
+def read_snapshot_meta(template_file):
+    """Đọc meta.json của snapshot, trả về None nếu chưa có hoặc không hợp lệ."""
+    meta_path = os.path.join(get_snapshot_dir(template_file), "meta.json")
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        return None
+    return meta
+
+def check_snapshot(template_file):
+    """Trả về (meta, fingerprint). meta là None nếu snapshot không tồn tại hoặc đã cũ."""
+    meta = read_snapshot_meta(template_file)
+    fingerprint = get_workbook_fingerprint(template_file, previous=meta['fingerprint'] if meta else None)
+    if not meta or meta['fingerprint'].get('sha256') != fingerprint['sha256']:
+        return None, fingerprint
+    return meta, fingerprint
+
+def load_raw_data_snapshot(template_file):
+    """Trả về (df, fingerprint). df là None nếu snapshot không tồn tại hoặc đã cũ."""
+    meta, fingerprint = check_snapshot(template_file)
+    if meta is None:
+        return None, fingerprint
+
+    try:
+        df = pd.read_parquet(os.path.join(get_snapshot_dir(template_file), "raw_data.parquet"))
+    except Exception as e:
+        print(f"⚠️ Không đọc được snapshot, sẽ parse lại file template: {e}")
+        return None, fingerprint
+
+    if meta['fingerprint'] != fingerprint:
+        # File chỉ bị "touch" (mtime đổi, nội dung không đổi) -> cập nhật meta để lần sau khỏi hash lại
+        meta['fingerprint'] = fingerprint
+        _write_snapshot_meta(template_file, meta)
+    print(f"⚡ Đọc snapshot dữ liệu thô: {len(df)} dòng")
+    return df, fingerprint
+
+def _write_snapshot_meta(template_file, meta):
+    snapshot_dir = get_snapshot_dir(template_file)
+    tmp_path = os.path.join(snapshot_dir, "meta.json.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(snapshot_dir, "meta.json"))
+
+def load_previous_snapshot(template_file):
+    """Snapshot cũ (không kiểm tra fingerprint) cùng ingest_state và bảng dòng bị loại, dùng cho ingest tăng dần."""
+    meta = read_snapshot_meta(template_file)
+    if not meta or not meta.get('ingest_state'):
+        return None
+    try:
+        df = pd.read_parquet(os.path.join(get_snapshot_dir(template_file), "raw_data.parquet"))
+    except Exception:
+        return None
+    return df, meta['ingest_state'], load_rejected_rows(template_file)
+
+def load_rejected_rows(template_source):
+    """Bảng dòng bị loại / cảnh báo của lần nạp gần nhất, lưu cạnh snapshot.
+
+    Với nguồn nhiều workbook, thêm cột 'Workbook' cho biết dòng thuộc file nào.
+    """
+    paths = resolve_workbooks(template_source)
+    parts = []
+    for path in paths:
+        try:
+            rejected = pd.read_parquet(os.path.join(get_snapshot_dir(path), "rejected_rows.parquet"))
+        except Exception:
+            continue
+        if len(paths) > 1:
+            rejected.insert(0, 'Workbook', os.path.basename(path))
+        parts.append(rejected)
+    parts = [p for p in parts if not p.empty]
+    if not parts:
+        return pd.DataFrame(columns=REJECTED_COLUMNS)
+    return pd.concat(parts, ignore_index=True)
+
+def load_config_snapshot(template_file):
+    """Đọc hai sheet cấu hình đã lưu cùng snapshot (gọi sau khi snapshot dữ liệu thô đã hợp lệ)."""
+    meta = read_snapshot_meta(template_file)
+    if not meta or not meta.get('config_sheets'):
+        return None
+    try:
+        return pd.read_pickle(os.path.join(get_snapshot_dir(template_file), "config_sheets.pkl"))
+    except Exception as e:
+        print(f"⚠️ Không đọc được snapshot cấu hình: {e}")
+        return None
+
+def save_raw_data_snapshot(template_file, df, fingerprint=None, config_sheets=None, ingest_state=None,
+                           rejected_rows=None):
+    """Ghi DataFrame đã parse ra parquet kèm fingerprint của file template.
+
+    `config_sheets` (tùy chọn): dict các DataFrame cấu hình, được lưu cùng snapshot.
+    `ingest_state` (tùy chọn): dòng cuối đã đọc và digest phần đã ingest, dùng cho ingest tăng dần.
+    `rejected_rows` (tùy chọn): bảng dòng bị loại / cảnh báo khi nạp.
+    """
+    try:
+        snapshot_dir = get_snapshot_dir(template_file)
+        os.makedirs(snapshot_dir, exist_ok=True)
+        fingerprint = fingerprint or get_workbook_fingerprint(template_file)
+
+        # Ghi file tạm rồi đổi tên để tiến trình khác không đọc phải snapshot ghi dở
+        tmp_path = os.path.join(snapshot_dir, "raw_data.parquet.tmp")
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, os.path.join(snapshot_dir, "raw_data.parquet"))
+
+        if rejected_rows is not None:
+            tmp_path = os.path.join(snapshot_dir, "rejected_rows.parquet.tmp")
+            rejected_rows.to_parquet(tmp_path)
+            os.replace(tmp_path, os.path.join(snapshot_dir, "rejected_rows.parquet"))
+
+        if config_sheets is not None:
+            tmp_path = os.path.join(snapshot_dir, "config_sheets.pkl.tmp")
+            pd.to_pickle(config_sheets, tmp_path)
+            os.replace(tmp_path, os.path.join(snapshot_dir, "config_sheets.pkl"))
+
+        _write_snapshot_meta(template_file, {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'template_file': os.path.abspath(template_file),
+            'fingerprint': fingerprint,
+            'rows': len(df),
+            'config_sheets': config_sheets is not None,
+            'ingest_state': ingest_state,
+            'rejected_rows': None if rejected_rows is None else len(rejected_rows),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+        })
+        return True
+    except Exception as e:
+        print(f"⚠️ Không ghi được snapshot dữ liệu thô: {e}")
+        return False
+
+# =======================================
+# SQLITE STORE (BACKEND TÙY CHỌN)
+# =======================================
+# Thay vì giữ toàn bộ dữ liệu thô trong bộ nhớ của từng phiên Streamlit, dữ liệu được nạp
+# vào một file SQLite dùng chung (có index); bộ lọc và tổng giờ được đẩy xuống SQL.
+SQLITE_STORE_NAME = "time_report.sqlite"
+SQLITE_TABLE = "raw_data"
+# Cube giờ công (CUBE_DIMENSIONS) được tính sẵn khi nạp store
+SQLITE_CUBE_TABLE = "hours_cube"
+SQLITE_INDEXES = {
+    'idx_raw_year_month_project': ['Year', 'MonthName', 'Project name'],
+    'idx_raw_employee_date': ['Employee', 'Date'],
+    'idx_raw_workcentre': ['Workcentre'],
+}
+
+def get_sqlite_store_path(template_source):
+    """File SQLite dùng chung, nằm trong thư mục cache cạnh nguồn dữ liệu."""
+    if os.path.isdir(template_source):
+        base_dir = template_source
+    else:
+        base_dir = os.path.dirname(os.path.abspath(config_workbook(template_source)))
+    return os.path.join(base_dir, SNAPSHOT_DIR_NAME, SQLITE_STORE_NAME)
+
+def get_source_version(template_source):
+    """Phiên bản dữ liệu của nguồn (một hay nhiều workbook), tính từ sha256 của từng file."""
+    digest = hashlib.sha256()
+    for path in resolve_workbooks(template_source):
+        meta = read_snapshot_meta(path)
+        fingerprint = get_workbook_fingerprint(path, previous=meta['fingerprint'] if meta else None)
+        digest.update(f"{os.path.abspath(path)}:{fingerprint['sha256']}\n".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def _sqlite_type(values):
+    """Kiểu cột SQLite cho một cột đã qua `_sql_rows` (dùng khi thêm cột vào bảng đã có)."""
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_integer_dtype(values):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(values):
+        return "REAL"
+    return "TEXT"
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+class TimesheetStore:
+    """Dữ liệu thô trong SQLite; mỗi truy vấn mở một kết nối chỉ đọc nên dùng được từ nhiều tiến trình."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def _connect(self):
+        return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+
+    def version(self):
+        """Phiên bản nguồn dữ liệu đã nạp, None nếu store chưa tồn tại."""
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute("SELECT value FROM meta WHERE key = 'source_version'").fetchone()
+            return row[0] if row else None
+        except sqlite3.Error:
+            return None
+
+    @staticmethod
+    def _sql_rows(df):
+        """Bản sao của frame với kiểu SQLite lưu được (category -> chuỗi, Date -> text)."""
+        rows = df.copy()
+        for col in rows.columns:
+            if isinstance(rows[col].dtype, pd.CategoricalDtype):
+                rows[col] = rows[col].astype(object)
+        if 'Hours' in rows.columns:
+            rows['Hours'] = rows['Hours'].astype('float64')
+        if 'Date' in rows.columns:
+            rows['Date'] = rows['Date'].dt.strftime('%Y-%m-%d %H:%M:%S')
+        return rows
+
+    def rebuild(self, df, version):
+        """Ghi lại toàn bộ store từ DataFrame (file tạm rồi đổi tên, không chặn người đọc)."""
+        self.rebuild_chunked([df], version, cube=build_hours_cube(df))
+
+    def rebuild_chunked(self, chunks, version, cube=None):
+        """Ghi lại store từ một dãy khối dữ liệu thô, khối nào ghi xong là bỏ khỏi bộ nhớ.
+
+        Cube giờ công được cộng dồn từ chính các khối đó (xem `aggregate_hours_chunked`) trong
+        cùng một lượt đọc, trừ khi đã truyền sẵn `cube`.
+        """
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        tmp_path = f"{self.db_path}.{os.getpid()}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        n_rows, columns = 0, None
+        with closing(sqlite3.connect(tmp_path)) as conn:
+            def write(chunks):
+                nonlocal n_rows, columns
+                for chunk in chunks:
+                    if chunk.empty:
+                        continue
+                    rows = self._sql_rows(chunk)
+                    # Bảng được tạo theo cột của khối đầu tiên; các workbook có thể khác cột (vd: file cũ
+                    # không có 'Team leader') -> cột mới được thêm vào bảng, khối thiếu cột thì để trống
+                    if columns is None:
+                        columns = list(rows.columns)
+                    for col in rows.columns:
+                        if col not in columns:
+                            conn.execute(f"ALTER TABLE {SQLITE_TABLE} ADD COLUMN {_quote(col)} {_sqlite_type(rows[col])}")
+                            columns.append(col)
+                    rows.reindex(columns=columns).to_sql(
+                        SQLITE_TABLE, conn, index=False, if_exists='append', chunksize=10000)
+                    n_rows += len(chunk)
+                    yield chunk
+
+            if cube is None:
+                cube = aggregate_hours_chunked(write(chunks))
+            else:
+                deque(write(chunks), maxlen=0)
+            if columns is None:
+                pd.DataFrame(columns=['Date'] + CUBE_DIMENSIONS + ['Hours']).to_sql(SQLITE_TABLE, conn, index=False)
+            for start in range(0, max(len(cube), 1), RAW_DATA_CHUNK_SIZE * 10):
+                self._sql_rows(cube.iloc[start:start + RAW_DATA_CHUNK_SIZE * 10]).to_sql(
+                    SQLITE_CUBE_TABLE, conn, index=False, if_exists='append', chunksize=10000)
+            for name, cols in SQLITE_INDEXES.items():
+                if columns and all(c in columns for c in cols):
+                    conn.execute(f"CREATE INDEX {name} ON {SQLITE_TABLE} ({', '.join(map(_quote, cols))})")
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("INSERT INTO meta VALUES ('source_version', ?)", (version,))
+            conn.commit()
+        os.replace(tmp_path, self.db_path)
+        print(f"🗄️ Đã nạp {n_rows} dòng vào SQLite store: {self.db_path}")
+
+    @staticmethod
+    def _where(years=None, months=None, projects=None):
+        clauses, params = [], []
+        for col, values in (('Year', years), ('MonthName', months), ('Project name', projects)):
+            if values:
+                values = [int(v) if col == 'Year' else str(v) for v in values]
+                clauses.append(f"{_quote(col)} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def select(self, years=None, months=None, projects=None, limit=None):
+        """Các dòng thỏa bộ lọc (năm / tháng / dự án), trả về DataFrame theo schema gọn."""
+        where, params = self._where(years, months, projects)
+        sql = f"SELECT * FROM {SQLITE_TABLE}{where} ORDER BY rowid" + (f" LIMIT {int(limit)}" if limit is not None else "")
+        with closing(self._connect()) as conn:
+            df = pd.read_sql_query(sql, conn, params=params)
+        if 'Date' in df.columns:
+            df['Date'] = pd.to_datetime(df['Date'])
+        return apply_compact_schema(df)
+
+    def sum_hours(self, by, years=None, months=None, projects=None):
+        """Giống `sum_hours` nhưng GROUP BY chạy trong SQLite."""
+        keys = list(by) if isinstance(by, (list, tuple)) else [by]
+        where, params = self._where(years, months, projects)
+        cols = ', '.join(map(_quote, keys))
+        sql = f"SELECT {cols}, SUM(Hours) AS Hours FROM {SQLITE_TABLE}{where} GROUP BY {cols} ORDER BY {cols}"
+        with closing(self._connect()) as conn:
+            df = pd.read_sql_query(sql, conn, params=params)
+        if 'MonthName' in keys:
+            df['MonthName'] = df['MonthName'].astype(MONTH_DTYPE)
+            df = df.sort_values(keys)
+        totals = df.set_index(keys if len(keys) > 1 else keys[0])['Hours'].round(HOURS_DECIMALS)
+        return totals
+
+    def hours_cube(self):
+        """Cube giờ công đã tính sẵn khi nạp; store cũ chưa có bảng cube thì GROUP BY trên dữ liệu thô."""
+        # Đọc theo khối và ép schema gọn từng khối: không dựng toàn bộ cube dưới dạng chuỗi object
+        try:
+            with closing(self._connect()) as conn:
+                parts = [apply_compact_schema(part) for part in pd.read_sql_query(
+                    f"SELECT * FROM {SQLITE_CUBE_TABLE}", conn, chunksize=RAW_DATA_CHUNK_SIZE * 10)]
+        except (sqlite3.Error, pd.errors.DatabaseError):
+            return apply_compact_schema(self.sum_hours(CUBE_DIMENSIONS).reset_index())
+        return concat_compact(parts) if parts else pd.DataFrame(columns=CUBE_DIMENSIONS + ['Hours'])
+
+    def distinct(self, col):
+        with closing(self._connect()) as conn:
+            rows = conn.execute(f"SELECT DISTINCT {_quote(col)} FROM {SQLITE_TABLE} "
+                                f"WHERE {_quote(col)} IS NOT NULL ORDER BY 1").fetchall()
+        return [r[0] for r in rows]
+
+    def latest_date(self):
+        with closing(self._connect()) as conn:
+            row = conn.execute(f"SELECT MAX(Date) FROM {SQLITE_TABLE}").fetchone()
+        return pd.to_datetime(row[0]) if row and row[0] else pd.NaT
+
+    def __len__(self):
+        with closing(self._connect()) as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {SQLITE_TABLE}").fetchone()[0]
+
+def load_store(template_source, db_path=None, chunked=False):
+    """Mở SQLite store của nguồn dữ liệu, nạp lại nếu workbook đã đổi. Trả về (store, config).
+
+    Với `chunked=True` store được nạp theo từng khối (xem `iter_raw_data_chunks`): dữ liệu thô
+    không bao giờ nằm trọn trong bộ nhớ, cube giờ công được cộng dồn trong cùng lượt đọc.
+    """
+    store = TimesheetStore(db_path or get_sqlite_store_path(template_source))
+    version = get_source_version(template_source)
+    if store.version() != version:
+        if not chunked:
+            df_raw, config = load_template(template_source)
+            store.rebuild(df_raw, version)
+            return store, config
+        store.rebuild_chunked(iter_raw_data_chunks(template_source, save_rejected=True), version)
+    config_sheets = load_config_snapshot(config_workbook(template_source))
+    if config_sheets is not None:
+        return store, build_config(config_sheets['year_mode_df'], config_sheets['project_filter_df'])
+    return store, read_configs(template_source)
+
+# =======================================
+# TỔNG HỢP THEO KHỐI (OUT-OF-CORE)
+# =======================================
+# Dữ liệu thô được đọc lần lượt từng khối; mỗi khối chỉ để lại tổng tạm theo nhóm, các tổng tạm
+# được gộp vào aggregate chạy khi vượt AGGREGATE_FOLD_ROWS dòng. RAM đỉnh ~ một khối + aggregate.
+AGGREGATE_FOLD_ROWS = 200_000
+
+def iter_workbook_chunks(path, chunk_size=None, rejects=None):
+    """Các khối dữ liệu thô đã chuẩn hóa của một workbook.
+
+    Snapshot còn khớp fingerprint -> đọc từng batch của file parquet; ngược lại đọc streaming sheet
+    'Raw Data' (lỗi validation được thêm vào `rejects`). Giá trị trả về của generator: True nếu
+    sheet đã được parse.
+    """
+    chunk_size = chunk_size or RAW_DATA_CHUNK_SIZE
+    meta, _ = check_snapshot(path)
+    if meta is not None:
+        try:
+            parquet = pq.ParquetFile(os.path.join(get_snapshot_dir(path), "raw_data.parquet"))
+        except Exception as e:
+            print(f"⚠️ Không đọc được snapshot, sẽ parse lại file template: {e}")
+        else:
+            for batch in parquet.iter_batches(batch_size=chunk_size):
+                yield apply_compact_schema(batch.to_pandas())
+            return False
+
+    with TemplateWorkbook(path, chunk_size) as template:
+        for chunk in iter_sheet_chunks(template.open()[TemplateWorkbook.RAW_DATA_SHEET], chunk_size):
+            yield _normalize_raw_frame(chunk, rejects)
+    return True
+
+def iter_raw_data_chunks(template_source, chunk_size=None, save_rejected=False):
+    """Các khối dữ liệu thô của mọi workbook trong nguồn (một file, thư mục hoặc glob), không ghép lại.
+
+    Với `save_rejected=True`, bảng dòng bị loại của các workbook vừa parse được ghi cạnh snapshot
+    (không có cảnh báo dòng trùng vì việc đó cần toàn bộ dataset).
+    """
+    for path in resolve_workbooks(template_source):
+        rejects = []
+        parsed = yield from iter_workbook_chunks(path, chunk_size, rejects)
+        if parsed and save_rejected:
+            rejected_rows = build_rejected_rows(pd.DataFrame(), rejects)
+            snapshot_dir = get_snapshot_dir(path)
+            os.makedirs(snapshot_dir, exist_ok=True)
+            tmp_path = os.path.join(snapshot_dir, "rejected_rows.parquet.tmp")
+            rejected_rows.to_parquet(tmp_path)
+            os.replace(tmp_path, os.path.join(snapshot_dir, "rejected_rows.parquet"))
+
+def _fold_partials(partials):
+    """Gộp các Series tổng tạm (MultiIndex cùng cấp) thành một Series."""
+    merged = pd.concat(partials) if len(partials) > 1 else partials[0]
+    return merged.groupby(level=list(range(merged.index.nlevels)), dropna=False, sort=False).sum()
+
+def aggregate_hours_chunked(chunks, dims=None, fold_rows=AGGREGATE_FOLD_ROWS):
+    """Tổng giờ theo `dims` (mặc định CUBE_DIMENSIONS) từ một dãy khối dữ liệu thô.
+
+    Kết quả giống `build_hours_cube` trên toàn bộ dữ liệu (cùng cột, schema gọn) nhưng các khối
+    không bao giờ được ghép lại: mỗi khối được group thành tổng tạm rồi bỏ đi.
+    Mặc định group theo mọi chiều của cube (chiều khối không có để trống) rồi chỉ giữ các chiều
+    xuất hiện ở ít nhất một khối, nên các workbook khác cột vẫn không mất chiều nào.
+    """
+    keep_seen = dims is None
+    dims = list(dims or CUBE_DIMENSIONS)
+    seen = set()
+    running, pending, pending_rows, n_rows = None, [], 0, 0
+    for chunk in chunks:
+        if chunk.empty or 'Hours' not in chunk.columns:
+            continue
+        seen.update(c for c in dims if c in chunk.columns)
+        keys = [chunk[c] if c in chunk.columns else pd.Series(np.nan, index=chunk.index, name=c) for c in dims]
+        partial = chunk['Hours'].astype('float64').groupby(keys, observed=True, dropna=False, sort=False).sum()
+        pending.append(partial)
+        pending_rows += len(partial)
+        n_rows += len(chunk)
+        if pending_rows >= fold_rows:
+            running = _fold_partials(([running] if running is not None else []) + pending)
+            pending, pending_rows = [], 0
+
+    parts = ([running] if running is not None else []) + pending
+    if not parts:
+        return pd.DataFrame(columns=dims + ['Hours'])
+    cube = _fold_partials(parts).rename('Hours').reset_index()
+    cube.columns = dims + ['Hours']
+    if keep_seen:
+        cube = cube[[c for c in dims if c in seen] + ['Hours']]
+    print(f"🧊 Cube giờ công (theo khối): {n_rows} dòng -> {len(cube)} dòng")
+    return apply_compact_schema(cube)
+
+def build_hours_cube_chunked(template_source, chunk_size=None, dims=None):
+    """Cube giờ công của nguồn dữ liệu, dựng theo từng khối mà không tải toàn bộ dữ liệu thô."""
+    return aggregate_hours_chunked(iter_raw_data_chunks(template_source, chunk_size), dims)
+
+# =======================================
+# CHỈ MỤC LỌC (FILTER INDEX)
+# =======================================
+# Mỗi giá trị Năm / Tháng / Dự án -> mảng vị trí dòng (đã sắp xếp), dựng một lần cho mỗi
+# phiên bản dữ liệu. Bộ lọc bắt đầu từ tập ứng viên nhỏ nhất rồi kiểm tra các chiều còn lại
+# trên đúng các vị trí đó, nên chi phí tỉ lệ với kết quả chứ không với toàn bộ lịch sử.
+FILTER_INDEX_COLUMNS = ['Year', 'MonthName', 'Project name']
+
+class FilterIndex:
+    """Chỉ mục vị trí dòng theo Năm / Tháng / Dự án của một DataFrame (không sao chép dữ liệu).
+
+    `version` định danh dữ liệu được chỉ mục (vd: "<data_version>:cube"), dùng làm khóa cache tổng hợp.
+    """
+
+    def __init__(self, df, version=None):
+        self.df = df
+        self.version = version
+        self.codes = {}
+        self.code_of = {}
+        self.rows = {}
+        for col in FILTER_INDEX_COLUMNS:
+            if col not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[col])
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            self.codes[col] = codes
+            self.code_of[col] = {value: code for code, value in enumerate(uniques.tolist())}
+            self.rows[col] = [order[bounds[i]:bounds[i + 1]] for i in range(len(uniques))]
+
+    def __len__(self):
+        return len(self.df)
+
+    def positions(self, years=None, months=None, projects=None):
+        """Vị trí các dòng thỏa bộ lọc (tăng dần), None nếu không lọc gì."""
+        wanted = {}
+        for col, values in (('Year', years), ('MonthName', months), ('Project name', projects)):
+            if values:
+                values = [int(v) for v in values] if col == 'Year' else list(values)
+                if col not in self.code_of:
+                    return np.empty(0, dtype=np.intp)
+                wanted[col] = sorted({self.code_of[col][v] for v in values if v in self.code_of[col]})
+        if not wanted:
+            return None
+        # Chiều có ít dòng ứng viên nhất làm điểm xuất phát
+        sizes = {col: sum(len(self.rows[col][c]) for c in codes) for col, codes in wanted.items()}
+        first = min(sizes, key=sizes.get)
+        parts = [self.rows[first][c] for c in wanted[first]]
+        pos = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.intp)
+        for col, codes in wanted.items():
+            if col != first and len(pos):
+                pos = pos[np.isin(self.codes[col][pos], codes)]
+        return pos
+
+    def select(self, years=None, months=None, projects=None, limit=None):
+        """Các dòng thỏa bộ lọc, lấy ra một lần bằng `take` theo vị trí.
+
+        Không lọc gì -> bản sao nông của frame được chỉ mục (không chép dữ liệu): gán / thêm cột
+        trên kết quả không lan sang frame dùng chung, nhưng dữ liệu vẫn phải coi là chỉ đọc.
+        """
+        pos = self.positions(years, months, projects)
+        if pos is None:
+            df = self.df.head(limit) if limit is not None else self.df
+            return df.copy(deep=False)
+        return self.df.take(pos[:limit] if limit is not None else pos)
+
+def build_filter_index(df, version=None):
+    """Dựng chỉ mục lọc cho DataFrame (dữ liệu thô hoặc cube)."""
+    index = FilterIndex(df, version)
+    print(f"🗂️ Chỉ mục lọc: {len(df)} dòng, " + ", ".join(f"{len(v)} {k}" for k, v in index.rows.items()))
+    return index
+
+def frame_of(source):
+    """DataFrame gốc của một nguồn dữ liệu (DataFrame hoặc FilterIndex)."""
+    return source.df if isinstance(source, FilterIndex) else source
+
+def select_rows(source, years=None, months=None, projects=None, limit=None):
+    """Lọc dữ liệu thô theo năm / tháng / dự án từ DataFrame, FilterIndex hoặc TimesheetStore.
+
+    Kết quả có thể dùng chung bộ nhớ với nguồn (frame / cube được cache cho mọi phiên): chỉ đọc,
+    muốn sửa giá trị tại chỗ thì `copy()` trước.
+    """
+    if isinstance(source, (TimesheetStore, FilterIndex)):
+        return source.select(years, months, projects, limit)
+    mask = pd.Series(True, index=source.index)
+    if years:
+        mask &= source['Year'].isin(years)
+    if months:
+        mask &= source['MonthName'].isin(months)
+    if projects:
+        mask &= source['Project name'].isin(projects)
+    df = source[mask]
+    return df.head(limit) if limit is not None else df
+
+def latest_date(source):
+    """Ngày mới nhất có dữ liệu (NaT nếu không có)."""
+    if isinstance(source, TimesheetStore):
+        return source.latest_date()
+    source = frame_of(source)
+    return pd.to_datetime(source['Date'], errors='coerce').max() if 'Date' in source.columns else pd.NaT
+
+def distinct_values(source, col):
+    """Các giá trị khác nhau (đã sắp xếp) của một cột."""
+    if isinstance(source, TimesheetStore):
+        return source.distinct(col)
+    if isinstance(source, FilterIndex) and col in source.code_of:
+        return sorted(source.code_of[col])
+    source = frame_of(source)
+    return sorted(source[col].dropna().unique().tolist())
+
+# =======================================
+# CACHE TỔNG HỢP DÙNG CHUNG (LRU)
+# =======================================
+# Kết quả lọc / tổng hợp được cache theo chữ ký chuẩn hóa của lựa chọn (phiên bản dữ liệu, năm,
+# tháng, dự án, filter_mode, các chiều group), dùng chung cho mọi tab và mọi phiên Streamlit
+# trong cùng tiến trình. Giá trị trong cache được chia sẻ nên phải coi là chỉ đọc.
+AGGREGATION_CACHE_SIZE = 256
+# Giới hạn tổng dung lượng (memory_usage(deep=True)) của các DataFrame / Series trong cache
+AGGREGATION_CACHE_MAX_BYTES = 256 << 20
+
+def source_version(source):
+    """Phiên bản dữ liệu của nguồn để làm khóa cache; None nếu không xác định được (không cache)."""
+    if isinstance(source, FilterIndex):
+        return source.version
+    if isinstance(source, TimesheetStore):
+        version = source.version()
+        return f"sqlite:{version}" if version else None
+    return None
+
+def _as_list(values):
+    if values is None or (not isinstance(values, (list, tuple, set)) and pd.isna(values)):
+        return []
+    return list(values) if isinstance(values, (list, tuple, set)) else [values]
+
+def aggregation_signature(version, kind, years=None, months=None, projects=None, filter_mode=None,
+                          by=None, weeks=None):
+    """Khóa cache chuẩn hóa: cùng lựa chọn (bất kể thứ tự, kiểu số / chuỗi) -> cùng khóa."""
+    month_rank = {m: i for i, m in enumerate(MONTH_ORDER)}
+    return (
+        kind,
+        version,
+        tuple(sorted({int(y) for y in _as_list(years)})),
+        tuple(sorted({str(m) for m in _as_list(months)}, key=lambda m: (month_rank.get(m, 12), m))),
+        tuple(sorted({str(p) for p in _as_list(projects)})),
+        filter_mode,
+        tuple(by) if isinstance(by, (list, tuple)) else by,
+        tuple(sorted({int(w) for w in _as_list(weeks)})),
+    )
+
+class AggregationCache:
+    """LRU giới hạn theo số mục và theo tổng dung lượng, an toàn luồng.
+
+    Mỗi mục nhớ phiên bản dữ liệu đã dùng để tính nó; `retain_versions` bỏ các mục của phiên bản cũ
+    khi dữ liệu được nạp lại. Mỗi DataFrame được cache nhớ chữ ký của nó (`signature_of`) để các phép
+    tổng hợp tiếp theo trên chính frame đó cũng được cache (vd: tổng giờ theo tháng của kết quả lọc).
+    """
+
+    def __init__(self, max_entries=AGGREGATION_CACHE_SIZE, max_bytes=AGGREGATION_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()  # key -> (giá trị, phiên bản dữ liệu, dung lượng)
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _frames_in(value):
+        values = value if isinstance(value, tuple) else (value,)
+        return [v for v in values if isinstance(v, pd.DataFrame)]
+
+    @staticmethod
+    def _sizeof(value):
+        values = value if isinstance(value, tuple) else (value,)
+        size = 0
+        for v in values:
+            if isinstance(v, pd.DataFrame):
+                size += int(v.memory_usage(index=True, deep=True).sum())
+            elif isinstance(v, (pd.Series, pd.Index)):
+                size += int(v.memory_usage(deep=True))
+        return size
+
+    def _drop(self, key):
+        value, _, size = self._items.pop(key)
+        self.nbytes -= size
+        for df in self._frames_in(value):
+            if self._frames.get(id(df), (None,))[0] is df:
+                del self._frames[id(df)]
+
+    def get_or_compute(self, key, compute, version=None):
+        """Giá trị của `key`, tính bằng `compute()` nếu chưa có; key None -> luôn tính lại.
+
+        `version`: phiên bản dữ liệu của nguồn (xem `retain_versions`).
+        """
+        if key is None:
+            return compute()
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key][0]
+            self.misses += 1
+        value = compute()
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            # Lớn hơn cả giới hạn -> không cache (tránh đẩy hết các mục khác ra)
+            return value
+        with self._lock:
+            if key in self._items:
+                self._drop(key)
+            self._items[key] = (value, version, size)
+            self.nbytes += size
+            for df in self._frames_in(value):
+                self._frames[id(df)] = (df, key)
+            while len(self._items) > self.max_entries or self.nbytes > self.max_bytes:
+                self._drop(next(iter(self._items)))
+        return value
+
+    def signature_of(self, df):
+        """Chữ ký của một DataFrame đang nằm trong cache (so sánh đúng đối tượng), None nếu không có."""
+        with self._lock:
+            entry = self._frames.get(id(df))
+        return entry[1] if entry is not None and entry[0] is df else None
+
+    def version_of(self, key):
+        """Phiên bản dữ liệu của mục `key`, None nếu không có."""
+        with self._lock:
+            entry = self._items.get(key)
+        return entry[1] if entry is not None else None
+
+    def retain_versions(self, versions):
+        """Bỏ mọi mục được tính từ phiên bản dữ liệu không nằm trong `versions` (gọi khi nạp lại dữ liệu)."""
+        versions = set(versions)
+        with self._lock:
+            for key in [k for k, (_, version, _) in self._items.items() if version not in versions]:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._frames.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+AGGREGATION_CACHE = AggregationCache()
+
+def cached_select_rows(source, years=None, months=None, projects=None, weeks=None):
+    """`select_rows` (thêm lọc theo tuần) qua AGGREGATION_CACHE."""
+    version = source_version(source)
+    key = aggregation_signature(version, 'filter', years, months, projects, weeks=weeks) if version else None
+
+    def compute():
+        df = select_rows(source, years, months, projects)
+        return df[df['Week'].isin(weeks)] if weeks else df
+    return AGGREGATION_CACHE.get_or_compute(key, compute, version)
+
+def cached_sum_hours(df, by, sort=True):
+    """`sum_hours` qua AGGREGATION_CACHE khi `df` là kết quả lọc đã được cache."""
+    signature = AGGREGATION_CACHE.signature_of(df)
+    key = None if signature is None else ('sum_hours', signature, tuple(by) if isinstance(by, list) else by, sort)
+    version = AGGREGATION_CACHE.version_of(signature) if signature is not None else None
+    return AGGREGATION_CACHE.get_or_compute(key, lambda: sum_hours(df, by, sort), version)
+
+def apply_filters(df, config):
+    """Áp dụng các bộ lọc dữ liệu dựa trên cấu hình.
+
+    `df` có thể là DataFrame, FilterIndex (lọc qua chỉ mục vị trí) hoặc TimesheetStore
+    (lọc bằng SQL). Kết quả được lấy ra một lần, không sao chép toàn bộ dữ liệu.
+    """
+    # ✅ Nhiều năm (so sánh) được ưu tiên, sau đó 1 hoặc nhiều năm (báo cáo tiêu chuẩn)
+    years = config.get('years') or config.get('year')
+    years = years if isinstance(years, list) else ([years] if years else None)
+
+    # ✅ Lọc theo project: trả dataframe rỗng nếu không có project
+    if config['project_filter_df'].empty:
+        return select_rows(df, limit=0)
+    selected_project_names = config['project_filter_df']['Project Name'].tolist()
+
+    # Cùng lựa chọn ở tab khác / phiên khác -> lấy lại kết quả từ cache
+    return cached_select_rows(df, years, config.get('months'), selected_project_names)
+
+# =======================================
+# CACHE FILE BÁO CÁO (THEO NỘI DUNG YÊU CẦU)
+# =======================================
+# Báo cáo Excel / PDF đã xuất được lưu trên đĩa theo khóa băm của (phiên bản dữ liệu, loại báo cáo,
+# cấu hình chuẩn hóa, filter_mode, ngôn ngữ): cùng yêu cầu trên cùng dữ liệu -> chép lại file đã có
+# thay vì dựng lại. Mỗi mục là một thư mục <cache>/<khóa>/ gồm các file báo cáo + meta.json; thời
+# điểm dùng gần nhất là mtime của meta.json nên LRU dùng chung được giữa các tiến trình.
+REPORT_CACHE_DIR = os.path.join(SNAPSHOT_DIR_NAME, "reports")
+REPORT_CACHE_MAX_MB = 512
+# Tăng khi thay đổi cách dựng báo cáo để không phục vụ lại file cũ
+REPORT_CACHE_FORMAT_VERSION = 1
+REPORT_CACHE_META = "meta.json"
+# Các khóa cấu hình do hàm xuất báo cáo tự ghi vào (kết quả, không phải yêu cầu)
+REPORT_CACHE_VOLATILE_KEYS = ('exported_files', 'filtered_projects')
+
+def _normalize_config_value(key, value):
+    month_rank = {m: i for i, m in enumerate(MONTH_ORDER)}
+    if isinstance(value, pd.DataFrame):
+        # project_filter_df: danh sách (dự án, Include) không phụ thuộc thứ tự dòng
+        return sorted(map(list, value.astype(str).itertuples(index=False, name=None)))
+    if key in ('year', 'years'):
+        return sorted({int(y) for y in _as_list(value)})
+    if key == 'months':
+        return sorted({str(m) for m in _as_list(value)}, key=lambda m: (month_rank.get(m, 12), m))
+    if key in ('projects', 'selected_projects'):
+        return sorted({str(p) for p in _as_list(value)})
+    if isinstance(value, (list, tuple)):
+        return [_normalize_config_value(None, v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def normalize_report_config(config):
+    """Dạng chuẩn của cấu hình báo cáo: bỏ khóa kết quả, năm / tháng / dự án không phụ thuộc thứ tự."""
+    return {str(key): _normalize_config_value(key, value) for key, value in sorted(config.items(), key=lambda kv: str(kv[0]))
+            if key not in REPORT_CACHE_VOLATILE_KEYS}
+
+def report_cache_key(version, report_type, config, filter_mode=None, language=None):
+    """Khóa cache của một báo cáo; None khi không biết phiên bản dữ liệu (không cache)."""
+    if not version:
+        return None
+    payload = {
+        'format': REPORT_CACHE_FORMAT_VERSION,
+        'version': str(version),
+        'report': report_type,
+        'config': normalize_report_config(config),
+        'filter_mode': filter_mode,
+        'language': language,
+    }
+    text = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def _file_suffix(path, stem):
+    """Phần tên file sau `stem` (vd: '.xlsx', '_part_2024.xlsx'); None nếu không cùng tên gốc."""
+    name = os.path.basename(path)
+    return name[len(stem):] if name.startswith(stem) else None
+
+class ReportCache:
+    """Cache file báo cáo trên đĩa, giới hạn tổng dung lượng, loại mục lâu không dùng nhất (LRU)."""
+
+    def __init__(self, cache_dir=REPORT_CACHE_DIR, max_bytes=REPORT_CACHE_MAX_MB << 20):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Một đối tượng dùng chung cho mọi phiên (mỗi phiên một thread) -> last_hit riêng từng thread
+        self._local = threading.local()
+
+    @property
+    def last_hit(self):
+        """Lần gọi cached_export gần nhất của thread hiện tại có lấy từ cache không."""
+        return getattr(self._local, 'last_hit', False)
+
+    @last_hit.setter
+    def last_hit(self, value):
+        self._local.last_hit = value
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def lookup(self, key, output_path):
+        """Chép các file của mục `key` ra cạnh `output_path`; trả về meta của mục hoặc None nếu chưa có."""
+        entry = self._entry_dir(key)
+        meta_path = os.path.join(entry, REPORT_CACHE_META)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            stem = os.path.splitext(os.path.basename(output_path))[0]
+            out_dir = os.path.dirname(output_path)
+            if out_dir:
+                os.makedirs(out_dir, exist_ok=True)
+            files = []
+            for i, suffix in enumerate(meta['files']):
+                target = os.path.join(out_dir, stem + suffix)
+                shutil.copyfile(os.path.join(entry, f"{i}{os.path.splitext(suffix)[1]}"), target)
+                files.append(target)
+            os.utime(meta_path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # Mục hỏng hoặc vừa bị loại bởi tiến trình khác -> coi như chưa có
+            print(f"⚠️ Không đọc được báo cáo trong cache ({key[:12]}): {e}")
+            return None
+        meta['paths'] = files
+        return meta
+
+    def store(self, key, output_path, files=None, result=True):
+        """Lưu file báo cáo (file chính + các file phần cùng tên gốc) vào cache, rồi loại bớt mục cũ."""
+        stem = os.path.splitext(os.path.basename(output_path))[0]
+        exported_files = bool(files)
+        files = list(files) if files else [output_path]
+        suffixes = [_file_suffix(path, stem) for path in files]
+        if None in suffixes or not all(os.path.exists(path) for path in files):
+            return False
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=".tmp_", dir=self.cache_dir)
+        try:
+            for i, (path, suffix) in enumerate(zip(files, suffixes)):
+                shutil.copyfile(path, os.path.join(tmp_dir, f"{i}{os.path.splitext(suffix)[1]}"))
+            meta = {'files': suffixes, 'exported_files': exported_files,
+                    'result': list(result) if isinstance(result, tuple) else result,
+                    'created': datetime.now().isoformat(timespec='seconds')}
+            with open(os.path.join(tmp_dir, REPORT_CACHE_META), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False, indent=2)
+            # Đổi tên nguyên tử: phiên khác không bao giờ thấy một mục ghi dở
+            os.replace(tmp_dir, self._entry_dir(key))
+        except OSError:
+            # Phiên khác vừa lưu cùng khóa -> giữ bản đã có
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return False
+        self.evict()
+        return True
+
+    def entries(self):
+        """Các mục trong cache: danh sách (lần dùng cuối, dung lượng, thư mục), cũ nhất trước."""
+        items = []
+        if not os.path.isdir(self.cache_dir):
+            return items
+        for name in os.listdir(self.cache_dir):
+            entry = self._entry_dir(name)
+            try:
+                used = os.path.getmtime(os.path.join(entry, REPORT_CACHE_META))
+                size = sum(e.stat().st_size for e in os.scandir(entry) if e.is_file())
+            except OSError:
+                continue
+            items.append((used, size, entry))
+        return sorted(items)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Xóa các mục lâu không dùng nhất cho đến khi tổng dung lượng <= max_bytes."""
+        with self._lock:
+            items = self.entries()
+            total = sum(size for _, size, _ in items)
+            for _, size, entry in items:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+def _report_succeeded(result):
+    return bool(result[0]) if isinstance(result, tuple) else bool(result)
+
+def cached_export(cache, key, output_path, render, config=None):
+    """Phục vụ báo cáo từ cache nếu đã có, ngược lại gọi `render()` và lưu file kết quả vào cache.
+
+    `render` là lời gọi export_* ghi ra `output_path`, trả về True/False hoặc (thành công, thông báo).
+    Các file phần của export_report (config['exported_files']) được cache cùng file chính.
+    """
+    cache.last_hit = False
+    meta = cache.lookup(key, output_path) if key else None
+    if meta is not None:
+        cache._count(hit=True)
+        cache.last_hit = True
+        if meta.get('exported_files') and config is not None:
+            config['exported_files'] = meta['paths']
+        print(f"♻️ Báo cáo lấy từ cache: {output_path}")
+        result = meta.get('result', True)
+        return tuple(result) if isinstance(result, list) else result
+
+    if key:
+        cache._count(hit=False)
+    result = render()
+    if key and _report_succeeded(result) and os.path.exists(output_path):
+        cache.store(key, output_path, (config or {}).get('exported_files'), result)
+    return result
+
+# =======================================
+# GHI EXCEL STREAMING (WRITE-ONLY)
+# =======================================
+# Workbook write-only của openpyxl ghi từng dòng thẳng ra file tạm của sheet: không giữ DOM,
+# mỗi sheet và biểu đồ được ghi một lần theo thứ tự, RAM không phụ thuộc số dòng của báo cáo.
+EXCEL_HEADER_FONT = Font(bold=True)
+
+def excel_text(value):
+    """Chuỗi ghi được vào ô Excel: bỏ ký tự điều khiển openpyxl không cho phép, tối đa 32.767 ký tự."""
+    return ILLEGAL_CHARACTERS_RE.sub('', value[:32767]) if isinstance(value, str) else value
+
+def excel_value_rows(df, chunk_size=RAW_DATA_CHUNK_SIZE):
+    """Các dòng (tuple) của DataFrame để ghi Excel, chuyển từng khối: NaN / NaT -> ô trống."""
+    text_cols = [col for col in df.columns
+                 if not pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_datetime64_any_dtype(df[col])]
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size].astype(object)
+        for col in text_cols:
+            chunk[col] = chunk[col].map(excel_text)
+        yield from chunk.where(chunk.notna(), None).itertuples(index=False, name=None)
+
+def header_cells(ws, columns):
+    """Các ô tiêu đề (in đậm) cho một dòng của worksheet write-only."""
+    cells = []
+    for col in columns:
+        cell = WriteOnlyCell(ws, value=str(col))
+        cell.font = EXCEL_HEADER_FONT
+        cells.append(cell)
+    return cells
+
+def write_frame(ws, df, header=True):
+    """Ghi DataFrame vào worksheet write-only theo từng khối, trả về số dòng đã ghi."""
+    if isinstance(ws, DeferredSheet):
+        ws.append_frame(df, header)
+        return len(df) + (1 if header else 0)
+    if header:
+        ws.append(header_cells(ws, df.columns))
+    for row in excel_value_rows(df):
+        ws.append(row)
+    return len(df) + (1 if header else 0)
+
+def add_frame_table(ws, name, columns, n_rows, style="TableStyleMedium9"):
+    """Đánh dấu vùng vừa ghi bởi write_frame (tiêu đề + `n_rows` dòng) là Excel Table tên `name`.
+
+    Worksheet write-only không đọc lại được ô tiêu đề nên tên cột của Table được khai báo trực tiếp.
+    """
+    if n_rows < 1 or not len(columns):
+        return None
+    ref = f"A1:{get_column_letter(len(columns))}{n_rows + 1}"
+    # AutoFilter: lọc bảng theo 'Project name' / 'Task' ngay trong Excel
+    table = Table(displayName=re.sub(r'\W', '_', name), ref=ref, autoFilter=AutoFilter(ref=ref))
+    table.tableColumns = [TableColumn(id=i, name=str(col)) for i, col in enumerate(columns, 1)]
+    table.tableStyleInfo = TableStyleInfo(name=style, showRowStripes=True)
+    with warnings.catch_warnings():
+        # openpyxl luôn cảnh báo ở chế độ write-only dù tên cột đã được khai báo như trên
+        warnings.simplefilter("ignore", UserWarning)
+        ws.add_table(table)
+    return table
+
+def sheet_link_cell(ws, text, sheet_title):
+    """Ô (write-only) chứa liên kết nội bộ tới ô A1 của sheet `sheet_title`."""
+    cell = WriteOnlyCell(ws, value=text)
+    cell.hyperlink = Hyperlink(ref="A1", location=f"'{sheet_title}'!A1")
+    return cell
+
+def unique_sheet_title(wb, title):
+    """Tên sheet chưa có trong workbook (thêm hậu tố " (2)", " (3)", ... nếu trùng, tối đa 31 ký tự)."""
+    candidate, n = title, 1
+    while candidate in wb.sheetnames:
+        n += 1
+        suffix = f" ({n})"
+        candidate = title[:31 - len(suffix)] + suffix
+    return candidate
+
+def bar_chart(ws, title, x_title, y_title, data_col, cat_col, min_row, max_row):
+    """BarChart đọc cột `data_col` (dòng `min_row` là tiêu đề) và nhãn ở cột `cat_col`."""
+    chart = BarChart()
+    chart.title = title
+    chart.x_axis.title = x_title
+    chart.y_axis.title = y_title
+    chart.add_data(Reference(ws, min_col=data_col, min_row=min_row, max_row=max_row), titles_from_data=True)
+    chart.set_categories(Reference(ws, min_col=cat_col, min_row=min_row + 1, max_row=max_row))
+    return chart
+
+# =======================================
+# XUẤT EXCEL SONG SONG (GHÉP GÓI XLSX)
+# =======================================
+# Với dữ liệu lớn, nội dung sheet (dòng thô, sheet dự án) không đi qua openpyxl từng ô: openpyxl chỉ
+# dựng "khung" workbook (sheet rỗng, biểu đồ, Table, styles, rels), còn các phần tử <row> của từng
+# sheet được render trong process pool rồi ghép vào khung trong một lượt ghi zip.
+# Render song song từ EXCEL_ASSEMBLY_MIN_ROWS dòng, hoặc từ EXCEL_ASSEMBLY_MIN_SHEETS dự án (mỗi dự án một
+# sheet: vài trăm sheet nhỏ qua openpyxl cũng chậm như một sheet lớn)
+EXCEL_ASSEMBLY_MIN_ROWS = 50_000
+EXCEL_ASSEMBLY_MIN_SHEETS = 100
+EXCEL_RENDER_JOB_ROWS = 50_000
+EXCEL_RENDER_MIN_JOB_ROWS = 2_000
+EXCEL_EPOCH = pd.Timestamp(1899, 12, 30)
+SHEET_DATA_RE = re.compile(rb"<sheetData\s*/>|<sheetData>\s*</sheetData>")
+XLSX_NS = {
+    'main': "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+    'rel': "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    'pkg': "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+
+class SheetLink:
+    """Ô chữ có liên kết nội bộ (vd: "'RawData'!A1") trong một sheet được render sau."""
+    def __init__(self, text, location):
+        self.text = text
+        self.location = location
+
+class DeferredSheet:
+    """Worksheet write-only mà các dòng được ghi lại thành khối để render XML sau (xem render_sheet_job).
+
+    Biểu đồ và Table vẫn gắn vào worksheet thật của khung workbook, nên rels / content types
+    do openpyxl tạo như bình thường.
+    """
+    def __init__(self, ws):
+        self.ws = ws
+        self.blocks = []
+
+    @property
+    def title(self):
+        return self.ws.title
+
+    def append(self, row):
+        values = []
+        for value in row:
+            if isinstance(value, Cell):
+                link = value.hyperlink
+                value = SheetLink(value.value, link.location) if link is not None and link.location else value.value
+            values.append(value)
+        self.blocks.append(('row', values))
+
+    def append_frame(self, df, header=True):
+        self.blocks.append(('frame', df, header))
+
+    def add_chart(self, chart, anchor=None):
+        self.ws.add_chart(chart, anchor)
+
+    def add_table(self, table):
+        self.ws.add_table(table)
+
+def _xml_text(value):
+    """Phần tử <is> (chuỗi inline) của một ô chữ, như openpyxl ghi."""
+    value = escape(excel_text(value))
+    space = ' xml:space="preserve"' if value != value.strip() else ''
+    return f'<is><t{space}>{value}</t></is>'
+
+def _xml_number(value):
+    return "%.16g" % value
+
+def _xml_cell(ref, value, styles):
+    """XML của một ô với giá trị Python bất kỳ ('' nếu ô trống)."""
+    if value is None or value is pd.NaT or (isinstance(value, (float, np.floating)) and not np.isfinite(value)):
+        return ''
+    if isinstance(value, SheetLink):
+        return f'<c r="{ref}" t="inlineStr">{_xml_text(str(value.text))}</c>'
+    if isinstance(value, (bool, np.bool_)):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return f'<c r="{ref}" t="n"><v>{_xml_number(value)}</v></c>'
+    if isinstance(value, datetime):
+        return f'<c r="{ref}" s="{styles["date"]}" t="n"><v>{_xml_number(to_excel(value))}</v></c>'
+    return f'<c r="{ref}" t="inlineStr">{_xml_text(str(value))}</c>'
+
+def _column_cells(series, letter, rows, styles):
+    """XML các ô của một cột (vector hóa theo kiểu dữ liệu của cột)."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        # Mỗi category chỉ escape một lần
+        texts = [_xml_text(str(c)) for c in dtype.categories]
+        return ['' if code < 0 else f'<c r="{letter}{r}" t="inlineStr">{texts[code]}</c>'
+                for r, code in zip(rows, series.cat.codes.tolist())]
+    if pd.api.types.is_datetime64_any_dtype(dtype) and getattr(dtype, 'tz', None) is None:
+        day_start = series.dt.normalize()
+        days = (day_start - EXCEL_EPOCH).dt.days
+        days = days - ((days > 0) & (days <= 60))  # năm 1900 nhuận giả của Excel, như to_excel
+        serials = (days + (series - day_start).dt.total_seconds() / 86400).tolist()
+        style = styles["date"]
+        return ['' if v != v else f'<c r="{letter}{r}" s="{style}" t="n"><v>{_xml_number(v)}</v></c>'
+                for r, v in zip(rows, serials)]
+    if pd.api.types.is_bool_dtype(dtype):
+        return [f'<c r="{letter}{r}" t="b"><v>{int(v)}</v></c>' for r, v in zip(rows, series.tolist())]
+    if pd.api.types.is_numeric_dtype(dtype):
+        return ['' if v != v or v in (np.inf, -np.inf) else f'<c r="{letter}{r}" t="n"><v>{_xml_number(v)}</v></c>'
+                for r, v in zip(rows, series.tolist())]
+    return [_xml_cell(f"{letter}{r}", v, styles) for r, v in zip(rows, series.astype(object).tolist())]
+
+def _merge_extents(extents):
+    """Vùng bao (dòng đầu, cột đầu, dòng cuối, cột cuối) của các vùng; None nếu không có ô nào."""
+    extents = [e for e in extents if e]
+    if not extents:
+        return None
+    return (min(e[0] for e in extents), min(e[1] for e in extents),
+            max(e[2] for e in extents), max(e[3] for e in extents))
+
+def _frame_rows_xml(df, start_row, header, styles):
+    """Các phần tử <row> của một DataFrame bắt đầu từ dòng `start_row` (tiêu đề in đậm nếu `header`).
+
+    Trả về (các dòng XML, vùng các ô có giá trị).
+    """
+    letters = [get_column_letter(i) for i in range(1, len(df.columns) + 1)]
+    out, extents = [], []
+    if header and letters:
+        cells = ''.join(f'<c r="{letter}{start_row}" s="{styles["header"]}" t="inlineStr">{_xml_text(str(col))}</c>'
+                        for letter, col in zip(letters, df.columns))
+        out.append(f'<row r="{start_row}">{cells}</row>')
+        extents.append((start_row, 1, start_row, len(letters)))
+    if header:
+        start_row += 1
+    rows = range(start_row, start_row + len(df))
+    columns = [_column_cells(df.iloc[:, j], letters[j], rows, styles) for j in range(len(letters))]
+    filled = [j + 1 for j, cells in enumerate(columns) if any(cells)]
+    first = last = None
+    for r, cells in zip(rows, zip(*columns)):
+        cells = ''.join(cells)
+        out.append(f'<row r="{r}">{cells}</row>')
+        if cells:
+            first = first or r
+            last = r
+    if filled:
+        extents.append((first, filled[0], last, filled[-1]))
+    return out, _merge_extents(extents)
+
+def render_sheet_job(pieces, styles, out_dir):
+    """Render các đoạn sheet (chạy trong process con) ra file XML trong `out_dir`.
+
+    `pieces`: danh sách (khóa, dòng bắt đầu, các khối).
+    Trả về {khóa: (file, các (ô, vị trí liên kết), vùng các ô có giá trị)}.
+    """
+    results = {}
+    for key, row_no, blocks in pieces:
+        out, links, extents = [], [], []
+        for block in blocks:
+            if block[0] == 'frame':
+                _, df, header = block
+                rows, extent = _frame_rows_xml(df, row_no, header, styles)
+                out.extend(rows)
+                extents.append(extent)
+                row_no += len(df) + (1 if header else 0)
+                continue
+            cells = []
+            for col, value in enumerate(block[1], 1):
+                ref = f"{get_column_letter(col)}{row_no}"
+                if isinstance(value, SheetLink):
+                    links.append((ref, value.location))
+                cells.append(_xml_cell(ref, value, styles))
+            filled = [col for col, cell in enumerate(cells, 1) if cell]
+            if filled:
+                out.append(f'<row r="{row_no}">{"".join(cells)}</row>')
+                extents.append((row_no, filled[0], row_no, filled[-1]))
+            row_no += 1
+        path = os.path.join(out_dir, "sheet_{}_{}.xml".format(*key))
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(out)
+        results[key] = (path, links, _merge_extents(extents))
+    return results
+
+def _block_rows(block):
+    return len(block[1]) + (1 if block[2] else 0) if block[0] == 'frame' else 1
+
+def _split_blocks(blocks, max_rows):
+    """Các khối của một sheet, khối DataFrame lớn được cắt thành các khối tối đa `max_rows` dòng."""
+    for block in blocks:
+        if block[0] != 'frame' or len(block[1]) <= max_rows:
+            yield block
+            continue
+        _, df, header = block
+        for start in range(0, len(df), max_rows):
+            yield 'frame', df.iloc[start:start + max_rows], header and start == 0
+
+def plan_render_jobs(deferred, job_rows=EXCEL_RENDER_JOB_ROWS):
+    """Chia nội dung các DeferredSheet thành các job khoảng `job_rows` dòng.
+
+    Sheet lớn được cắt thành nhiều đoạn, các sheet nhỏ được gom chung một job. Mỗi đoạn có khóa
+    (số thứ tự sheet, số thứ tự đoạn) để ghép lại đúng thứ tự.
+    """
+    jobs, job, job_size = [], [], 0
+    for sheet_no, sheet in enumerate(deferred):
+        row_no, seq, blocks, size = 1, 0, [], 0
+        for block in _split_blocks(sheet.blocks, job_rows):
+            blocks.append(block)
+            size += _block_rows(block)
+            if size >= job_rows:
+                # Đoạn đủ lớn: đóng đoạn và job hiện tại
+                job.append(((sheet_no, seq), row_no, blocks))
+                jobs.append(job)
+                job, job_size = [], 0
+                row_no, seq, blocks, size = row_no + size, seq + 1, [], 0
+        if blocks:
+            job.append(((sheet_no, seq), row_no, blocks))
+            job_size += size
+            if job_size >= job_rows:
+                jobs.append(job)
+                job, job_size = [], 0
+    if job:
+        jobs.append(job)
+    return jobs
+
+def _sheet_parts(archive):
+    """Tên sheet -> đường dẫn phần XML của sheet trong gói xlsx."""
+    workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+    rels = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    targets = {rel.get('Id'): rel.get('Target') for rel in rels.findall('pkg:Relationship', XLSX_NS)}
+    parts = {}
+    for sheet in workbook.find('main:sheets', XLSX_NS):
+        target = targets[sheet.get(f"{{{XLSX_NS['rel']}}}id")]
+        parts[sheet.get('name')] = target.lstrip('/') if target.startswith('/') else f"xl/{target}"
+    return parts
+
+# Thứ tự các phần tử con của <worksheet> (CT_Worksheet trong ECMA-376): Excel từ chối file sai thứ tự
+WORKSHEET_ELEMENTS = (
+    'sheetPr', 'dimension', 'sheetViews', 'sheetFormatPr', 'cols', 'sheetData', 'sheetCalcPr',
+    'sheetProtection', 'protectedRanges', 'scenarios', 'autoFilter', 'sortState', 'dataConsolidate',
+    'customSheetViews', 'mergeCells', 'phoneticPr', 'conditionalFormatting', 'dataValidations',
+    'hyperlinks', 'printOptions', 'pageMargins', 'pageSetup', 'headerFooter', 'rowBreaks', 'colBreaks',
+    'customProperties', 'cellWatches', 'ignoredErrors', 'smartTags', 'drawing', 'legacyDrawing',
+    'legacyDrawingHF', 'picture', 'oleObjects', 'controls', 'webPublishItems', 'tableParts', 'extLst',
+)
+
+def _insert_sheet_element(xml, name, element, end=None):
+    """Chèn phần tử `name` vào đoạn XML của <worksheet> trước phần tử đứng sau nó theo WORKSHEET_ELEMENTS.
+
+    Không có phần tử nào đứng sau -> chèn tại vị trí `end` (mặc định: cuối đoạn).
+    """
+    later = WORKSHEET_ELEMENTS[WORKSHEET_ELEMENTS.index(name) + 1:]
+    found = re.search(rb'<(?:' + '|'.join(later).encode() + rb')[\s/>]', xml)
+    pos = found.start() if found else (len(xml) if end is None else end)
+    return xml[:pos] + element + xml[pos:]
+
+def _with_dimension(head, extent):
+    """Phần đầu sheet (trước <sheetData>) với <dimension> đúng vùng các ô của dữ liệu ghép vào."""
+    head = re.sub(rb'<dimension\b[^>]*/>', b'', head)
+    if not extent:
+        return head
+    min_row, min_col, max_row, max_col = extent
+    ref = f"{get_column_letter(min_col)}{min_row}"
+    if (min_row, min_col) != (max_row, max_col):
+        ref += f":{get_column_letter(max_col)}{max_row}"
+    return _insert_sheet_element(head, 'dimension', f'<dimension ref="{ref}"/>'.encode())
+
+def assemble_workbook(skeleton_path, output_path, fragments):
+    """Ghép khung workbook và các đoạn XML <row> thành file .xlsx trong một lượt ghi zip.
+
+    `fragments`: tên sheet -> (danh sách file đoạn theo thứ tự, các (ô, vị trí liên kết),
+    vùng các ô có giá trị hoặc None).
+    """
+    with zipfile.ZipFile(skeleton_path) as src, \
+            zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as dst:
+        parts = {part: fragments[title] for title, part in _sheet_parts(src).items() if title in fragments}
+        for info in src.infolist():
+            if info.filename not in parts:
+                dst.writestr(info, src.read(info.filename))
+                continue
+            paths, links, extent = parts[info.filename]
+            head, tail = SHEET_DATA_RE.split(src.read(info.filename), maxsplit=1)
+            if links:
+                # Liên kết nội bộ dùng thuộc tính location, không cần quan hệ (rels)
+                hyperlinks = ("<hyperlinks>" + ''.join(
+                    f'<hyperlink ref="{ref}" location={quoteattr(location)}/>' for ref, location in links
+                ) + "</hyperlinks>").encode('utf-8')
+                tail = _insert_sheet_element(tail, 'hyperlinks', hyperlinks, end=tail.rindex(b"</worksheet>"))
+            with dst.open(info.filename, 'w', force_zip64=True) as out:
+                out.write(_with_dimension(head, extent) + b"<sheetData>")
+                for path in paths:
+                    with open(path, 'rb') as f:
+                        shutil.copyfileobj(f, out)
+                out.write(b"</sheetData>")
+                out.write(tail)
+
+def use_sheet_assembly(df):
+    """True nếu các sheet dữ liệu của `df` nên được render song song (nhiều dòng hoặc nhiều dự án)."""
+    if len(df) >= EXCEL_ASSEMBLY_MIN_ROWS:
+        return True
+    return 'Project name' in df.columns and df['Project name'].nunique() >= EXCEL_ASSEMBLY_MIN_SHEETS
+
+def save_workbook(wb, output_path, deferred=(), max_workers=None):
+    """Lưu workbook write-only; nội dung các DeferredSheet được render song song rồi ghép vào file.
+
+    Không chạy được process pool -> render tuần tự (giống load_workbooks).
+    """
+    if not deferred:
+        wb.save(output_path)
+        return
+    # Đăng ký style tiêu đề / ngày giờ trong khung để các đoạn XML dùng chung chỉ số style
+    ws = deferred[0].ws
+    styles = {'header': header_cells(ws, ['_'])[0].style_id,
+              'date': WriteOnlyCell(ws, value=datetime(2000, 1, 1)).style_id}
+    out_dir = tempfile.mkdtemp(prefix="xlsx_parts_", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        skeleton_path = os.path.join(out_dir, "skeleton.xlsx")
+        wb.save(skeleton_path)
+        workers = max_workers or os.cpu_count() or 1
+        # Nhiều sheet nhỏ: job nhỏ hơn EXCEL_RENDER_JOB_ROWS để mọi process đều có việc
+        total_rows = sum(_block_rows(block) for sheet in deferred for block in sheet.blocks)
+        job_rows = min(EXCEL_RENDER_JOB_ROWS, max(EXCEL_RENDER_MIN_JOB_ROWS, -(-total_rows // workers)))
+        jobs = plan_render_jobs(deferred, job_rows)
+        results = None
+        workers = min(len(jobs), workers)
+        if workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(render_sheet_job, jobs, [styles] * len(jobs), [out_dir] * len(jobs)))
+            except Exception as e:
+                print(f"⚠️ Không chạy được process pool, render tuần tự: {e}")
+        if results is None:
+            results = [render_sheet_job(job, styles, out_dir) for job in jobs]
+        rendered = {key: value for result in results for key, value in result.items()}
+        fragments = {}
+        for sheet_no, sheet in enumerate(deferred):
+            keys = sorted(key for key in rendered if key[0] == sheet_no)
+            fragments[sheet.title] = ([rendered[key][0] for key in keys],
+                                      [link for key in keys for link in rendered[key][1]],
+                                      _merge_extents(rendered[key][2] for key in keys))
+        assemble_workbook(skeleton_path, output_path, fragments)
+        print(f"🧵 Ghép {len(deferred)} sheet từ {len(jobs)} job render ({workers} process)")
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
 
-    return df_filtered
+# =======================================
+# CHIA NHỎ DỮ LIỆU THÔ KHI XUẤT EXCEL (SHARDING)
+# =======================================
+# Một sheet Excel chứa tối đa 1.048.576 dòng. Dữ liệu thô (sheet RawData và phần dòng thô của
+# sheet dự án) được chia theo năm và/hoặc theo ngân sách dòng ra nhiều sheet hoặc nhiều workbook;
+# sheet 'Manifest' của báo cáo chính ghi lại mỗi phần nằm ở file / sheet nào.
+EXCEL_MAX_ROWS = 1_048_576
+SHARD_ROW_BUDGET = EXCEL_MAX_ROWS - 1  # chừa dòng tiêu đề
+SHARD_BY_OPTIONS = ('none', 'year', 'rows')
+SHARD_TARGETS = ('sheets', 'files')
+MANIFEST_COLUMNS = ['File', 'Sheet', 'Content', 'Shard', 'Rows', 'From', 'To']
+
+def shard_policy(config):
+    """(shard_by, row_budget, target) từ các khóa 'shard_by', 'shard_rows', 'shard_target' của config.
+
+    shard_by='none' (mặc định) chỉ chia khi vượt giới hạn dòng của Excel; 'rows' / 'year' dùng thêm
+    ngân sách 'shard_rows'.
+    """
+    shard_by = str(config.get('shard_by') or 'none').strip().lower()
+    if shard_by not in SHARD_BY_OPTIONS:
+        shard_by = 'none'
+    try:
+        row_budget = int(config.get('shard_rows') or SHARD_ROW_BUDGET) if shard_by != 'none' else SHARD_ROW_BUDGET
+    except (TypeError, ValueError):
+        row_budget = SHARD_ROW_BUDGET
+    row_budget = min(max(row_budget, 1), SHARD_ROW_BUDGET)
+    target = str(config.get('shard_target') or 'sheets').strip().lower()
+    if target not in SHARD_TARGETS:
+        target = 'sheets'
+    return shard_by, row_budget, target
+
+def plan_shards(df, shard_by='none', row_budget=SHARD_ROW_BUDGET):
+    """Các phần (nhãn, frame) của dữ liệu thô, mỗi phần tối đa `row_budget` dòng.
+
+    shard_by='year': mỗi năm một phần (nhãn "2024", năm quá ngân sách -> "2024-1", "2024-2", ...);
+    ngược lại chỉ chia theo ngân sách dòng (nhãn "1", "2", ...). Không cần chia -> một phần nhãn None.
+    """
+    if shard_by == 'year' and 'Year' in df.columns and not df.empty:
+        groups = ((str(year), part) for year, part in df.groupby('Year', sort=True))
+    else:
+        groups = [(None, df)]
+    for label, part in groups:
+        n_pieces = max(-(-len(part) // row_budget), 1)
+        for i in range(n_pieces):
+            piece = part.iloc[i * row_budget:(i + 1) * row_budget]
+            if n_pieces == 1:
+                yield label, piece
+            else:
+                yield (f"{label}-{i + 1}" if label else str(i + 1)), piece
 
-def export_report(df, config, output_file_path):
-    """Xuất báo cáo tiêu chuẩn ra file Excel."""
+def count_shards(df, shard_by='none', row_budget=SHARD_ROW_BUDGET):
+    """Số phần mà plan_shards sẽ tạo (không sao chép dữ liệu)."""
+    if shard_by == 'year' and 'Year' in df.columns and not df.empty:
+        sizes = df['Year'].value_counts().tolist()
+    else:
+        sizes = [len(df)]
+    return sum(max(-(-size // row_budget), 1) for size in sizes)
+
+def shard_sheet_title(base, label):
+    """Tên sheet cho một phần: "RawData" hoặc "RawData 2024" (tối đa 31 ký tự)."""
+    return base if label is None else f"{base} {label}"[:31]
+
+def shard_file_path(output_file_path, label):
+    """File của một phần khi chia ra nhiều workbook: Report.xlsx -> Report_part_2024.xlsx."""
+    stem, ext = os.path.splitext(output_file_path)
+    return f"{stem}_part_{label or 1}{ext or '.xlsx'}"
+
+def manifest_entry(file_path, sheet, content, label, df):
+    """Một dòng của sheet Manifest (xem MANIFEST_COLUMNS) cho `df` được ghi vào file / sheet."""
+    dates = pd.to_datetime(df['Date'], errors='coerce') if 'Date' in df.columns and not df.empty else None
+    first = dates.min() if dates is not None else None
+    last = dates.max() if dates is not None else None
+    return [os.path.basename(file_path), sheet, content, label or '', len(df),
+            None if pd.isna(first) else first.date(), None if pd.isna(last) else last.date()]
+
+def write_manifest(ws, entries):
+    """Ghi sheet Manifest: mỗi phần dữ liệu thô một dòng."""
+    ws.append(header_cells(ws, MANIFEST_COLUMNS))
+    for entry in entries:
+        ws.append(entry)
+
+def write_shard_workbook(file_path, df, label, raw_title='RawData', normalized=False, max_workers=None):
+    """Ghi một phần dữ liệu thô ra workbook riêng (streaming): sheet `raw_title` và mỗi dự án một sheet.
+
+    normalized=True: chỉ ghi sheet `raw_title` dưới dạng Excel Table, không lặp lại dòng theo dự án.
+    Trả về các dòng Manifest của file vừa ghi.
+    """
+    wb = Workbook(write_only=True)
+    deferred = []
+    assemble = use_sheet_assembly(df)
+
+    def data_sheet(title):
+        ws = wb.create_sheet(title)
+        if assemble:
+            ws = DeferredSheet(ws)
+            deferred.append(ws)
+        return ws
+
+    ws = data_sheet(raw_title)
+    write_frame(ws, df)
+    entries = [manifest_entry(file_path, raw_title, raw_title, label, df)]
+    if normalized:
+        add_frame_table(ws, raw_title, df.columns, len(df))
+    else:
+        for project, df_proj in split_by_project(df):
+            title = unique_sheet_title(wb, sanitize_filename(project))
+            write_frame(data_sheet(title), df_proj)
+            entries.append(manifest_entry(file_path, title, project, label, df_proj))
+    save_workbook(wb, file_path, deferred, max_workers)
+    return entries
+
+# Bố cục báo cáo tiêu chuẩn: "classic" lặp lại dòng thô trong từng sheet dự án; "normalized" ghi
+# dòng thô một lần (Excel Table trên sheet RawData), sheet dự án chỉ có bảng tổng hợp và biểu đồ
+EXCEL_LAYOUTS = ('classic', 'normalized')
+
+def export_report(df, config, output_file_path, cube=None, max_workers=None):
+    """Xuất báo cáo tiêu chuẩn ra file Excel.
+
+    `df` là dữ liệu thô đã lọc (ghi vào sheet RawData); các bảng tổng hợp được cộng từ `cube`
+    (cube giờ công đã lọc cùng cấu hình), dựng từ `df` nếu không truyền vào.
+    Các sheet (Summary, RawData, từng dự án, Config_Info) được ghi một lượt bằng workbook write-only.
+    Dữ liệu thô vượt ngân sách dòng được chia theo `shard_policy(config)`: sang nhiều sheet, hoặc
+    sang các file "<tên>_part_<nhãn>.xlsx"; khi đó sheet Manifest liệt kê từng phần.
+    config['layout'] = "normalized": dòng thô chỉ ghi một lần dưới dạng Excel Table (xem EXCEL_LAYOUTS).
+    Từ EXCEL_ASSEMBLY_MIN_ROWS dòng hoặc EXCEL_ASSEMBLY_MIN_SHEETS dự án, các sheet dữ liệu được render
+    song song (tối đa `max_workers` process) và ghép thẳng vào gói xlsx (xem save_workbook).
+    Danh sách file đã ghi được lưu vào config['exported_files'].
+    """
     mode = config.get('mode', 'year')
     
     groupby_cols = []
@@ -158,93 +2721,117 @@ def export_report(df, config, output_file_path):
         print("Cảnh báo: DataFrame đã lọc trống, không có báo cáo nào được tạo.")
         return False
 
-    summary = df.groupby(groupby_cols)['Hours'].sum().reset_index()
+    if cube is None:
+        cube = build_hours_cube(df)
+    df = export_frame(df)
 
-    try:
-        with pd.ExcelWriter(output_file_path, engine='openpyxl') as writer:
-            # Ghi summary cơ bản để giữ nguyên dòng xử lý
-            df.to_excel(writer, sheet_name='RawData', index=False)
-
-        wb = load_workbook(output_file_path)
-
-        # === Ghi summary dạng MonthName - Hours ===
-        summary_chart = df.groupby('MonthName')['Hours'].sum().reset_index()
-        summary_chart = summary_chart.sort_values('MonthName', key=lambda x: pd.to_datetime(x, format='%B'))
-
-        if 'Summary' in wb.sheetnames:
-            ws = wb['Summary']
-            wb.remove(ws)
-        ws = wb.create_sheet("Summary", 0)
-
-        ws.append(['MonthName', 'Hours'])
-        for row in summary_chart.itertuples(index=False):
-            ws.append([row.MonthName, row.Hours])
-
-        # Thêm biểu đồ vào sheet Summary
-        data_ref = Reference(ws, min_col=2, min_row=1, max_row=1 + len(summary_chart))
-        cats_ref = Reference(ws, min_col=1, min_row=2, max_row=1 + len(summary_chart))
-
-        chart = BarChart()
-        chart.title = "Total Hours by Month"
-        chart.x_axis.title = "Month"
-        chart.y_axis.title = "Hours"
-        chart.add_data(data_ref, titles_from_data=True)
-        chart.set_categories(cats_ref)
-        ws.add_chart(chart, "E2")
-
-        for project in df['Project name'].unique():
-            df_proj = df[df['Project name'] == project]
-            sheet_title = sanitize_filename(project)
-            
-            if sheet_title in wb.sheetnames:
-                ws_proj = wb[sheet_title]
-            else:
-                ws_proj = wb.create_sheet(title=sheet_title)
+    normalized = str(config.get('layout') or 'classic').strip().lower() == 'normalized'
+    shard_by, row_budget, target = shard_policy(config)
+    to_files = target == 'files'
+    # Manifest được ghi khi có chính sách chia hoặc dữ liệu buộc phải chia; mặc định báo cáo không đổi
+    sharded = to_files or shard_by != 'none' or count_shards(df, shard_by, row_budget) > 1
+    manifest = []
+    exported_files = [output_file_path]
+    deferred = []
+    assemble = use_sheet_assembly(df)
 
-            summary_task = df_proj.groupby('Task')['Hours'].sum().reset_index().sort_values('Hours', ascending=False)
-            
+    try:
+        wb = Workbook(write_only=True)
+
+        def data_sheet(title):
+            """Sheet chứa dòng dữ liệu; với dữ liệu lớn nội dung được render khi lưu (save_workbook)."""
+            ws = wb.create_sheet(title)
+            if assemble:
+                ws = DeferredSheet(ws)
+                deferred.append(ws)
+            return ws
+
+        # === Summary: MonthName - Hours kèm biểu đồ ===
+        # MonthName là category có thứ tự theo tháng -> kết quả đã đúng thứ tự tháng
+        summary_chart = sum_hours(cube, 'MonthName').reset_index()
+        ws = wb.create_sheet("Summary")
+        n_rows = write_frame(ws, summary_chart)
+        ws.add_chart(bar_chart(ws, "Total Hours by Month", "Month", "Hours", 2, 1, 1, n_rows), "E2")
+
+        if to_files:
+            # Mỗi phần một workbook riêng, ghi xong mới sang phần kế tiếp
+            for label, part in plan_shards(df, shard_by, row_budget):
+                part_path = shard_file_path(output_file_path, label)
+                manifest.extend(write_shard_workbook(part_path, part, label, normalized=normalized,
+                                                     max_workers=max_workers))
+                exported_files.append(part_path)
+            raw_link = "Manifest"
+        else:
+            raw_link = None
+            for label, part in plan_shards(df, shard_by, row_budget):
+                title = unique_sheet_title(wb, shard_sheet_title("RawData", label))
+                ws = data_sheet(title)
+                write_frame(ws, part)
+                if normalized:
+                    add_frame_table(ws, title, part.columns, len(part))
+                manifest.append(manifest_entry(output_file_path, title, "RawData", label, part))
+                raw_link = raw_link or title
+
+        # Chia dữ liệu thô theo dự án một lần; tổng giờ theo Task của mọi dự án trong một groupby trên cube
+        task_summaries = hours_by_project(cube, 'Task')
+        # Bố cục normalized không cần frame con của từng dự án, chỉ cần tên (cùng thứ tự xuất hiện)
+        projects = ((project, None) for project in df['Project name'].dropna().unique()) if normalized \
+            else split_by_project(df)
+        for project, df_proj in projects:
+            ws_proj = data_sheet(unique_sheet_title(wb, sanitize_filename(project)))
+
+            summary_task = task_summaries.get(project, pd.Series(name='Hours', index=pd.Index([], name='Task')))
+            summary_task = summary_task.reset_index().sort_values('Hours', ascending=False)
+
+            used_rows = 0
             if not summary_task.empty:
-                ws_proj.append(['Task', 'Hours'])
-                for row_data in dataframe_to_rows(summary_task, index=False, header=False):
-                    ws_proj.append(row_data)
-
-                chart_task = BarChart()
-                chart_task.title = f"{project} - Hours by Task"
-                chart_task.x_axis.title = "Task"
-                chart_task.y_axis.title = "Hours"
-                task_len = len(summary_task)
-                
-                data_ref_task = Reference(ws_proj, min_col=2, min_row=1, max_row=task_len + 1)
-                cats_ref_task = Reference(ws_proj, min_col=1, min_row=2, max_row=task_len + 1)
-                chart_task.add_data(data_ref_task, titles_from_data=True)
-                chart_task.set_categories(cats_ref_task)
-                ws_proj.add_chart(chart_task, f"E1")
-
-            start_row_raw_data = ws_proj.max_row + 2 if ws_proj.max_row > 1 else 1
+                n_rows = write_frame(ws_proj, summary_task)
+                ws_proj.add_chart(bar_chart(ws_proj, f"{project} - Hours by Task", "Task", "Hours",
+                                            2, 1, 1, n_rows), "E1")
+                if normalized:
+                    ws_proj.append([])
+            if normalized:
+                # Không lặp lại dòng thô: liên kết tới bảng RawData (lọc theo 'Project name')
+                ws_proj.append([sheet_link_cell(ws_proj, f"Raw data → {raw_link}", raw_link)])
+                continue
             if not summary_task.empty:
-                start_row_raw_data += 15
+                # Chừa chỗ cho biểu đồ: dữ liệu thô bắt đầu sau bảng Task 1 dòng trống + 15 dòng
+                for _ in range(16):
+                    ws_proj.append([])
+                used_rows = n_rows + 16
+
+            if to_files:
+                # Dòng thô của dự án nằm trong các file phần (xem Manifest)
+                continue
+            # Phần đầu nằm dưới bảng Task, các phần sau sang sheet tiếp nối "<dự án> (2)", ...
+            project_budget = min(row_budget, SHARD_ROW_BUDGET - used_rows)
+            for i, (label, part) in enumerate(plan_shards(df_proj, shard_by, project_budget)):
+                if i > 0:
+                    ws_proj = data_sheet(unique_sheet_title(wb, sanitize_filename(project)))
+                write_frame(ws_proj, part)
+                if sharded:
+                    manifest.append(manifest_entry(output_file_path, ws_proj.title, project, label, part))
 
-            for r_idx, r in enumerate(dataframe_to_rows(df_proj, index=False, header=True)):
-                for c_idx, cell_val in enumerate(r):
-                    ws_proj.cell(row=start_row_raw_data + r_idx, column=c_idx + 1, value=cell_val)
-        
         ws_config = wb.create_sheet("Config_Info")
-        ws_config['A1'], ws_config['B1'] = "Mode", config.get('mode', 'N/A').capitalize()
-        ws_config['A2'], ws_config['B2'] = "Year(s)", ', '.join(map(str, config.get('years', []))) if config.get('years') else str(config.get('year', 'N/A'))
-        ws_config['A3'], ws_config['B3'] = "Months", ', '.join(config.get('months', [])) if config.get('months') else "All"
-        
+        ws_config.append(["Mode", config.get('mode', 'N/A').capitalize()])
+        ws_config.append(["Year(s)", ', '.join(map(str, config.get('years', []))) if config.get('years') else str(config.get('year', 'N/A'))])
+        ws_config.append(["Months", ', '.join(config.get('months', [])) if config.get('months') else "All"])
+
         if 'project_filter_df' in config and not config['project_filter_df'].empty:
             selected_projects_display = config['project_filter_df'][config['project_filter_df']['Include'].astype(str).str.lower() == 'yes']['Project Name'].tolist()
-            ws_config['A4'], ws_config['B4'] = "Projects Included", ', '.join(selected_projects_display)
+            ws_config.append(["Projects Included", ', '.join(selected_projects_display)])
         else:
-            ws_config['A4'], ws_config['B4'] = "Projects Included", "No projects selected or found"
+            ws_config.append(["Projects Included", "No projects selected or found"])
 
-        # Remove template sheets
-        for sheet_name in ['Raw Data', 'Config_Year_Mode', 'Config_Project_Filter']:
-            if sheet_name in wb.sheetnames:
-                del wb[sheet_name]
+        if normalized:
+            ws_config.append(["Layout", "Normalized"])
+        if sharded:
+            ws_config.append(["Sharding", f"{shard_by} / {row_budget} rows / {target}"])
+            write_manifest(wb.create_sheet("Manifest"), manifest)
+            print(f"🧩 Dữ liệu thô được chia ({shard_by}, {row_budget} dòng, {target}): {len(manifest)} mục trong sheet Manifest")
 
-        wb.save(output_file_path)
+        save_workbook(wb, output_file_path, deferred, max_workers)
+        config['exported_files'] = exported_files
         return True
     except Exception as e:
         print(f"Lỗi khi xuất báo cáo tiêu chuẩn: {e}")
@@ -252,7 +2839,10 @@ def export_report(df, config, output_file_path):
 
 
 def export_pdf_report(df, config, pdf_report_path, logo_path):
-    """Xuất báo cáo PDF tiêu chuẩn với các biểu đồ."""
+    """Xuất báo cáo PDF tiêu chuẩn với các biểu đồ.
+
+    Chỉ dùng số liệu tổng hợp nên `df` có thể là dữ liệu thô hoặc cube giờ công đã lọc.
+    """
     if not pdf_report_path:
         raise ValueError("❌ pdf_report_path is empty. Please check where it's defined.")
         
@@ -266,8 +2856,8 @@ def export_pdf_report(df, config, pdf_report_path, logo_path):
         if 'MonthName' not in df.columns or 'Hours' not in df.columns:
             raise ValueError("⚠️ Thiếu cột 'MonthName' hoặc 'Hours' trong dữ liệu. Không thể tạo biểu đồ.")
             
-        summary_chart = df.groupby('MonthName')['Hours'].sum().reset_index()
-        summary_chart = summary_chart.sort_values('MonthName', key=lambda x: pd.to_datetime(x, format='%B'))
+        # MonthName là category có thứ tự theo tháng -> kết quả đã đúng thứ tự tháng
+        summary_chart = sum_hours(df, 'MonthName').reset_index()
 
         fig, ax = plt.subplots(figsize=(10, 6))
         bars = ax.bar(summary_chart['MonthName'], summary_chart['Hours'], color='skyblue')  # <- gán vào biến bars
@@ -286,12 +2876,14 @@ def export_pdf_report(df, config, pdf_report_path, logo_path):
         charts_for_pdf.append((chart_path, "Total hour by month", None))
         # 🟩 Thêm biểu đồ Workcentre & Task theo từng dự án
         if 'Project name' in df.columns:
+            # Tổng giờ theo Workcentre / Task của mọi dự án, mỗi loại một groupby
+            wc_summaries = hours_by_project(df, 'Workcentre')
+            task_summaries = hours_by_project(df, 'Task')
             for project in df['Project name'].dropna().unique():
                 safe_project = sanitize_filename(project)
-                df_proj = df[df['Project name'] == project]
             # Workcentre
-                if 'Workcentre' in df_proj.columns and not df_proj['Workcentre'].empty:
-                    wc_summary = df_proj.groupby('Workcentre')['Hours'].sum().sort_values(ascending=False)
+                if project in wc_summaries:
+                    wc_summary = wc_summaries[project].sort_values(ascending=False)
                     if not wc_summary.empty and wc_summary.sum() > 0:
                         fig, ax = plt.subplots(figsize=(10, 5))
                         bars = ax.barh(wc_summary.index, wc_summary.values, color='skyblue')
@@ -306,8 +2898,8 @@ def export_pdf_report(df, config, pdf_report_path, logo_path):
                         plt.close(fig)
                         charts_for_pdf.append((wc_path, f"{project} - Hours by Workcentre", project))
                 # Task
-                if 'Task' in df_proj.columns and not df_proj['Task'].empty:
-                    task_summary = df_proj.groupby('Task')['Hours'].sum().sort_values(ascending=False)
+                if project in task_summaries:
+                    task_summary = task_summaries[project].sort_values(ascending=False)
                     if not task_summary.empty and task_summary.sum() > 0:
                         fig, ax = plt.subplots(figsize=(10, 6))
                         bars = ax.barh(task_summary.index, task_summary.values, color='lightgreen')
@@ -483,7 +3075,30 @@ def create_comparison_chart(df, mode, title, x_label, y_label, path, config, fil
         os.makedirs(output_dir, exist_ok=True)
         charts = {}
 
-        df = df.copy()  # tránh cảnh báo SettingWithCopy
+        # Không sửa DataFrame của người gọi: lọc / assign trả về frame mới, không cần copy()
+
+        # Bảng chênh lệch giữa hai kỳ (compute_period_delta): một biểu đồ Change theo dòng, bỏ dòng 'Total'
+        if 'Change' in df.columns:
+            df_delta = df[df['Project Name'] != 'Total']
+            if df_delta.empty:
+                return {}
+            label_cols = list(df.columns[:df.columns.get_loc('Previous Hours')])
+            labels = df_delta[label_cols].astype(str).agg(' / '.join, axis=1)
+
+            fig, ax = plt.subplots(figsize=(15.7, 8.3))
+            bars = ax.bar(labels, df_delta['Change'], color=np.where(df_delta['Change'] >= 0, 'seagreen', 'indianred'))
+            ax.axhline(0, color='grey', linewidth=0.8)
+            ax.set_title(title)
+            ax.set_xlabel(x_label)
+            ax.set_ylabel(y_label)
+            ax.bar_label(bars, fontsize=8, rotation=90, label_type='edge', padding=2)
+            plt.xticks(rotation=45, ha='right')
+            plt.tight_layout()
+            chart_path = os.path.join(output_dir, "chart_delta.png")
+            fig.savefig(chart_path, dpi=150)
+            plt.close(fig)
+            charts["delta"] = chart_path
+            return charts
 
         # ✅ Lọc theo filter_mode
         if filter_mode == "Task":
@@ -491,68 +3106,44 @@ def create_comparison_chart(df, mode, title, x_label, y_label, path, config, fil
         elif filter_mode == "Workcentre":
             df = df[df['Workcentre'] != 'All']
         elif filter_mode == "Total":
-            df.loc[:, 'Task'] = 'All'
-            df.loc[:, 'Workcentre'] = 'All'
+            df = df.assign(Task='All', Workcentre='All')
 
         if df.empty:
             print(f"⚠️ [DEBUG] Data trống sau lọc trong biểu đồ: mode={filter_mode}, title={title}")
             return {}
 
-        if 'MonthName' in df.columns:
-            month_order = ['January', 'February', 'March', 'April', 'May', 'June',
-                           'July', 'August', 'September', 'October', 'November', 'December']
-            df['MonthName'] = pd.Categorical(df['MonthName'], categories=month_order, ordered=True)
-
-        # Biểu đồ theo thời gian (YearMonth)
+        # Biểu đồ theo thời gian: ma trận Dự án x YearMonth ("YYYY-MM", đúng thứ tự thời gian, ô trống = 0)
+        # dựng một lần; mỗi dự án là một cột của ma trận chuyển vị. Chỉ có một mốc thời gian -> bỏ qua.
         if 'Year' in df.columns and 'MonthName' in df.columns:
-            df['YearMonth'] = df['Year'].astype(str) + "-" + df['MonthName'].astype(str)
-            
-            # ✅ Gom nhóm để tránh trùng dòng và tính tổng chính xác
-            df_sorted = df.groupby(['Project Name', 'Year', 'MonthName', 'YearMonth'], as_index=False)['Total Hours'].sum()
-
-            projects = df_sorted['Project Name'].unique()
-            all_yearmonths = sorted(df_sorted['YearMonth'].unique())
-            x = np.arange(len(all_yearmonths))
-            width = 0.8 / len(projects) if len(projects) > 1 else 0.6
-
-            fig, ax = plt.subplots(figsize=(15, 8.3))
-
-            for i, project in enumerate(projects):
-                df_proj = df_sorted[df_sorted['Project Name'] == project]
-                y_vals = []
-                for ym in all_yearmonths:
-                    match = df_proj[df_proj['YearMonth'] == ym]
-                    y = match['Total Hours'].sum() if not match.empty else 0  # ✅ Lấy tổng thay vì dòng đầu
-                    y_vals.append(y)
-                    
-                ax.bar(x + i * width, y_vals, width=width, label=project)
-                
-                for j, val in enumerate(y_vals):
-                    if val > 0:
-                        ax.annotate(f"{val:.0f}", xy=(x[j] + i * width, val), xytext=(0, 5),
-                                    textcoords="offset points", ha='center', fontsize=8, rotation=90)
+            df_time = pivot_hours(df, 'Project Name', 'YearMonth', measure='Total Hours', margins=False).set_index('Project Name')
+            if df_time.shape[1] <= 1:
+                print("⏭️ Bỏ qua biểu đồ 'time' vì chỉ có 1 mốc thời gian.")
+            else:
+                fig, ax = plt.subplots(figsize=(15, 8.3))
+                df_time.T.plot(kind='bar', ax=ax, width=0.8)
+                for container in ax.containers:
+                    ax.bar_label(container, labels=[f"{v:.0f}" if v > 0 else "" for v in container.datavalues],
+                                 padding=5, fontsize=8, rotation=90)
 
-            ax.set_title(f"{title} - Over Time")
-            ax.set_xlabel(x_label)
-            ax.set_ylabel(y_label)
-            ax.set_xticks(x + width * (len(projects) - 1) / 2)
-            ax.set_xticklabels(all_yearmonths, rotation=45, ha='right')
+                ax.set_title(f"{title} - Over Time")
+                ax.set_xlabel(x_label)
+                ax.set_ylabel(y_label)
+                ax.set_xticklabels(df_time.columns, rotation=45, ha='right')
 
-            ax.legend(loc='upper center', bbox_to_anchor=(0.5, -0.20), ncol=5, fontsize=8)
+                ax.legend(loc='upper center', bbox_to_anchor=(0.5, -0.20), ncol=5, fontsize=8)
 
-            plt.tight_layout()
-            chart_path = os.path.join(output_dir, "chart_time.png")
-            fig.savefig(chart_path, dpi=150)
-            plt.close(fig)
-            charts["time"] = chart_path
+                plt.tight_layout()
+                chart_path = os.path.join(output_dir, "chart_time.png")
+                fig.savefig(chart_path, dpi=150)
+                plt.close(fig)
+                charts["time"] = chart_path
 
         # Biểu đồ theo Task
         if 'Task' in df.columns and filter_mode == "Task":
-            df_task = df.groupby(['Task', 'Project Name'], as_index=False)['Total Hours'].sum()
-            if df_task.empty:
+            df_pivot = pivot_hours(df, 'Task', 'Project Name', measure='Total Hours', margins=False).set_index('Task')
+            if df_pivot.empty:
                 print(f"⚠️ Không có dữ liệu để vẽ biểu đồ Task cho {title}")
             else:
-                df_pivot = df_task.pivot(index='Task', columns='Project Name', values='Total Hours').fillna(0)
                 fig, ax = plt.subplots(figsize=(11.7, 8.3))
                 bars = df_pivot.plot(kind='bar', ax=ax)
                 for container in bars.containers:
@@ -578,11 +3169,10 @@ def create_comparison_chart(df, mode, title, x_label, y_label, path, config, fil
                 
         # Biểu đồ theo Workcentre
         if 'Workcentre' in df.columns and filter_mode == "Workcentre":
-            df_wc = df.groupby(['Workcentre', 'Project Name'], as_index=False)['Total Hours'].sum()
-            if df_wc.empty:
+            df_pivot = pivot_hours(df, 'Workcentre', 'Project Name', measure='Total Hours', margins=False).set_index('Workcentre')
+            if df_pivot.empty:
                 print(f"⚠️ Không có dữ liệu để vẽ biểu đồ Workcentre cho {title}")
             else:
-                df_pivot = df_wc.pivot(index='Workcentre', columns='Project Name', values='Total Hours').fillna(0)
                 fig, ax = plt.subplots(figsize=(15, 8.3))  # Khổ A4 ngang chuẩn
 
                 bars = df_pivot.plot(kind='bar', ax=ax)
@@ -623,7 +3213,7 @@ def create_comparison_chart(df, mode, title, x_label, y_label, path, config, fil
                 charts["workcentre"] = chart_path
         # Biểu đồ tổng giờ (Total)
         if filter_mode == "Total":
-            df_total = df.groupby("Project Name", as_index=False)["Total Hours"].sum()
+            df_total = pivot_hours(df, "Project Name", measure="Total Hours", margins=False, margins_name="Total Hours")
 
             if df_total.empty:
                 print("⚠️ Không có dữ liệu để vẽ biểu đồ tổng giờ theo dự án.")
@@ -668,7 +3258,7 @@ def export_comparison_pdf_report(df_comparison, comparison_config, pdf_file_path
     print("DEBUG: df_comparison.columns =", df_comparison.columns.tolist())
     print("DEBUG: df_comparison sample:\n", df_comparison.head())
        
-    if 'Hours' not in df_comparison.columns:
+    if 'Hours' not in df_comparison.columns and 'Change' not in df_comparison.columns:
         raise ValueError("❌ Column 'Hours' is missing in df_comparison.")    
     if df_comparison.empty:
         print("WARNING: df_comparison is empty. Skipping PDF report export.")
@@ -729,6 +3319,12 @@ def generate_comparison_pdf_report(df_comparison, comparison_config, pdf_file_pa
         elif comparison_mode in ["So Sánh Nhiều Dự Án Qua Các Tháng/Năm", "Compare Projects Over Time (Months/Years)"]:
             chart_title = "So sánh giờ theo nhiều dự án qua các tháng và năm"
             x_label = "Năm-Tháng"
+
+        elif comparison_mode in ["So Sánh Chênh Lệch Giữa Hai Kỳ", "Compare Period over Period"]:
+            current = tuple(comparison_config['current_period'])
+            previous = tuple(comparison_config.get('previous_period') or previous_period(current))
+            chart_title = f"Chênh lệch giờ: {period_label(current)} so với {period_label(previous)}"
+            x_label = "Dự án"
         else:
             chart_title = "Biểu đồ so sánh giờ"
             x_label = ""
@@ -748,27 +3344,19 @@ def generate_comparison_pdf_report(df_comparison, comparison_config, pdf_file_pa
             config=comparison_config,
             filter_mode=filter_mode # ✅ Thêm dòng này để truyền filter_mode
         )
-                # ✅ Kiểm tra nếu chỉ có 1 Year-Month → bỏ biểu đồ time
-        only_one_time_point = False
-        if "Year" in df_comparison.columns and "MonthName" in df_comparison.columns:
-            df_temp = df_comparison.copy()
-            df_temp["YearMonth"] = df_temp["Year"].astype(str) + "-" + df_temp["MonthName"].astype(str)
-            only_one_time_point = df_temp["YearMonth"].nunique() <= 1
-        
+        # Biểu đồ 'time' chỉ được tạo khi ma trận Dự án x YearMonth có từ 2 mốc thời gian trở lên
         if charts_dict:
             print("🧪 Tổng số biểu đồ được tạo:", len(charts_dict))
             chart_title_map = {
                 "time": "So sánh giờ theo thời gian",
                 "total": "Tổng giờ theo từng dự án",  # ✅ thêm dòng này
                 "task": "So sánh giờ theo Task giữa các dự án",
-                "workcentre": "So sánh giờ theo Workcentre giữa các dự án"
+                "workcentre": "So sánh giờ theo Workcentre giữa các dự án",
+                "delta": "Chênh lệch giờ giữa hai kỳ"
             }
             print("[DEBUG] charts_dict keys:", list(charts_dict.keys()))
             
-            for key in ["time", "total", "task", "workcentre"]:  # ✅ duyệt theo thứ tự ưu tiên
-                if key == "time" and only_one_time_point:
-                    print(f"⏭️ Bỏ qua biểu đồ '{key}' vì chỉ có 1 mốc thời gian.")
-                    continue  # ✅ Bỏ qua biểu đồ time nếu không có đủ mốc thời gian
+            for key in ["time", "total", "task", "workcentre", "delta"]:  # ✅ duyệt theo thứ tự ưu tiên
                 chart_path = charts_dict.get(key)
                 print(f"[DEBUG] chart {key} path = {chart_path}, exists = {os.path.exists(chart_path or '')}")
                 if chart_path and os.path.exists(chart_path):
@@ -803,8 +3391,30 @@ def generate_comparison_pdf_report(df_comparison, comparison_config, pdf_file_pa
             shutil.rmtree(tmp_dir)
 
 def apply_comparison_filters(df_raw, comparison_config, comparison_mode, filter_mode="Total"):
+    """Lọc và dựng dữ liệu so sánh; kết quả được cache theo chữ ký lựa chọn (xem AGGREGATION_CACHE)."""
+    filter_mode = filter_mode or comparison_config.get("filter_mode", "Total")
+    version = source_version(df_raw)
+    # Chế độ chênh lệch: hai kỳ và các chiều chi tiết cũng là một phần của khóa
+    periods = tuple(tuple(comparison_config[k]) if comparison_config.get(k) else None
+                    for k in ('current_period', 'previous_period'))
+    key = aggregation_signature(
+        version, ('comparison', comparison_mode) + periods, comparison_config.get('years'),
+        comparison_config.get('months'), [p for p in comparison_config.get('selected_projects', []) if str(p).strip()],
+        filter_mode, by=comparison_config.get('delta_by')
+    ) if version else None
+
+    def compute():
+        result = _apply_comparison_filters(df_raw, comparison_config, comparison_mode, filter_mode)
+        return result + (comparison_config.get("filtered_projects"),)
+
+    df_comparison, message, selected_projects, filtered_projects = AGGREGATION_CACHE.get_or_compute(key, compute, version)
+    if filtered_projects is not None:
+        comparison_config["filtered_projects"] = list(filtered_projects)
+    return df_comparison, message, list(selected_projects)
+
+def _apply_comparison_filters(df_raw, comparison_config, comparison_mode, filter_mode="Total"):
     print("DEBUG: apply_comparison_filters called with:")
-    if not isinstance(df_raw, pd.DataFrame):
+    if not isinstance(df_raw, (pd.DataFrame, FilterIndex, TimesheetStore)):
         return pd.DataFrame(), "Dữ liệu đầu vào không hợp lệ.", []   
 
     print(f"  df_raw type: {type(df_raw)}")
@@ -822,21 +3432,20 @@ def apply_comparison_filters(df_raw, comparison_config, comparison_mode, filter_
     print(f"   - Selected Projects: {selected_projects}")
     print(f"   - Filter Mode: {filter_mode}")
 
-    df_filtered = df_raw.copy()
-    df_filtered['Hours'] = pd.to_numeric(df_filtered['Hours'], errors='coerce').fillna(0)
+    if not selected_projects:
+        comparison_config["filtered_projects"] = selected_projects
+        return pd.DataFrame(), "Vui lòng chọn ít nhất một dự án để so sánh.", []
 
-    if years:
-        df_filtered = df_filtered[df_filtered['Year'].isin(years)]
+    # Năm / tháng / dự án được lọc một lần qua chỉ mục (hoặc SQL), không sao chép toàn bộ dữ liệu
+    df_filtered = select_rows(df_raw, years, months, selected_projects)
+    df_filtered['Hours'] = pd.to_numeric(df_filtered['Hours'], errors='coerce').fillna(0)
     if months:
-        df_filtered = df_filtered[df_filtered['MonthName'].isin(months)]
         # ✅ Loại bỏ các dự án không có dữ liệu
         df_filtered_projects = df_filtered['Project name'].unique().tolist()
         selected_projects = [p for p in selected_projects if p in df_filtered_projects]
     # ✅ Luôn gán filtered_projects vào config
     comparison_config["filtered_projects"] = selected_projects
-    if selected_projects:
-        df_filtered = df_filtered[df_filtered['Project name'].isin(selected_projects)]
-    else:
+    if not selected_projects:
         return pd.DataFrame(), "Vui lòng chọn ít nhất một dự án để so sánh.", []
     
     if df_filtered.empty:
@@ -848,8 +3457,7 @@ def apply_comparison_filters(df_raw, comparison_config, comparison_mode, filter_
         if len(years) != 1 or len(months) != 1 or len(selected_projects) < 2:
             return pd.DataFrame(), "Vui lòng chọn MỘT năm, MỘT tháng và ít nhất HAI dự án cho chế độ này.", []
         
-        df_comparison = df_filtered.copy()
-        df_comparison.rename(columns={'Project name': 'Project Name'}, inplace=True)
+        df_comparison = df_filtered.rename(columns={'Project name': 'Project Name'})
         df_comparison['Total Hours'] = df_comparison['Hours']
         if 'Task' not in df_comparison.columns:
             df_comparison['Task'] = 'All'
@@ -875,39 +3483,18 @@ def apply_comparison_filters(df_raw, comparison_config, comparison_mode, filter_
         if len(years) != 1 or len(selected_projects) < 2:
             return pd.DataFrame(), "Vui lòng chọn MỘT năm và ít nhất HAI dự án cho chế độ này.", []
 
-        df_pivot = df_filtered.groupby(['Project name', 'MonthName'])['Hours'].sum().unstack(fill_value=0)
-        month_order = ['January', 'February', 'March', 'April', 'May', 'June',
-                       'July', 'August', 'September', 'October', 'November', 'December']
-        existing_months = [m for m in month_order if m in df_pivot.columns]
-        df_pivot = df_pivot[existing_months]
-        
-        df_comparison = df_pivot.reset_index()
-        df_comparison['Total Hours'] = df_comparison[existing_months].sum(axis=1)
-        df_comparison.rename(columns={'Project name': 'Project Name'}, inplace=True)
+        # Ma trận Dự án x Tháng kèm cột 'Total Hours' và dòng 'Total' trong một lần pivot
+        df_comparison = pivot_hours(df_filtered, 'Project name', 'MonthName', margins_name='Total Hours', row_label='Total')
+        df_comparison = df_comparison.rename(columns={'Project name': 'Project Name'})
         df_comparison['Hours'] = df_comparison['Total Hours']
-        if 'Task' not in df_comparison.columns:
-            df_comparison['Task'] = 'All'
-        if 'Workcentre' not in df_comparison.columns:
-            df_comparison['Workcentre'] = 'All'
+        df_comparison['Task'] = 'All'
+        df_comparison['Workcentre'] = 'All'
 
+        # Ma trận không có chiều Task / Workcentre (mọi dòng là 'All')
         if filter_mode == "Task":
             df_comparison = df_comparison[df_comparison['Task'] != 'All']
         elif filter_mode == "Workcentre":
             df_comparison = df_comparison[df_comparison['Workcentre'] != 'All']
-        elif filter_mode == "Total":
-            df_comparison['Task'] = 'All'
-            df_comparison['Workcentre'] = 'All'
-
-        # ➕ Dòng tổng hợp
-        df_total_row = pd.DataFrame([{
-            'Project Name': 'Total',
-            **{col: df_comparison[col].sum() for col in existing_months + ['Total Hours']}
-        }])
-        df_total_row['Hours'] = df_total_row['Total Hours']
-        df_total_row['Task'] = 'All'
-        df_total_row['Workcentre'] = 'All'
-
-        df_comparison = pd.concat([df_comparison, df_total_row], ignore_index=True)
 
         title = f"So sánh giờ giữa các dự án trong năm {years[0]} (theo tháng)"
         print("📊 df_comparison shape after filter:", df_comparison.shape)
@@ -921,8 +3508,7 @@ def apply_comparison_filters(df_raw, comparison_config, comparison_mode, filter_
         if months:
             df_filtered = df_filtered[df_filtered['MonthName'].isin(months)]
 
-        df_comparison = df_filtered.copy()
-        df_comparison.rename(columns={'Project name': 'Project Name'}, inplace=True)
+        df_comparison = df_filtered.rename(columns={'Project name': 'Project Name'})
         df_comparison['Total Hours'] = df_comparison['Hours']
         if 'Task' not in df_comparison.columns:
             df_comparison['Task'] = 'All'
@@ -941,10 +3527,55 @@ def apply_comparison_filters(df_raw, comparison_config, comparison_mode, filter_
         title = "So sánh nhiều dự án qua các năm và tháng"
         return df_comparison, title, selected_projects
 
+    elif comparison_mode in ["So Sánh Chênh Lệch Giữa Hai Kỳ", "Compare Period over Period"]:
+        current = comparison_config.get('current_period')
+        if not current:
+            return pd.DataFrame(), "Vui lòng chọn kỳ hiện tại để so sánh chênh lệch.", []
+        current = tuple(current)
+        previous = tuple(comparison_config.get('previous_period') or previous_period(current))
+        delta_by = ['Project name'] + [d for d in comparison_config.get('delta_by', [])
+                                       if d in DELTA_DIMENSIONS and d != 'Project name']
+
+        # Hai kỳ được căn hàng và trừ trong một lần pivot (xem compute_period_delta)
+        df_comparison = compute_period_delta(df_filtered, current, previous, delta_by)
+        df_comparison = df_comparison.rename(columns={'Project name': 'Project Name'})
+
+        title = f"Chênh lệch giờ: {period_label(current)} so với {period_label(previous)}"
+        print("📊 df_comparison (delta) preview:\n", df_comparison.head())
+        return df_comparison, title, selected_projects
+
     return pd.DataFrame(), "❌ Chế độ so sánh không hỗ trợ.", []
 
+def comparison_matrix(df_comparison, comparison_config, comparison_mode, filter_mode="Total"):
+    """Bảng ma trận (pivot_hours) cho sheet 'Comparison Report' của từng chế độ so sánh.
+
+    "Compare Projects in a Year" đã là ma trận Dự án x Tháng nên được giữ nguyên; chế độ chênh lệch
+    chỉ giữ giờ của hai kỳ (Change / Change % nằm ở sheet 'Delta').
+    """
+    if comparison_mode in ["So Sánh Dự Án Trong Một Năm", "Compare Projects in a Year"]:
+        return df_comparison
+    if comparison_mode in ["So Sánh Chênh Lệch Giữa Hai Kỳ", "Compare Period over Period"]:
+        return df_comparison.drop(columns=['Change', 'Change %'])
+    years = comparison_config.get('years', [])
+    if comparison_mode in ["So Sánh Dự Án Trong Một Tháng", "Compare Projects in a Month"]:
+        # Dự án x Task / Workcentre theo filter_mode (Total: chỉ cột tổng)
+        rows, columns = 'Project Name', {'Task': 'Task', 'Workcentre': 'Workcentre'}.get(filter_mode)
+    elif 'MonthName' in df_comparison.columns and len(years) == 1:
+        rows, columns = ['Year', 'MonthName'], 'Project Name'
+    elif not comparison_config.get('months') and len(years) > 1:
+        rows, columns = 'Year', 'Project Name'
+    else:
+        rows, columns = 'YearMonth', 'Project Name'
+    return pivot_hours(df_comparison, rows, columns, measure='Total Hours',
+                       margins_name='Total Hours', row_label='Total')
+
 def export_comparison_report(df_comparison, comparison_config, output_file_path, comparison_mode, filter_mode="Total"):
-    """Xuất báo cáo so sánh ra file Excel."""
+    """Xuất báo cáo so sánh ra file Excel.
+
+    Sheet 'Comparison Report' chứa ma trận của chế độ so sánh (xem `comparison_matrix`), biểu đồ
+    Excel đọc từ ma trận này; các dòng chi tiết (nếu có) nằm ở sheet 'Comparison Data', bảng
+    chênh lệch giữa hai kỳ (chế độ "Compare Period over Period") nằm ở sheet 'Delta'.
+    """
     try:
         # ✅ Đảm bảo thư mục chứa file tồn tại
         os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
@@ -953,7 +3584,13 @@ def export_comparison_report(df_comparison, comparison_config, output_file_path,
                 empty_df_for_excel = pd.DataFrame({"Message": ["Không có dữ liệu để hiển thị với các bộ lọc đã chọn."]})
                 empty_df_for_excel.to_excel(writer, sheet_name='Comparison Report', index=False)
             else:
-                df_comparison.to_excel(writer, sheet_name='Comparison Report', index=False)  
+                df_detail = df_comparison
+                df_comparison = export_frame(comparison_matrix(df_comparison, comparison_config, comparison_mode, filter_mode))
+                df_comparison.to_excel(writer, sheet_name='Comparison Report', index=False)
+                if 'Change' in df_detail.columns:
+                    export_frame(df_detail).to_excel(writer, sheet_name='Delta', index=False)
+                elif df_detail is not df_comparison:
+                    export_frame(df_detail).to_excel(writer, sheet_name='Comparison Data', index=False)
 
             wb = writer.book
             ws = wb['Comparison Report']
@@ -973,12 +3610,18 @@ def export_comparison_report(df_comparison, comparison_config, output_file_path,
             info_row += 1
             ws.cell(row=info_row, column=1, value="Dự án:").font = ws.cell(row=info_row, column=1).font.copy(bold=True)
             ws.cell(row=info_row, column=2, value=', '.join(comparison_config.get('selected_projects', [])))
+            if comparison_config.get('current_period'):
+                current = tuple(comparison_config['current_period'])
+                previous = tuple(comparison_config.get('previous_period') or previous_period(current))
+                info_row += 1
+                ws.cell(row=info_row, column=1, value="Kỳ:").font = ws.cell(row=info_row, column=1).font.copy(bold=True)
+                ws.cell(row=info_row, column=2, value=f"{period_label(current)} so với {period_label(previous)}")
 
             if not df_comparison.empty and len(df_comparison) > 0:
                 chart = None
                 data_start_row = 2 
                 
-                df_chart_data = df_comparison.copy()
+                df_chart_data = df_comparison
                 # ✅ Lọc theo filter_mode nếu là Task hoặc Workcentre
                 if filter_mode == "Task" and "Task" in df_chart_data.columns:
                     df_chart_data = df_chart_data[df_chart_data["Task"].str.strip() != "Total"]
@@ -989,6 +3632,8 @@ def export_comparison_report(df_comparison, comparison_config, output_file_path,
                     df_chart_data = df_chart_data[df_chart_data['Project Name'] != 'Total']
                 elif 'Year' in df_chart_data.columns and 'Total' in df_chart_data['Year'].values:
                     df_chart_data = df_chart_data[df_chart_data['Year'] != 'Total']
+                elif 'YearMonth' in df_chart_data.columns and 'Total' in df_chart_data['YearMonth'].values:
+                    df_chart_data = df_chart_data[df_chart_data['YearMonth'] != 'Total']
                 
                 if df_chart_data.empty: 
                     print("Không có đủ dữ liệu để vẽ biểu đồ so sánh sau khi loại bỏ hàng tổng.")
@@ -1070,9 +3715,42 @@ def export_comparison_report(df_comparison, comparison_config, output_file_path,
                         cats_ref = Reference(ws, min_col=df_comparison.columns.get_loc('Year') + 1, min_row=data_start_row, max_row=max_row_chart)
                         chart.add_data(data_ref, titles_from_data=False)
                         chart.set_categories(cats_ref)
+                    elif 'YearMonth' in df_comparison.columns:
+                        # Biểu đồ cột theo năm-tháng
+                        chart = BarChart()
+                        chart.title = f"Tổng giờ các dự án ({project_list}) theo năm-tháng"
+                        chart.x_axis.title = "Năm-Tháng"
+                        chart.y_axis.title = "Giờ"
+                        data_ref = Reference(ws, min_col=df_comparison.columns.get_loc(total_hours_col_name) + 1, min_row=data_start_row, max_row=max_row_chart)
+                        cats_ref = Reference(ws, min_col=df_comparison.columns.get_loc('YearMonth') + 1, min_row=data_start_row, max_row=max_row_chart)
+                        chart.add_data(data_ref, titles_from_data=False)
+                        chart.set_categories(cats_ref)
                     else:
                         raise ValueError("Không tìm thấy cấu trúc phù hợp để vẽ biểu đồ cho nhiều dự án theo tháng/năm.")
 
+                elif comparison_mode in ["So Sánh Chênh Lệch Giữa Hai Kỳ", "Compare Period over Period"]:
+                    # Các cột đứng trước 'Previous Hours' là nhãn dòng (Dự án [, Workcentre, Task, Employee])
+                    label_cols = df_comparison.columns.get_loc('Previous Hours')
+                    chart = BarChart()
+                    chart.title = "Giờ công của hai kỳ"
+                    chart.x_axis.title = "Dự án"
+                    chart.y_axis.title = "Giờ"
+                    data_ref = Reference(ws, min_col=label_cols + 1, max_col=label_cols + 2, min_row=1, max_row=max_row_chart)
+                    cats_ref = Reference(ws, min_col=1, max_col=label_cols, min_row=data_start_row, max_row=max_row_chart)
+                    chart.add_data(data_ref, titles_from_data=True)
+                    chart.set_categories(cats_ref)
+
+                    # Biểu đồ chênh lệch trên sheet 'Delta' (cùng thứ tự dòng, dòng 'Total' ở cuối)
+                    ws_delta = wb['Delta']
+                    delta_chart = BarChart()
+                    delta_chart.title = "Chênh lệch giờ (kỳ hiện tại - kỳ trước)"
+                    delta_chart.x_axis.title = "Dự án"
+                    delta_chart.y_axis.title = "Giờ"
+                    change_col = df_detail.columns.get_loc('Change') + 1
+                    delta_chart.add_data(Reference(ws_delta, min_col=change_col, min_row=1, max_row=max_row_chart), titles_from_data=True)
+                    delta_chart.set_categories(Reference(ws_delta, min_col=1, max_col=label_cols, min_row=data_start_row, max_row=max_row_chart))
+                    ws_delta.add_chart(delta_chart, f"A{ws_delta.max_row + 3}")
+
                 if chart: 
                     chart_placement_row = info_row + 2
                     ws.add_chart(chart, f"A{chart_placement_row}")
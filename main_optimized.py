@@ -12,6 +12,7 @@ from datetime import datetime, timedelta
 import seaborn as sns
 import matplotlib.pyplot as plt
 import plotly.io as pio
+import zipfile
 
 
 
@@ -23,9 +24,16 @@ import plotly.io as pio
 # HOẶC THAY THẾ TÊN FILE NẾU BẠN ĐÃ ĐỔI TÊN NÓ.
 # ==============================================================================
 from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import (
-    setup_paths, load_raw_data, read_configs,
-    apply_filters, export_report, export_pdf_report,
-    apply_comparison_filters, export_comparison_report, export_comparison_pdf_report
+    setup_paths, load_raw_data, read_configs, load_template,
+    build_calendar_table, week_labels, resolve_workbooks,
+    load_store, select_rows, distinct_values, latest_date, TemplateWatcher, load_rejected_rows,
+    build_hours_cube, build_filter_index,
+    cached_select_rows, cached_sum_hours, AGGREGATION_CACHE, source_version, build_hierarchy_table, HIERARCHY_TOP_N,
+    previous_period, period_label,
+    apply_filters, export_report, export_pdf_report, SHARD_BY_OPTIONS, SHARD_TARGETS, SHARD_ROW_BUDGET,
+    EXCEL_LAYOUTS,
+    apply_comparison_filters, export_comparison_report, export_comparison_pdf_report,
+    ReportCache, report_cache_key, cached_export
 )
 # ==============================================================================
 
@@ -158,6 +166,8 @@ TEXTS = {
         'no_project_selected_warning_standard': "Please select at least one project to generate the standard report.",
         'no_data_after_filter_standard': "⚠️ No data after filtering for the standard report. Please check your selections.",
         'latest_update_date': "Latest data update",
+        'data_version': "Data version",
+        'rejected_rows_header': "⚠️ Ingest validation: {} rejected rows, {} warnings",
         'generating_excel_report': "Generating Excel report...",
         'excel_report_generated': "✅ Excel Report generated: {}",
         'download_excel_report': "📥 Download Excel Report",
@@ -171,6 +181,13 @@ TEXTS = {
         'compare_projects_month': "Compare Projects in a Month",
         'compare_projects_year': "Compare Projects in a Year",
         'compare_projects_over_time': "Compare Projects Over Time (Months/Years)",
+        'compare_period_delta': "Compare Period over Period",
+        'delta_current_period': "Current period",
+        'delta_previous_period': "Compared with (defaults to the previous month / year)",
+        'delta_year': "Year:",
+        'delta_month': "Month:",
+        'delta_whole_year': "Whole year",
+        'delta_breakdown': "Break the change down by (always per project):",
         'filter_data_for_comparison': "Filter Data for Comparison",
         'select_years': "Select Year(s):",
         'select_months_comp': "Select Month(s):",
@@ -197,6 +214,20 @@ TEXTS = {
         'export_options': "Export Options",
         'export_excel_option': "Export as Excel (.xlsx)",
         'export_pdf_option': "Export as PDF (.pdf)",
+        'shard_by_option': "Split raw data",
+        'shard_by_none': "Only when over Excel's row limit",
+        'shard_by_year': "By year",
+        'shard_by_rows': "By row budget",
+        'shard_rows_option': "Rows per piece",
+        'shard_target_option': "Put pieces in",
+        'shard_target_sheets': "Separate sheets",
+        'shard_target_files': "Separate workbooks",
+        'download_excel_parts': "Download all workbooks (.zip)",
+        'report_from_cache': "♻️ {} was served from the report cache (same data and selection).",
+        'layout_option': "Excel layout",
+        'layout_classic': "Raw rows in every project sheet",
+        'layout_normalized': "Raw rows once (Excel Table)",
+        'hierarchy_top_n_option': "Max nodes per level (0 = all):",
         'report_button': "Generate report",
         'no_data': "No data after filtering",
         'report_done': "Report created successfully",
@@ -251,6 +282,13 @@ TEXTS = {
         'compare_projects_month': "So Sánh Dự Án Trong Một Tháng",
         'compare_projects_year': "So Sánh Dự Án Trong Một Năm",
         'compare_projects_over_time': "So Sánh Nhiều Dự Án Qua Các Tháng/Năm",
+        'compare_period_delta': "So Sánh Chênh Lệch Giữa Hai Kỳ",
+        'delta_current_period': "Kỳ hiện tại",
+        'delta_previous_period': "So với kỳ (mặc định: tháng / năm liền trước)",
+        'delta_year': "Năm:",
+        'delta_month': "Tháng:",
+        'delta_whole_year': "Cả năm",
+        'delta_breakdown': "Chi tiết chênh lệch theo (luôn theo dự án):",
         'filter_data_for_comparison': "Lọc dữ liệu để so sánh",
         'select_years': "Chọn năm(các năm):", # Dùng chung cho các mode
         'select_months_comp': "Chọn tháng(các tháng):", # Dùng chung cho các mode
@@ -258,6 +296,8 @@ TEXTS = {
         'generate_comparison_report_btn': "🚀 Tạo báo cáo so sánh",
         'no_data_after_filter_comparison': "⚠️ {}",
         'latest_update_date': "Dữ liệu được cập nhật đến ngày",
+        'data_version': "Phiên bản dữ liệu",
+        'rejected_rows_header': "⚠️ Kiểm tra khi nạp: {} dòng bị loại, {} cảnh báo",
         'data_filtered_success': "✅ Dữ liệu đã được lọc thành công cho so sánh.",
         'comparison_data_preview': "Xem trước dữ liệu so sánh",
         'generating_comparison_excel': "Đang tạo báo cáo Excel so sánh...",
@@ -275,6 +315,20 @@ TEXTS = {
         'export_options': "Tùy chọn xuất báo cáo",
         'export_excel_option': "Xuất ra Excel (.xlsx)",
         'export_pdf_option': "Xuất ra PDF (.pdf)",
+        'shard_by_option': "Chia nhỏ dữ liệu thô",
+        'shard_by_none': "Chỉ khi vượt giới hạn dòng của Excel",
+        'shard_by_year': "Theo năm",
+        'shard_by_rows': "Theo số dòng",
+        'shard_rows_option': "Số dòng mỗi phần",
+        'shard_target_option': "Ghi các phần vào",
+        'shard_target_sheets': "Nhiều sheet",
+        'shard_target_files': "Nhiều file Excel",
+        'download_excel_parts': "Tải tất cả file Excel (.zip)",
+        'report_from_cache': "♻️ {} được lấy từ cache báo cáo (cùng dữ liệu và lựa chọn).",
+        'layout_option': "Bố cục file Excel",
+        'layout_classic': "Dòng thô trong từng sheet dự án",
+        'layout_normalized': "Dòng thô ghi một lần (Excel Table)",
+        'hierarchy_top_n_option': "Số nút tối đa mỗi cấp (0 = tất cả):",
         'report_button': "Tạo báo cáo",
         'no_data': "Không có dữ liệu sau khi lọc",
         'report_done': "Đã tạo báo cáo",
@@ -328,36 +382,86 @@ with col_lang:
     if st.session_state.lang != selected_lang:
         st.session_state.lang = selected_lang
 # Check if template file exists
-if not os.path.exists(path_dict['template_file']):
+# 'template_file' có thể là một file, một thư mục hoặc glob nhiều workbook
+if not any(os.path.exists(p) for p in resolve_workbooks(path_dict['template_file'])):
     st.error(get_text('template_not_found').format(path_dict['template_file']))
     st.stop()
 
-# Load raw data and configurations once
-@st.cache_data(ttl=1800)
-def cached_load():
-    df_raw = load_raw_data(path_dict['template_file'])
-    df = df_raw.copy()
-    config_data = read_configs(path_dict['template_file'])
-    return df_raw, config_data
+# Thread nền theo dõi mtime/size của template, dùng chung cho mọi phiên
+@st.cache_resource
+def get_template_watcher():
+    return TemplateWatcher(path_dict['template_file']).start()
+
+template_watcher = get_template_watcher()
+
+# Cache file báo cáo dùng chung giữa các phiên: cùng yêu cầu trên cùng dữ liệu -> tải ngay file đã có
+@st.cache_resource
+def get_report_cache():
+    return ReportCache(path_dict['report_cache_dir'], path_dict['report_cache_mb'] << 20)
+
+report_cache = get_report_cache()
+data_version = template_watcher.version
+
+# Load raw data and configurations once per data version:
+# cache chỉ bị thay khi template thực sự đổi (data_version đổi), không hết hạn theo thời gian.
+# cache_resource trả về cùng một đối tượng cho mọi phiên và mọi lần rerun (cache_data thì
+# unpickle ra một bản sao mới mỗi lần) -> các frame này dùng chung, chỉ đọc, không được sửa tại chỗ.
+@st.cache_resource(max_entries=1)
+def cached_load(data_version):
+    # Một lần mở workbook cho cả 'Raw Data' và hai sheet cấu hình (nhiều workbook: tải song song)
+    df_raw, config_data = load_template(path_dict['template_file'])
+    # Bảng lịch theo ngày (Year/MonthNum/MonthName/Week/nhãn tuần) dùng chung cho dashboard
+    calendar_df = build_calendar_table(df_raw['Date']) if 'Date' in df_raw.columns else build_calendar_table([])
+    # Dòng bị loại / cảnh báo khi nạp, được lưu cạnh snapshot và cache cùng dataset
+    rejected_rows = load_rejected_rows(path_dict['template_file'])
+    # Cube giờ công dựng một lần cho mỗi phiên bản dữ liệu; biểu đồ / tổng hợp đều cộng từ cube
+    hours_cube = build_hours_cube(df_raw)
+    # Chỉ mục vị trí theo Năm / Tháng / Dự án: mỗi lần lọc chỉ lấy đúng các dòng kết quả
+    # Phiên bản trong chỉ mục là khóa của cache tổng hợp dùng chung giữa các tab / phiên
+    raw_index = build_filter_index(df_raw, f"{data_version}:raw")
+    cube_index = build_filter_index(hours_cube, f"{data_version}:cube")
+    # Dữ liệu mới thay dữ liệu cũ -> bỏ các kết quả tổng hợp của phiên bản cũ khỏi cache dùng chung
+    AGGREGATION_CACHE.retain_versions({raw_index.version, cube_index.version})
+    return df_raw, config_data, calendar_df, rejected_rows, hours_cube, raw_index, cube_index
+
+@st.cache_resource(max_entries=1)
+def cached_store(data_version):
+    # Backend SQLite: chỉ giữ đường dẫn store, dữ liệu được truy vấn theo bộ lọc
+    # Tổng hợp "chunked": store được nạp theo từng khối, dữ liệu thô không bao giờ nằm trọn trong RAM
+    store, config_data = load_store(path_dict['template_file'], chunked=path_dict['aggregation'] == 'chunked')
+    calendar_df = build_calendar_table(pd.to_datetime(pd.Series(store.distinct('Date'))))
+    rejected_rows = load_rejected_rows(path_dict['template_file'])
+    # Cube đã được tính sẵn khi nạp store
+    hours_cube = store.hours_cube()
+    # Dữ liệu thô được lọc bằng SQL (store đóng vai trò chỉ mục); cube có chỉ mục riêng
+    cube_index = build_filter_index(hours_cube, f"{data_version}:cube")
+    AGGREGATION_CACHE.retain_versions({source_version(store), cube_index.version})
+    return store, config_data, calendar_df, rejected_rows, hours_cube, store, cube_index
 
 with st.spinner(get_text('loading_data')):
-    df_raw, config_data = cached_load()
-    df = df_raw.copy()  # ✅ THÊM DÒNG NÀY ở đây
+    # df_raw: DataFrame (backend "memory") hoặc TimesheetStore (backend "sqlite")
+    if path_dict['backend'] == 'sqlite' or path_dict['aggregation'] == 'chunked':
+        df_raw, config_data, calendar_df, rejected_rows, hours_cube, raw_index, cube_index = cached_store(data_version)
+    else:
+        df_raw, config_data, calendar_df, rejected_rows, hours_cube, raw_index, cube_index = cached_load(data_version)
 # Hiển thị ngày cập nhật mới nhất
-if 'Date' in df_raw.columns:
-    latest_date = pd.to_datetime(df_raw['Date'], errors='coerce').max()
-    if pd.notnull(latest_date):
-        st.info(f"📅 {get_text('latest_update_date')}: {latest_date.strftime('%d/%m/%Y')}")
+if isinstance(df_raw, pd.DataFrame) and 'Date' not in df_raw.columns:
+    st.warning(get_text('date_column_missing'))
+else:
+    latest_update = latest_date(df_raw)
+    if pd.notnull(latest_update):
+        modified_at = template_watcher.modified_at
+        st.info(f"📅 {get_text('latest_update_date')}: {latest_update.strftime('%d/%m/%Y')} · "
+                f"{get_text('data_version')}: {data_version}"
+                + (f" ({modified_at.strftime('%d/%m/%Y %H:%M')})" if modified_at else ""))
     else:
         st.warning(get_text('no_valid_dates_found'))
-else:
-    st.warning(get_text('date_column_missing'))
 
-if df_raw.empty:
+if len(df_raw) == 0:
     st.error(get_text('failed_to_load_raw_data'))
     st.stop()
     
-def create_hierarchy_chart(df, level="Full"):
+def create_hierarchy_chart(df, level="Full", top_n=HIERARCHY_TOP_N):
     level_options = {
         "Workcentre": ['Project name', 'Team', 'Workcentre'],
         "Task": ['Project name', 'Team', 'Workcentre', 'Task'],
@@ -376,14 +480,14 @@ def create_hierarchy_chart(df, level="Full"):
     if df.empty or not all(col in df.columns for col in required_cols):
         return None
 
-    for col in path_levels:
-        df[col] = df[col].fillna("Unknown")
-
-    if 'Team leader' not in df.columns:
-        df['Team leader'] = 'Unknown'
+    # Cộng sẵn đến cấp lá (và gộp phần đuôi vào "Other" nếu có top_n): treemap chỉ nhận các nút
+    # hiển thị thay vì từng dòng dữ liệu; frame đầu vào không bị sửa
+    df_tree = build_hierarchy_table(df, path_levels, top_n=top_n)
+    if df_tree.empty:
+        return None
 
     fig = px.treemap(
-        df,
+        df_tree,
         path=path_levels,
         values='Hours',
         hover_data=['Team leader'],
@@ -393,10 +497,10 @@ def create_hierarchy_chart(df, level="Full"):
     return fig
 
 # Get unique years, months, and projects from raw data for selectbox options
-all_years = sorted(df_raw['Year'].dropna().unique().astype(int).tolist())
+all_years = [int(y) for y in distinct_values(raw_index, 'Year')]
 month_order = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
-all_months = [m for m in month_order if m in df_raw['MonthName'].dropna().unique()]
-all_projects = sorted(df_raw['Project name'].dropna().unique().tolist())
+all_months = [m for m in month_order if m in distinct_values(raw_index, 'MonthName')]
+all_projects = distinct_values(raw_index, 'Project name')
 
 
 # Main interface tabs
@@ -419,8 +523,7 @@ def create_monthly_chart(df_filtered, config):
     ]
 
     df_month = (
-        df_filtered.groupby('MonthName')['Hours']
-        .sum()
+        cached_sum_hours(df_filtered, 'MonthName')
         .reindex(ordered_months)
         .dropna()
         .reset_index()
@@ -442,8 +545,7 @@ def create_task_chart(df_filtered, config):
         return None
 
     df_task = (
-        df_filtered.groupby('Task')['Hours']
-        .sum()
+        cached_sum_hours(df_filtered, 'Task')
         .sort_values(ascending=False)
         .reset_index()
     )
@@ -465,8 +567,7 @@ def create_workcentre_chart(df_filtered, config):
         return None
 
     df_wc = (
-        df_filtered.groupby('Workcentre')['Hours']
-        .sum()
+        cached_sum_hours(df_filtered, 'Workcentre')
         .sort_values(ascending=False)
         .reset_index()
     )
@@ -482,13 +583,40 @@ def create_workcentre_chart(df_filtered, config):
     )
     fig.update_layout(xaxis_title="Hours", yaxis_title="Workcentre")
     return fig
+
+def create_delta_chart(df_delta, config):
+    if 'Change' not in df_delta.columns or 'Previous Hours' not in df_delta.columns:
+        return None
+
+    df_rows = df_delta[df_delta['Project Name'] != 'Total']
+    if df_rows.empty:
+        return None
+    # Các cột đứng trước 'Previous Hours' là nhãn dòng (Dự án [, Workcentre, Task, Employee])
+    label_cols = list(df_delta.columns[:df_delta.columns.get_loc('Previous Hours')])
+    df_rows = df_rows.assign(
+        Label=df_rows[label_cols].astype(str).agg(' / '.join, axis=1),
+        Direction=df_rows['Change'].ge(0).map({True: 'Increase', False: 'Decrease'})
+    )
+
+    fig = px.bar(
+        df_rows,
+        x='Change',
+        y='Label',
+        orientation='h',
+        color='Direction',
+        color_discrete_map={'Increase': 'seagreen', 'Decrease': 'indianred'},
+        hover_data=['Previous Hours', 'Current Hours', 'Change %'],
+        title="📈 Change in Hours vs Previous Period",
+        template='plotly_white'
+    )
+    fig.update_layout(xaxis_title="Change (Hours)", yaxis_title="")
+    return fig
 def create_team_chart(df, config_data=None):
     if df.empty or not all(col in df.columns for col in ['Team', 'Team leader', 'Hours']):
         return None
 
     team_summary = (
-        df.groupby(['Team', 'Team leader'])['Hours']
-        .sum()
+        cached_sum_hours(df, ['Team', 'Team leader'])
         .reset_index()
         .sort_values(by='Hours', ascending=False)
     )
@@ -608,6 +736,23 @@ with tab_standard_report_main:
     st.subheader(get_text("export_options"))
     export_excel = st.checkbox(get_text("export_excel_option"), value=True, key='export_excel_std')
     export_pdf = st.checkbox(get_text("export_pdf_option"), value=False, key='export_pdf_std')
+    # Chính sách chia nhỏ dữ liệu thô của file Excel (xem shard_policy)
+    shard_by, shard_rows, shard_target = 'none', SHARD_ROW_BUDGET, 'sheets'
+    excel_layout = 'classic'
+    if export_excel:
+        excel_layout = st.selectbox(get_text('layout_option'), EXCEL_LAYOUTS,
+                                    format_func=lambda o: get_text(f'layout_{o}'), key='excel_layout_std')
+        col_shard_by, col_shard_rows, col_shard_target = st.columns(3)
+        with col_shard_by:
+            shard_by = st.selectbox(get_text('shard_by_option'), SHARD_BY_OPTIONS,
+                                    format_func=lambda o: get_text(f'shard_by_{o}'), key='shard_by_std')
+        with col_shard_rows:
+            shard_rows = st.number_input(get_text('shard_rows_option'), min_value=1000, max_value=SHARD_ROW_BUDGET,
+                                         value=SHARD_ROW_BUDGET, step=10000, key='shard_rows_std',
+                                         disabled=shard_by == 'none')
+        with col_shard_target:
+            shard_target = st.selectbox(get_text('shard_target_option'), SHARD_TARGETS,
+                                        format_func=lambda o: get_text(f'shard_target_{o}'), key='shard_target_std')
 
     if st.button(get_text('generate_standard_report_btn'), key='generate_standard_report_btn_tab'):
         if not export_excel and not export_pdf:
@@ -626,10 +771,14 @@ with tab_standard_report_main:
                 'mode': mode,
                 'year': selected_years,
                 'months': selected_months,
-                'project_filter_df': temp_project_filter_df_standard
+                'project_filter_df': temp_project_filter_df_standard,
+                'shard_by': shard_by,
+                'shard_rows': int(shard_rows),
+                'shard_target': shard_target,
+                'layout': excel_layout
             }
 
-            df_filtered_standard = apply_filters(df_raw, standard_report_config)
+            df_filtered_standard = apply_filters(raw_index, standard_report_config)
             # Tự động loại bỏ dự án không có dữ liệu sau khi lọc
             project_col = 'Project name'  # <-- Đúng tên cột trong df_raw, sửa nếu cần
             valid_projects_in_filtered = df_filtered_standard[project_col].unique().tolist()
@@ -648,22 +797,22 @@ with tab_standard_report_main:
                 'Include': ['yes'] * len(standard_project_selection)
             })
             standard_report_config['project_filter_df'] = temp_project_filter_df_standard
-            if 'Date' in df_filtered_standard.columns:
-                df_filtered_standard['MonthName'] = pd.to_datetime(df_filtered_standard['Date']).dt.strftime('%B')
+            # Biểu đồ và bảng tổng hợp cộng từ cube; dữ liệu thô chỉ dùng cho sheet RawData
+            cube_filtered_standard = apply_filters(cube_index, standard_report_config)
             if df_filtered_standard.empty:
                 st.warning(get_text('no_data_after_filter_standard'))
             else:
                 # 👇 CHỈ THÊM PHẦN NÀY
                 st.subheader(get_text("preview_charts_title"))  # ví dụ: "📊 Biểu đồ xem trước"
-                fig_monthly = create_monthly_chart(df_filtered_standard, standard_report_config)
+                fig_monthly = create_monthly_chart(cube_filtered_standard, standard_report_config)
                 if fig_monthly:
                     st.plotly_chart(fig_monthly, use_container_width=True)
 
-                fig_task = create_task_chart(df_filtered_standard, standard_report_config)
+                fig_task = create_task_chart(cube_filtered_standard, standard_report_config)
                 if fig_task:
                     st.plotly_chart(fig_task, use_container_width=True)
 
-                fig_workcentre = create_workcentre_chart(df_filtered_standard, standard_report_config)
+                fig_workcentre = create_workcentre_chart(cube_filtered_standard, standard_report_config)
                 if fig_workcentre:
                     st.plotly_chart(fig_workcentre, use_container_width=True)
                 # Chọn cấp độ phân tích
@@ -674,7 +823,13 @@ with tab_standard_report_main:
                     index=4,  # mặc định là 'Full'
                     key="hierarchy_level_std"
                 )
-                fig_hierarchy = create_hierarchy_chart(df_filtered_standard, hierarchy_level)
+                # Số nút giữ lại ở mỗi cấp, phần còn lại gộp vào "Other" (0 = hiển thị tất cả)
+                hierarchy_top_n = st.number_input(
+                    get_text('hierarchy_top_n_option'),
+                    min_value=0, max_value=500, value=HIERARCHY_TOP_N, step=5,
+                    key="hierarchy_top_n_std"
+                )
+                fig_hierarchy = create_hierarchy_chart(cube_filtered_standard, hierarchy_level, top_n=int(hierarchy_top_n))
                 if fig_hierarchy:
                     st.plotly_chart(fig_hierarchy, use_container_width=True)
                 st.markdown("---")
@@ -688,9 +843,17 @@ with tab_standard_report_main:
                 report_generated = False
                 if export_excel:
                     with st.spinner(get_text('generating_excel_report')):
-                        excel_success = export_report(df_filtered_standard, standard_report_config, path_dict['output_file'])
+                        excel_key = report_cache_key(data_version, 'standard_excel', standard_report_config,
+                                                     language=st.session_state.lang)
+                        excel_success = cached_export(
+                            report_cache, excel_key, path_dict['output_file'],
+                            lambda: export_report(df_filtered_standard, standard_report_config, path_dict['output_file'],
+                                                  cube=cube_filtered_standard),
+                            config=standard_report_config)
                     if excel_success:
                         st.success(get_text('excel_report_generated').format(os.path.basename(path_dict['output_file'])))
+                        if report_cache.last_hit:
+                            st.caption(get_text('report_from_cache').format(os.path.basename(path_dict['output_file'])))
                         report_generated = True
                     else:
                         st.error(get_text('failed_to_generate_excel'))
@@ -701,9 +864,15 @@ with tab_standard_report_main:
                         raise ValueError("❌ pdf_report_path is empty. Please check where it's defined.")
                     with st.spinner(get_text('generating_pdf_report')):
                         print(f"[DEBUG] path_dict['pdf_report'] = {path_dict['pdf_report']}")
-                        pdf_success = export_pdf_report(df_filtered_standard, standard_report_config, path_dict['pdf_report'], path_dict['logo_path'])
+                        pdf_key = report_cache_key(data_version, 'standard_pdf', standard_report_config,
+                                                   language=st.session_state.lang)
+                        pdf_success = cached_export(
+                            report_cache, pdf_key, path_dict['pdf_report'],
+                            lambda: export_pdf_report(cube_filtered_standard, standard_report_config, path_dict['pdf_report'], path_dict['logo_path']))
                     if pdf_success:
                         st.success(get_text('pdf_report_generated').format(os.path.basename(path_dict['pdf_report'])))
+                        if report_cache.last_hit:
+                            st.caption(get_text('report_from_cache').format(os.path.basename(path_dict['pdf_report'])))
                         report_generated = True
                     else:
                         st.error(get_text('failed_to_generate_pdf'))
@@ -712,6 +881,15 @@ with tab_standard_report_main:
                     if export_excel and os.path.exists(path_dict['output_file']):
                         with open(path_dict['output_file'], "rb") as f:
                             st.download_button(get_text("download_excel"), data=f, file_name=os.path.basename(path_dict['output_file']), use_container_width=True, key='download_excel_std_btn')
+                        # Báo cáo chia ra nhiều workbook: tải file chính kèm các file phần trong một file zip
+                        exported_files = standard_report_config.get('exported_files', [])
+                        if len(exported_files) > 1:
+                            zip_path = os.path.splitext(path_dict['output_file'])[0] + ".zip"
+                            with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+                                for file_path in exported_files:
+                                    zf.write(file_path, arcname=os.path.basename(file_path))
+                            with open(zip_path, "rb") as f:
+                                st.download_button(get_text("download_excel_parts"), data=f, file_name=os.path.basename(zip_path), use_container_width=True, key='download_excel_parts_std_btn')
                     if export_pdf and os.path.exists(path_dict['pdf_report']):
                         with open(path_dict['pdf_report'], "rb") as f:
                             st.download_button(get_text("download_pdf"), data=f, file_name=os.path.basename(path_dict['pdf_report']), use_container_width=True, key='download_pdf_std_btn')
@@ -730,7 +908,8 @@ with tab_comparison_report_main:
     internal_comparison_modes_map = {
         'compare_projects_month': ("So Sánh Dự Án Trong Một Tháng", "Compare Projects in a Month"),
         'compare_projects_year': ("So Sánh Dự Án Trong Một Năm", "Compare Projects in a Year"),
-        'compare_projects_over_time': ("So Sánh Nhiều Dự Án Qua Các Tháng/Năm", "Compare Projects Over Time (Months/Years)")
+        'compare_projects_over_time': ("So Sánh Nhiều Dự Án Qua Các Tháng/Năm", "Compare Projects Over Time (Months/Years)"),
+        'compare_period_delta': ("So Sánh Chênh Lệch Giữa Hai Kỳ", "Compare Period over Period")
     }
     current_language = st.session_state.get("lang", "vi")
     # Lấy danh sách display_name tùy ngôn ngữ
@@ -933,7 +1112,44 @@ with tab_comparison_report_main:
         if not comp_projects:
             st.warning(get_text('no_project_selected_warning_standard')) # Reusing standard report message
             validation_error = True
-            
+
+    elif comparison_mode in ["So Sánh Chênh Lệch Giữa Hai Kỳ", "Compare Period over Period"]:
+        period_month_options = [get_text('delta_whole_year')] + all_months
+        col_current, col_previous = st.columns(2)
+        with col_current:
+            st.markdown(f"**{get_text('delta_current_period')}**")
+            current_year = st.selectbox(get_text('delta_year'), options=all_years,
+                                        index=len(all_years) - 1, key='delta_current_year')
+            current_month = st.selectbox(get_text('delta_month'), options=period_month_options, key='delta_current_month')
+        current_period = (current_year, None if current_month == get_text('delta_whole_year') else current_month)
+
+        # Kỳ so sánh mặc định là kỳ liền trước; key gắn với kỳ hiện tại để mặc định đổi theo
+        default_previous = previous_period(current_period)
+        previous_year_options = sorted(set(all_years) | {default_previous[0]})
+        with col_previous:
+            st.markdown(f"**{get_text('delta_previous_period')}**")
+            previous_year = st.selectbox(get_text('delta_year'), options=previous_year_options,
+                                         index=previous_year_options.index(default_previous[0]),
+                                         key=f'delta_previous_year_{period_label(current_period)}')
+            previous_month = st.selectbox(get_text('delta_month'), options=period_month_options,
+                                          index=period_month_options.index(default_previous[1]) if default_previous[1] else 0,
+                                          key=f'delta_previous_month_{period_label(current_period)}')
+        compared_period = (previous_year, None if previous_month == get_text('delta_whole_year') else previous_month)
+
+        delta_by = st.multiselect(get_text('delta_breakdown'), options=['Workcentre', 'Task', 'Employee'],
+                                  key='delta_by_select')
+
+        # Năm / tháng đủ bao cả hai kỳ; compute_period_delta tách đúng từng kỳ
+        comp_years = sorted({current_period[0], compared_period[0]})
+        if current_period[1] and compared_period[1]:
+            comp_months = [m for m in all_months if m in (current_period[1], compared_period[1])]
+        else:
+            comp_months = []
+
+        if not comp_projects:
+            st.warning(get_text('no_project_selected_warning_standard'))
+            validation_error = True
+
 
     st.markdown("---")
     st.subheader(get_text("export_options"))
@@ -962,6 +1178,12 @@ with tab_comparison_report_main:
                 # 'selected_months_over_time' không cần truyền riêng nếu đã gán vào comp_months
                 # nó đã được xử lý trong logic trên
             }
+            if comparison_mode in ["So Sánh Chênh Lệch Giữa Hai Kỳ", "Compare Period over Period"]:
+                comparison_config.update({
+                    'current_period': current_period,
+                    'previous_period': compared_period,
+                    'delta_by': delta_by
+                })
             print("✅ DEBUG - comparison_config:", comparison_config)
             # Print the final config before calling the function
             comparison_output_folder = "outputs/comparison"
@@ -978,9 +1200,14 @@ with tab_comparison_report_main:
             print(f"DEBUG: comparison_path_dict = {comparison_path_dict}")
             # ✅ Thêm dòng này sau khi path_dict đã tạo
             # Áp dụng filter
+            # Xem trước và biểu đồ cộng từ cube; file xuất dùng dòng thô (giữ Date và các cột gốc), xem bên dưới
             df_filtered_comparison, comparison_filter_message, filtered_projects = apply_comparison_filters(
-            df_raw, comparison_config, comparison_mode, filter_mode
+            cube_index, comparison_config, comparison_mode, filter_mode
             )
+
+            def comparison_export_data():
+                # Cùng lựa chọn trên dữ liệu thô; kết quả được cache nên Excel và PDF chỉ lọc một lần
+                return apply_comparison_filters(raw_index, comparison_config, comparison_mode, filter_mode)[0]
             # ✅ Cảnh báo nếu có dự án được chọn nhưng không có dữ liệu thực tế
             original_projects = comparison_config.get("selected_projects", [])
             if len(filtered_projects) < len(original_projects):
@@ -1013,6 +1240,10 @@ with tab_comparison_report_main:
                 fig_workcentre = create_workcentre_chart(df_filtered_comparison, comparison_config)
                 if fig_workcentre:
                     st.plotly_chart(fig_workcentre, use_container_width=True)
+
+                fig_delta = create_delta_chart(df_filtered_comparison, comparison_config)
+                if fig_delta:
+                    st.plotly_chart(fig_delta, use_container_width=True)
                     
                 if 'df_filtered_comparison' in locals():
                     fig_hierarchy = create_hierarchy_chart(df_filtered_comparison, comparison_config)
@@ -1024,15 +1255,21 @@ with tab_comparison_report_main:
                 if export_excel_comp:
                     with st.spinner(get_text('generating_comparison_excel')):
                         try:
-                            excel_success_comp = export_comparison_report(
-                                df_filtered_comparison,
-                                comparison_config,
-                                comparison_path_dict['comparison_output_file'],
-                                comparison_mode,
-                                filter_mode
-                                )
+                            excel_key_comp = report_cache_key(data_version, f"comparison_excel:{comparison_mode}",
+                                                              comparison_config, filter_mode, st.session_state.lang)
+                            excel_success_comp = cached_export(
+                                report_cache, excel_key_comp, comparison_path_dict['comparison_output_file'],
+                                lambda: export_comparison_report(
+                                    comparison_export_data(),
+                                    comparison_config,
+                                    comparison_path_dict['comparison_output_file'],
+                                    comparison_mode,
+                                    filter_mode
+                                    ))
+                            excel_cache_hit_comp = report_cache.last_hit
                         except Exception as e:
                             excel_success_comp = False
+                            excel_cache_hit_comp = False
                             st.error(f"❌ Lỗi khi xuất Excel: {e}")
                     # ✅ Kiểm tra file có thực sự được tạo ra không
                     if os.path.exists(comparison_path_dict['comparison_output_file']):
@@ -1044,6 +1281,8 @@ with tab_comparison_report_main:
                         st.code("Expected path: " + os.path.abspath(comparison_path_dict['comparison_output_file']), language="text")
                     if excel_success_comp:
                         st.success(get_text('comparison_excel_generated').format(os.path.basename(comparison_path_dict['comparison_output_file'])))
+                        if excel_cache_hit_comp:
+                            st.caption(get_text('report_from_cache').format(os.path.basename(comparison_path_dict['comparison_output_file'])))
                         report_generated_comp = True
                     else:
                         st.error(get_text('failed_to_generate_comparison_excel'))
@@ -1053,22 +1292,30 @@ with tab_comparison_report_main:
                         try:
                             pdf_path = comparison_path_dict['comparison_pdf_report']
                             print("▶️ Gọi export_comparison_pdf_report...")
-                            pdf_success_comp = export_comparison_pdf_report(
-                                df_filtered_comparison,
-                                comparison_config,
-                                pdf_path,
-                                comparison_mode,
-                                comparison_path_dict['logo'],                   # ✅ thêm logo_path
-                                filter_mode
-                            )
+                            pdf_key_comp = report_cache_key(data_version, f"comparison_pdf:{comparison_mode}",
+                                                            comparison_config, filter_mode, st.session_state.lang)
+                            pdf_success_comp = cached_export(
+                                report_cache, pdf_key_comp, pdf_path,
+                                lambda: export_comparison_pdf_report(
+                                    comparison_export_data(),
+                                    comparison_config,
+                                    pdf_path,
+                                    comparison_mode,
+                                    comparison_path_dict['logo'],                   # ✅ thêm logo_path
+                                    filter_mode
+                                ))
+                            pdf_cache_hit_comp = report_cache.last_hit
                             print("✅ PDF Success?", pdf_success_comp)
                             print("📁 File tồn tại?", os.path.exists(pdf_path))
                         except Exception as e:
                             pdf_success_comp = False
+                            pdf_cache_hit_comp = False
                             st.error(f"❌ Lỗi khi xuất PDF: {e}")
                             print("❌ Exception khi xuất PDF:", e)
                     if pdf_success_comp:
                         st.success(get_text('comparison_pdf_generated').format(os.path.basename(comparison_path_dict['comparison_pdf_report'])))
+                        if pdf_cache_hit_comp:
+                            st.caption(get_text('report_from_cache').format(os.path.basename(comparison_path_dict['comparison_pdf_report'])))
                         report_generated_comp = True
                     else:
                         st.error(get_text('failed_to_generate_comparison_pdf'))
@@ -1116,11 +1363,20 @@ with tab_comparison_report_main:
 # =========================================================================
 with tab_data_preview_main:
     st.subheader(get_text('raw_data_preview_header'))
-    if not df_raw.empty:
-        st.dataframe(df_raw.head(100))
+    if len(df_raw) > 0:
+        st.dataframe(select_rows(df_raw, limit=100))
     else:
         st.info(get_text('no_raw_data'))
 
+    # Các dòng bị loại (rejected) hoặc bị cảnh báo (warning) khi nạp dữ liệu
+    if not rejected_rows.empty:
+        is_rejected = rejected_rows['Severity'] == 'rejected'
+        # Một dòng có thể bị loại vì nhiều lý do -> đếm theo số dòng (và workbook nếu có)
+        row_keys = [c for c in ('Workbook', 'Row') if c in rejected_rows.columns]
+        n_rejected = len(rejected_rows[is_rejected].drop_duplicates(row_keys))
+        with st.expander(get_text('rejected_rows_header').format(n_rejected, int((~is_rejected).sum()))):
+            st.dataframe(rejected_rows, use_container_width=True)
+
 # =========================================================================
 # USER GUIDE TAB
 # =========================================================================
@@ -1153,18 +1409,10 @@ with tab_dashboard_main:
     today = datetime.today()
     current_year = today.year
 
-    # 🎯 Chuyển đổi cột 'Month' nếu cần
-    if df['Month'].dtype == 'O':
-        month_str_to_num = {
-            month: i for i, month in enumerate(
-                [datetime(1900, m, 1).strftime('%B') for m in range(1, 13)], start=1
-            )
-        }
-        df['Month'] = df['Month'].map(month_str_to_num)
-
-    # 📅 Danh sách tháng có dữ liệu
-    available_months = sorted(df[df['Year'] == current_year]['Month'].dropna().unique().astype(int))
-    month_name_map = {i: datetime(1900, i, 1).strftime('%B') for i in available_months}
+    # 📅 Danh sách tháng có dữ liệu (lấy từ bảng lịch)
+    calendar_year = calendar_df[calendar_df['Year'] == current_year]
+    available_months = sorted(calendar_year['MonthNum'].unique().astype(int))
+    month_name_map = dict(zip(calendar_year['MonthNum'].astype(int), calendar_year['MonthName'].astype(str)))
 
     # 📌 Selectbox chọn tháng
     month_options = {
@@ -1176,29 +1424,22 @@ with tab_dashboard_main:
     current_year, current_month = month_options[selected_month_label]
     current_month_name = month_name_map[current_month]
 
-    # 📆 Tính tuần
-    def get_week_date_range(year, week_num):
-        try:
-            d = datetime.strptime(f'{year}-W{int(week_num)}-1', "%Y-W%W-%w")
-            start_date = d.strftime('%d/%m')
-            end_date = (d + timedelta(days=6)).strftime('%d/%m')
-            return f"Week {week_num} ({start_date} → {end_date})"
-        except Exception:
-            return f"Week {week_num}"
-
-    df_month = df[(df['Year'] == current_year) & (df['Month'] == current_month)]
-    available_weeks = sorted(df_month['Week'].dropna().unique())
+    # Tháng / tuần đã chọn và các tổng giờ bên dưới đều lấy qua cache tổng hợp dùng chung
+    df_month = cached_select_rows(cube_index, years=[current_year], months=[current_month_name])
+    available_weeks = sorted(df_month['Week'].dropna().unique().astype(int))
 
     # 🗓️ Tuỳ chọn tuần
     if available_weeks:
-        week_labels = {w: get_week_date_range(current_year, int(w)) for w in available_weeks}
+        # 📆 Nhãn tuần (ngày đầu → cuối tuần ISO) đọc từ bảng lịch
+        week_label_map = week_labels(calendar_df, current_year, current_month)
         selected_week_num = st.selectbox(
             "🗓️ Select a week in the selected month (optional)",
             options=[None] + list(available_weeks),
-            format_func=lambda x: week_labels.get(x, f"Week {x}") if x is not None else "📅 All Weeks in Month",
+            format_func=lambda x: week_label_map.get(x, f"Week {x}") if x is not None else "📅 All Weeks in Month",
             index=0
         )
-        df_week = df_month if selected_week_num is None else df_month[df_month['Week'] == selected_week_num]
+        df_week = df_month if selected_week_num is None else cached_select_rows(
+            cube_index, years=[current_year], months=[current_month_name], weeks=[selected_week_num])
     else:
         st.warning("⚠️ No weekly data found for selected month.")
         df_week = df_month
@@ -1216,8 +1457,7 @@ with tab_dashboard_main:
 
     # 🔝 Top 5 Projects
     top_projects = (
-        df_week.groupby("Project name")["Hours"]
-        .sum()
+        cached_sum_hours(df_week, "Project name")
         .sort_values(ascending=False)
         .head(5)
         .reset_index()
@@ -1231,8 +1471,7 @@ with tab_dashboard_main:
     # 🧩 Hour Distribution by Team (with Team leader)
     if all(col in df_week.columns for col in ["Workcentre", "Team leader"]):
         team_leader_ratio = (
-            df_week.groupby(["Workcentre", "Team leader"])["Hours"]
-            .sum()
+            cached_sum_hours(df_week, ["Workcentre", "Team leader"])
             .reset_index()
         )
         fig2 = px.pie(
@@ -1244,7 +1483,7 @@ with tab_dashboard_main:
             template=template_name
         )
     else:
-        team_ratio = df_week.groupby("Workcentre")["Hours"].sum().reset_index()
+        team_ratio = cached_sum_hours(df_week, "Workcentre").reset_index()
         fig2 = px.pie(
             team_ratio,
             names="Workcentre", values="Hours",
@@ -1255,8 +1494,7 @@ with tab_dashboard_main:
     # 🏗️ Team Allocation by Project (with Team leader)
     if all(col in df_week.columns for col in ["Project name", "Workcentre", "Team leader"]):
         team_project = (
-            df_week.groupby(["Project name", "Workcentre", "Team leader"])["Hours"]
-            .sum()
+            cached_sum_hours(df_week, ["Project name", "Workcentre", "Team leader"])
             .reset_index()
         )
         fig3 = px.bar(
@@ -1269,7 +1507,7 @@ with tab_dashboard_main:
             template=template_name
         )
     else:
-        team_project = df_week.groupby(["Project name", "Workcentre"])["Hours"].sum().reset_index()
+        team_project = cached_sum_hours(df_week, ["Project name", "Workcentre"]).reset_index()
         fig3 = px.bar(
             team_project,
             x="Project name",
@@ -1286,8 +1524,7 @@ with tab_dashboard_main:
         st.subheader("👥 Total Hours by Team, Leader and Employee")
 
         df_team_emp = (
-            df_week.groupby(['Team', 'Team leader', 'Employee'])['Hours']
-            .sum()
+            cached_sum_hours(df_week, ['Team', 'Team leader', 'Employee'])
             .reset_index()
         )
 
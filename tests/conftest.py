@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RAW_HEADER = ['Date', 'Month', 'Team member', 'Team', 'Team leader', 'Project name',
+              'Workcentre', 'Task', 'Job', 'Hou']
+
+
+def raw_rows(n, start=0):
+    """Các dòng 'Raw Data' giả lập, xác định theo vị trí."""
+    import datetime
+    rows = []
+    for i in range(start, start + n):
+        date = datetime.datetime(2024, 1 + i % 12, 1 + i % 28)
+        rows.append([date, date.strftime('%B'), f"Emp{i % 7}", f"Team{i % 3}", f"Lead{i % 4}",
+                     f"P{i % 5:03d}", f"WC{i % 6}", f"Task{i % 9}", i if i % 10 == 0 else f"J{i % 11}",
+                     round(1 + (i % 17) * 0.37, 2)])
+    return rows
+
+
+def write_template(path, rows):
+    """Ghi một file template (Raw Data + hai sheet cấu hình) bằng openpyxl thường (ô chữ inline)."""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Raw Data'
+    ws.append(RAW_HEADER)
+    for row in rows:
+        ws.append(row)
+    for cell in ws['A'][1:]:
+        cell.number_format = 'yyyy-mm-dd'
+    year_mode = wb.create_sheet('Config_Year_Mode')
+    for row in (['Key', 'Value'], ['mode', 'year'], ['year', 2024]):
+        year_mode.append(row)
+    project_filter = wb.create_sheet('Config_Project_Filter')
+    project_filter.append(['Project Name', 'Include'])
+    for i in range(5):
+        project_filter.append([f"P{i:03d}", 'yes'])
+    wb.save(path)
+    return path
+
+
+@pytest.fixture
+def template_path(tmp_path):
+    return str(tmp_path / "Time_report.xlsx")
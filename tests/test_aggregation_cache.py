@@ -0,0 +1,38 @@
+import pandas as pd
+
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import AggregationCache
+
+
+def frame(n):
+    return pd.DataFrame({'Hours': [1.0] * n})
+
+
+def test_cache_is_bounded_by_bytes():
+    size = int(frame(1000).memory_usage(index=True, deep=True).sum())
+    cache = AggregationCache(max_entries=100, max_bytes=int(size * 2.5))
+    for key in 'abc':
+        cache.get_or_compute(key, lambda: frame(1000), version='v1')
+
+    assert len(cache) == 2
+    assert cache.nbytes <= cache.max_bytes
+    calls = []
+    cache.get_or_compute('a', lambda: calls.append('a') or frame(1000), version='v1')
+    assert calls == ['a']
+
+
+def test_larger_than_bound_is_not_cached():
+    cache = AggregationCache(max_bytes=100)
+    cache.get_or_compute('big', lambda: frame(1000), version='v1')
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+def test_retain_versions_drops_old_data():
+    cache = AggregationCache()
+    old = cache.get_or_compute('old', lambda: frame(10), version='v1:raw')
+    cache.get_or_compute('new', lambda: frame(10), version='v2:raw')
+
+    cache.retain_versions({'v2:raw', 'v2:cube'})
+
+    assert len(cache) == 1
+    assert cache.signature_of(old) is None
+    assert cache.version_of('new') == 'v2:raw'
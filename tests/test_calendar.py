@@ -0,0 +1,40 @@
+import pandas as pd
+
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import add_calendar_columns, build_calendar_table, week_labels
+
+
+def test_calendar_columns_match_per_row_derivation():
+    dates = pd.Series(pd.to_datetime(['2024-12-30 08:15', '2025-01-01', '2024-12-30', '2021-01-03',
+                                      '2024-02-29 17:00', '2025-01-01'], format='ISO8601'))
+    df = add_calendar_columns(pd.DataFrame({'Date': dates}))
+
+    assert list(df['Year']) == list(dates.dt.year)
+    assert list(df['MonthName'].astype(str)) == list(dates.dt.month_name())
+    assert list(df['Week']) == list(dates.dt.isocalendar().week)
+    assert df['Year'].dtype == 'int16' and df['Week'].dtype == 'int8'
+
+
+def test_calendar_table_has_one_row_per_day():
+    calendar_df = build_calendar_table(pd.to_datetime(['2024-03-05 10:00', '2024-03-05', '2024-03-01', None],
+                                                        format='ISO8601'))
+
+    assert list(calendar_df['Date']) == list(pd.to_datetime(['2024-03-01', '2024-03-05']))
+    assert list(calendar_df['WeekLabel']) == ["Week 9 (26/02 → 03/03)", "Week 10 (04/03 → 10/03)"]
+    assert build_calendar_table([]).empty
+
+
+def test_week_labels_cover_weeks_crossing_month_edges():
+    calendar_df = build_calendar_table(pd.date_range('2025-12-25', '2026-02-05'))
+
+    labels = week_labels(calendar_df, 2026, 1)
+
+    # 01/01/2026 thuộc tuần ISO 1 bắt đầu từ 29/12/2025
+    assert labels == {
+        1: "Week 1 (29/12 → 04/01)",
+        2: "Week 2 (05/01 → 11/01)",
+        3: "Week 3 (12/01 → 18/01)",
+        4: "Week 4 (19/01 → 25/01)",
+        5: "Week 5 (26/01 → 01/02)",
+    }
+    assert week_labels(calendar_df, 2025, 12) == {52: "Week 52 (22/12 → 28/12)", 1: "Week 1 (29/12 → 04/01)"}
+    assert week_labels(calendar_df, 2026, 3) == {}
@@ -0,0 +1,39 @@
+import pandas as pd
+from openpyxl import Workbook
+
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import (
+    build_hours_cube, load_store, load_workbooks, resolve_workbooks, sum_hours,
+)
+from conftest import RAW_HEADER, raw_rows, write_template
+
+
+def write_without_team_leader(path, rows):
+    drop = RAW_HEADER.index('Team leader')
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Raw Data'
+    ws.append([c for i, c in enumerate(RAW_HEADER) if i != drop])
+    for row in rows:
+        ws.append([v for i, v in enumerate(row) if i != drop])
+    wb.save(path)
+
+
+def test_chunked_store_keeps_columns_missing_from_first_workbook(tmp_path):
+    source = tmp_path / "data"
+    source.mkdir()
+    # Workbook cũ (đứng trước theo tên) không có cột 'Team leader'
+    write_without_team_leader(str(source / "Time_report_2023.xlsx"), raw_rows(40))
+    write_template(str(source / "Time_report_2024.xlsx"), raw_rows(60, start=40))
+
+    store, _ = load_store(str(source), db_path=str(tmp_path / "store.sqlite"), chunked=True)
+
+    rows = store.select()
+    assert len(rows) == 100
+    assert rows['Team leader'].notna().sum() == 60
+    cube = store.hours_cube()
+    assert 'Team leader' in cube.columns
+
+    df_raw, _ = load_workbooks(resolve_workbooks(str(source)), use_snapshot=False, max_workers=1)
+    expected = build_hours_cube(df_raw)
+    assert list(cube.columns) == list(expected.columns)
+    pd.testing.assert_series_equal(sum_hours(cube, 'Team leader'), sum_hours(expected, 'Team leader'))
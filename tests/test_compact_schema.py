@@ -0,0 +1,66 @@
+import pandas as pd
+
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import (
+    DIMENSION_COLUMNS, MONTH_DTYPE, SHEET_ROW_COLUMN, concat_compact, export_frame, load_raw_data, sum_hours,
+)
+from conftest import raw_rows, write_template
+
+
+def test_loaded_frame_uses_compact_dtypes(template_path):
+    write_template(template_path, raw_rows(200))
+    df = load_raw_data(template_path, use_snapshot=False)
+
+    for col in DIMENSION_COLUMNS:
+        assert isinstance(df[col].dtype, pd.CategoricalDtype), col
+    assert df['MonthName'].dtype == MONTH_DTYPE
+    assert df['Hours'].dtype == 'float32'
+    assert df['Year'].dtype == 'int16'
+    assert df['Week'].dtype == 'int8'
+    # Mã category ổn định: tập category được sắp xếp
+    assert list(df['Project name'].cat.categories) == sorted(df['Project name'].cat.categories)
+    # 'Job' lẫn số và chữ -> luôn là chuỗi
+    assert set(map(type, df['Job'].cat.categories)) == {str}
+
+    as_object = df.astype({col: object for col in DIMENSION_COLUMNS + ['MonthName']})
+    assert df.memory_usage(deep=True).sum() < as_object.memory_usage(deep=True).sum() / 3
+
+
+def test_sums_match_float64(template_path):
+    rows = raw_rows(500)
+    write_template(template_path, rows)
+    df = load_raw_data(template_path, use_snapshot=False)
+
+    expected = pd.DataFrame({'Project name': [r[5] for r in rows], 'Hours': [r[9] for r in rows]})
+    expected = expected.groupby('Project name')['Hours'].sum()
+    totals = sum_hours(df, 'Project name')
+
+    assert totals.dtype == 'float64'
+    pd.testing.assert_series_equal(totals, expected.round(4), check_names=False, check_index_type=False,
+                                   check_categorical=False)
+
+
+def test_concat_unions_categories(tmp_path):
+    first = str(tmp_path / "a.xlsx")
+    second = str(tmp_path / "b.xlsx")
+    write_template(first, raw_rows(5))
+    write_template(second, raw_rows(5, start=30))
+
+    df = concat_compact([load_raw_data(first, use_snapshot=False), load_raw_data(second, use_snapshot=False)])
+
+    assert len(df) == 10
+    assert isinstance(df['Employee'].dtype, pd.CategoricalDtype)
+    assert list(df['Employee'].cat.categories) == [f"Emp{i}" for i in range(7)]
+    assert list(df['Employee'].astype(str)) == [f"Emp{i % 7}" for i in list(range(5)) + list(range(30, 35))]
+    assert df['Hours'].dtype == 'float32'
+
+
+def test_export_frame_restores_readable_hours(template_path):
+    write_template(template_path, raw_rows(20))
+    df = load_raw_data(template_path, use_snapshot=False)
+
+    out = export_frame(df)
+
+    assert SHEET_ROW_COLUMN not in out.columns
+    assert out['Hours'].dtype == 'float64'
+    assert list(out['Hours']) == [r[9] for r in raw_rows(20)]
+    assert df['Hours'].dtype == 'float32'
@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+import a04ecaf1_1dae_4c90_8081_086cd7c7b725 as report
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import create_comparison_chart
+
+
+def comparison_frame(periods):
+    rows = []
+    for i, (year, month) in enumerate(periods):
+        for project in ('A', 'B', 'C'):
+            if (i + ord(project)) % 4:
+                rows.append((project, year, month, f"T{i % 2}", 'WC1', float(i + 1)))
+    df = pd.DataFrame(rows, columns=['Project Name', 'Year', 'MonthName', 'Task', 'Workcentre', 'Total Hours'])
+    return df.assign(Hours=df['Total Hours'])
+
+
+@pytest.fixture
+def time_pivots(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    captured = []
+
+    def spy(df, rows, columns=None, **kwargs):
+        table = pivot_hours(df, rows, columns, **kwargs)
+        if columns == 'YearMonth':
+            captured.append(table)
+        return table
+
+    pivot_hours = report.pivot_hours
+    monkeypatch.setattr(report, 'pivot_hours', spy)
+    return captured
+
+
+def test_time_chart_uses_chronological_project_by_period_matrix(time_pivots):
+    df = comparison_frame([(2024, 'November'), (2023, 'December'), (2024, 'February'), (2024, 'November')])
+
+    charts = create_comparison_chart(df, "Compare Projects Over Time (Months/Years)", "t", "x", "y", None, {})
+
+    assert 'time' in charts
+    (matrix,) = time_pivots
+    assert list(matrix.columns) == ['Project Name', '2023-12', '2024-02', '2024-11']
+    expected = df.assign(Period=df['Year'].astype(str) + '-' + df['MonthName'].map(
+        {'November': '11', 'December': '12', 'February': '02'}))
+    expected = expected.pivot_table(index='Project Name', columns='Period', values='Total Hours',
+                                    aggfunc='sum', fill_value=0)
+    pd.testing.assert_frame_equal(matrix.set_index('Project Name'), expected.astype('float64'),
+                                  check_names=False, check_index_type=False, check_column_type=False)
+
+
+def test_time_chart_skipped_for_a_single_period(time_pivots):
+    df = comparison_frame([(2024, 'March')] * 3)
+
+    charts = create_comparison_chart(df, "Compare Projects in a Month", "t", "x", "y", None, {})
+
+    assert 'time' not in charts
+    assert list(time_pivots[0].columns) == ['Project Name', '2024-03']
@@ -0,0 +1,120 @@
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+import a04ecaf1_1dae_4c90_8081_086cd7c7b725 as report
+from conftest import raw_rows, write_template
+
+SPECIAL_TASKS = ['<b>Review</b>', 'R&D "phase" 2', "O'Neil & Sons", '  padded  ']
+
+
+@pytest.fixture
+def report_data(template_path):
+    rows = raw_rows(240)
+    for i, row in enumerate(rows):
+        if i % 7 == 3:
+            row[7] = SPECIAL_TASKS[i % len(SPECIAL_TASKS)]
+    write_template(template_path, rows)
+    df = report.load_raw_data(template_path)
+    df = df.copy()
+    # Ký tự điều khiển không ghi được vào template, chỉ xuất hiện sau khi nạp
+    df['Task'] = df['Task'].cat.rename_categories({'Task4': 'bell\x07tab\tend'})
+    df.loc[df.index[2::17], 'Date'] += pd.Timedelta(hours=13, minutes=30, seconds=15)
+    # NaN / NaT trong dữ liệu thô
+    df.loc[df.index[5::23], 'Hours'] = np.nan
+    df.loc[df.index[11::31], 'Date'] = pd.NaT
+    df.loc[df.index[13::37], 'Workcentre'] = np.nan
+    config = {'mode': 'month', 'year': 2024, 'months': [],
+              'project_filter_df': pd.DataFrame({'Project Name': [f"P{i:03d}" for i in range(5)],
+                                                 'Include': ['yes'] * 5})}
+    df = report.apply_filters(df, config)
+    assert isinstance(df['Task'].dtype, pd.CategoricalDtype)
+    assert pd.api.types.is_datetime64_any_dtype(df['Date'])
+    return df, config
+
+
+def dump_workbook(path):
+    """Nội dung từng sheet: ô (giá trị, in đậm, định dạng số, liên kết), vị trí biểu đồ, Table."""
+    wb = load_workbook(path)
+    sheets = []
+    for ws in wb:
+        cells = [(c.coordinate, c.value, c.font.b, c.number_format, c.hyperlink.location if c.hyperlink else None)
+                 for row in ws.iter_rows() for c in row if c.value is not None]
+        charts = [(chart.anchor._from.row, chart.anchor._from.col) for chart in ws._charts]
+        tables = sorted(ws.tables.items())
+        sheets.append((ws.title, cells, charts, tables))
+    return sheets
+
+
+def check_sheet_parts(path):
+    """Phần tử con của mỗi <worksheet> đúng thứ tự schema, <dimension> khớp vùng các ô thực tế."""
+    with zipfile.ZipFile(path) as archive:
+        parts = [name for name in archive.namelist() if re.fullmatch(r'xl/worksheets/sheet\d+\.xml', name)]
+        for name in parts:
+            tags = [child.tag.split('}')[1] for child in ET.fromstring(archive.read(name))]
+            order = [report.WORKSHEET_ELEMENTS.index(tag) for tag in tags]
+            assert order == sorted(order), (name, tags)
+    cells = load_workbook(path)
+    declared = load_workbook(path, read_only=True)
+    # Sheet ghi thẳng bằng write-only không có <dimension>; các sheet ghép gói thì phải có
+    sized = [ws.title for ws in declared if ws.max_row is not None]
+    assert sized
+    for title in sized:
+        assert declared[title].calculate_dimension() == cells[title].calculate_dimension(), title
+
+
+@pytest.mark.parametrize('extra', [
+    {},
+    {'layout': 'normalized'},
+    {'shard_by': 'rows', 'shard_rows': 70},
+    {'layout': 'normalized', 'shard_by': 'rows', 'shard_rows': 90, 'shard_target': 'files'},
+    {'shard_by': 'rows', 'shard_rows': 100, 'shard_target': 'files'},
+])
+def test_assembled_export_matches_serial(report_data, tmp_path, monkeypatch, extra):
+    df, config = report_data
+    outputs = {}
+    for engine in ('serial', 'assembled'):
+        if engine == 'serial':
+            monkeypatch.setattr(report, 'EXCEL_ASSEMBLY_MIN_ROWS', 10 ** 9)
+            monkeypatch.setattr(report, 'EXCEL_ASSEMBLY_MIN_SHEETS', 10 ** 9)
+        else:
+            # Ép ghép gói với job nhỏ: nhiều đoạn mỗi sheet, nhiều job, process pool thật
+            monkeypatch.setattr(report, 'EXCEL_ASSEMBLY_MIN_ROWS', 0)
+            monkeypatch.setattr(report, 'EXCEL_RENDER_JOB_ROWS', 37)
+            monkeypatch.setattr(report, 'EXCEL_RENDER_MIN_JOB_ROWS', 1)
+        out_dir = tmp_path / engine
+        out_dir.mkdir()
+        run_config = {**config, **extra}
+        assert report.export_report(df, run_config, str(out_dir / "Report.xlsx"), max_workers=2)
+        outputs[engine] = [p.replace(str(out_dir), '') for p in run_config['exported_files']]
+
+    assert outputs['serial'] == outputs['assembled']
+    for name in outputs['serial']:
+        serial = dump_workbook(str(tmp_path / 'serial') + name)
+        assembled = dump_workbook(str(tmp_path / 'assembled') + name)
+        assert [s[0] for s in serial] == [s[0] for s in assembled]
+        for expected, actual in zip(serial, assembled):
+            assert expected == actual, expected[0]
+
+    for name in outputs['assembled']:
+        check_sheet_parts(str(tmp_path / 'assembled') + name)
+
+    cells = [cell for sheet in dump_workbook(str(tmp_path / 'assembled') + outputs['assembled'][0])
+             for cell in sheet[1]]
+    values = {cell[1] for cell in cells}
+    if extra.get('shard_target') != 'files':
+        assert {'<b>Review</b>', 'R&D "phase" 2', "O'Neil & Sons", '  padded  '} <= values
+    if extra.get('layout') == 'normalized':
+        assert any(cell[4] for cell in cells)
+
+
+def test_many_small_projects_use_assembly(monkeypatch):
+    df = pd.DataFrame({'Project name': [f"P{i:03d}" for i in range(12)] * 3, 'Hours': 1.0})
+    assert not report.use_sheet_assembly(df)
+    monkeypatch.setattr(report, 'EXCEL_ASSEMBLY_MIN_SHEETS', 12)
+    assert report.use_sheet_assembly(df)
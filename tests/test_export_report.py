@@ -0,0 +1,83 @@
+import zipfile
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import (
+    apply_filters, export_frame, export_report, load_raw_data, sum_hours,
+)
+from conftest import raw_rows, write_template
+
+
+@pytest.fixture
+def report_data(template_path):
+    write_template(template_path, raw_rows(150))
+    config = {'mode': 'month', 'year': 2024, 'months': ['January', 'February', 'March', 'April'],
+              'project_filter_df': pd.DataFrame({'Project Name': ['P000', 'P001', 'P003'],
+                                                 'Include': ['yes', 'yes', 'yes']})}
+    df = apply_filters(load_raw_data(template_path, use_snapshot=False), config)
+    return df, config
+
+
+def sheet_rows(ws):
+    return [list(row) for row in ws.iter_rows(values_only=True)]
+
+
+def test_write_only_export_content(report_data, tmp_path):
+    df, config = report_data
+    path = str(tmp_path / "Report.xlsx")
+
+    assert export_report(df, config, path)
+
+    wb = load_workbook(path)
+    assert wb.sheetnames == ['Summary', 'RawData', 'P000', 'P001', 'P003', 'Config_Info']
+    assert config['exported_files'] == [path]
+
+    summary = sheet_rows(wb['Summary'])
+    expected = sum_hours(df, 'MonthName')
+    assert summary[0] == ['MonthName', 'Hours']
+    assert [row[0] for row in summary[1:]] == list(expected.index.astype(str))
+    assert [row[1] for row in summary[1:]] == pytest.approx(list(expected))
+
+    raw = sheet_rows(wb['RawData'])
+    out = export_frame(df)
+    assert raw[0] == list(out.columns)
+    assert len(raw) == len(df) + 1
+    assert [row[list(out.columns).index('Hours')] for row in raw[1:]] == pytest.approx(list(out['Hours']))
+
+    info = {row[0]: row[1] for row in sheet_rows(wb['Config_Info'])}
+    assert info == {'Mode': 'Month', 'Year(s)': '2024', 'Months': 'January, February, March, April',
+                    'Projects Included': 'P000, P001, P003'}
+
+    with zipfile.ZipFile(path) as zf:
+        charts = [n for n in zf.namelist() if n.startswith('xl/charts/chart')]
+    # Một biểu đồ ở Summary và một ở mỗi sheet dự án
+    assert len(charts) == 4
+
+
+def test_project_sheet_has_task_summary_then_raw_rows(report_data, tmp_path):
+    df, config = report_data
+    path = str(tmp_path / "Report.xlsx")
+    export_report(df, config, path)
+
+    rows = sheet_rows(load_workbook(path)['P001'])
+    project = df[df['Project name'] == 'P001']
+    tasks = sum_hours(project, 'Task').sort_values(ascending=False)
+
+    assert rows[0][:2] == ['Task', 'Hours']
+    n_tasks = len(tasks)
+    assert [row[1] for row in rows[1:n_tasks + 1]] == pytest.approx(list(tasks))
+    # Bảng Task + 16 dòng chừa chỗ cho biểu đồ, sau đó là dòng thô của dự án
+    raw_start = n_tasks + 1 + 16
+    assert rows[raw_start][:len(export_frame(df).columns)] == list(export_frame(df).columns)
+    assert len(rows) - raw_start - 1 == len(project)
+    assert {row[list(export_frame(df).columns).index('Project name')] for row in rows[raw_start + 1:]} == {'P001'}
+
+
+def test_empty_or_incomplete_frames_are_not_exported(report_data, tmp_path):
+    df, config = report_data
+    path = str(tmp_path / "Report.xlsx")
+
+    assert export_report(df.iloc[:0], config, path) is False
+    assert export_report(df.drop(columns='MonthName'), config, path) is False
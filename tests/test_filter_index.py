@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import (
+    build_filter_index, build_hours_cube, distinct_values, frame_of, load_raw_data, select_rows,
+)
+from conftest import raw_rows, write_template
+
+
+@pytest.fixture(scope='module')
+def raw(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("index") / "Time_report.xlsx")
+    write_template(path, raw_rows(500))
+    return load_raw_data(path, use_snapshot=False)
+
+
+def mask_filter(df, years=None, months=None, projects=None):
+    # Bộ lọc bằng mặt nạ boolean như trước khi có chỉ mục
+    mask = np.ones(len(df), dtype=bool)
+    if years:
+        mask &= df['Year'].isin(years).to_numpy()
+    if months:
+        mask &= df['MonthName'].isin(months).to_numpy()
+    if projects:
+        mask &= df['Project name'].isin(projects).to_numpy()
+    return df[mask]
+
+
+SELECTIONS = [
+    (None, None, None),
+    ([2024], None, None),
+    (['2024'], ['March'], None),
+    (None, ['January', 'December', 'June'], ['P003']),
+    ([2024], ['February', 'March'], ['P000', 'P002', 'P004']),
+    (None, None, ['P001', 'P001']),
+]
+
+
+@pytest.mark.parametrize('years, months, projects', SELECTIONS)
+@pytest.mark.parametrize('use_cube', [False, True])
+def test_index_returns_same_rows_as_mask(raw, years, months, projects, use_cube):
+    df = build_hours_cube(raw) if use_cube else raw
+    index = build_filter_index(df, version="v1")
+
+    expected = mask_filter(df, [int(y) for y in years] if years else None, months, projects)
+    actual = select_rows(index, years, months, projects)
+
+    pd.testing.assert_frame_equal(actual, expected)
+    assert select_rows(df, [int(y) for y in years] if years else None, months, projects).equals(expected)
+
+
+def test_unknown_values_give_empty_selection(raw):
+    index = build_filter_index(raw)
+
+    assert select_rows(index, years=[1999]).empty
+    assert select_rows(index, months=['March'], projects=['NOPE']).empty
+    assert list(select_rows(index, projects=['NOPE']).columns) == list(raw.columns)
+
+
+def test_limit_keeps_row_order(raw):
+    index = build_filter_index(raw)
+
+    pd.testing.assert_frame_equal(select_rows(index, projects=['P002'], limit=7),
+                                  mask_filter(raw, projects=['P002']).head(7))
+    pd.testing.assert_frame_equal(select_rows(index, limit=3), raw.head(3))
+
+
+def test_index_exposes_frame_and_distinct_values(raw):
+    index = build_filter_index(raw, version="v1")
+
+    assert frame_of(index) is raw and len(index) == len(raw)
+    assert distinct_values(index, 'Project name') == distinct_values(raw, 'Project name')
+    assert distinct_values(index, 'Year') == [2024]
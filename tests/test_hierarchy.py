@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import (
+    HIERARCHY_OTHER_LABEL, HIERARCHY_UNKNOWN_LABEL, build_hierarchy_table,
+)
+
+LEVELS = ['Team', 'Project name', 'Task']
+
+
+def frame():
+    rows = []
+    # Team A: 5 dự án với số giờ giảm dần, Team B: 2 dự án
+    for i, hours in enumerate([50, 40, 30, 20, 10]):
+        rows += [('A', f"PA{i}", f"T{j}", hours / 5, 'Lead A') for j in range(5)]
+    rows += [('B', 'PB0', 'T0', 7.0, 'Lead B'), ('B', 'PB1', 'T1', 3.0, 'Lead B'), ('B', 'PB1', 'T1', 2.0, 'Lead B')]
+    return pd.DataFrame(rows, columns=LEVELS + ['Hours', 'Team leader'])
+
+
+def leaf_hours(table):
+    return {tuple(r[:len(LEVELS)]): r[-2] for r in table.itertuples(index=False)}
+
+
+def test_without_top_n_each_path_is_one_leaf():
+    df = frame()
+    table = build_hierarchy_table(df, LEVELS)
+
+    assert len(table) == df.groupby(LEVELS).ngroups
+    assert table['Hours'].sum() == pytest.approx(df['Hours'].sum())
+    assert leaf_hours(table)[('B', 'PB1', 'T1')] == pytest.approx(5.0)
+    assert set(table[table['Team'] == 'B']['Team leader']) == {'Lead B'}
+
+
+def test_top_n_folds_smaller_nodes_into_other():
+    df = frame()
+    table = build_hierarchy_table(df, LEVELS, top_n=2)
+
+    team_a = table[table['Team'] == 'A']
+    # Giữ 2 dự án lớn nhất của team A, phần còn lại gộp thành một lá "Other"
+    assert set(team_a['Project name']) == {'PA0', 'PA1', HIERARCHY_OTHER_LABEL}
+    other = team_a[team_a['Project name'] == HIERARCHY_OTHER_LABEL]
+    assert len(other) == 1 and other['Task'].isna().all()
+    assert other['Hours'].iloc[0] == pytest.approx(60.0)
+    # Mỗi dự án còn giữ tối đa 2 task + "Other"
+    assert (team_a[team_a['Project name'] == 'PA0']['Task'].tolist().count(HIERARCHY_OTHER_LABEL)) == 1
+    assert team_a.groupby('Project name').size().max() <= 3
+    # Team B đủ nhỏ nên giữ nguyên
+    assert set(table[table['Team'] == 'B']['Project name']) == {'PB0', 'PB1'}
+
+    # Tổng giờ của từng team không đổi
+    expected = df.groupby('Team')['Hours'].sum()
+    pd.testing.assert_series_equal(table.groupby('Team')['Hours'].sum(), expected)
+
+
+def test_missing_values_and_zero_hours():
+    df = frame()
+    df.loc[0, 'Task'] = None
+    df.loc[1, 'Hours'] = 0.0
+    df.loc[1, 'Team'] = 'C'
+
+    table = build_hierarchy_table(df, LEVELS)
+
+    assert HIERARCHY_UNKNOWN_LABEL in set(table['Task'])
+    assert 'C' not in set(table['Team'])
+    assert build_hierarchy_table(df.drop(columns='Team leader'), LEVELS)['Team leader'].eq(
+        HIERARCHY_UNKNOWN_LABEL).all()
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import (
+    CUBE_DIMENSIONS, apply_comparison_filters, apply_filters, build_hours_cube, load_raw_data, sum_hours,
+)
+from conftest import raw_rows, write_template
+
+
+@pytest.fixture
+def raw(template_path):
+    write_template(template_path, raw_rows(400))
+    return load_raw_data(template_path, use_snapshot=False)
+
+
+@pytest.mark.parametrize('by', ['Project name', 'Workcentre', ['Year', 'MonthName'], ['Week', 'Task'],
+                                ['Project name', 'Employee', 'Job']])
+def test_cube_rollups_match_raw(raw, by):
+    cube = build_hours_cube(raw)
+    pd.testing.assert_series_equal(sum_hours(cube, by), sum_hours(raw, by))
+
+
+def test_cube_is_smaller_and_keeps_rows_with_missing_dimensions(raw):
+    # Mỗi dòng lặp lại hai lần (khác ngày không nằm trong cube) -> cube phải gộp lại
+    df = pd.concat([raw, raw], ignore_index=True)
+    df.loc[df.index[::9], 'Task'] = np.nan
+    cube = build_hours_cube(df)
+
+    assert list(cube.columns) == [c for c in CUBE_DIMENSIONS if c in df.columns] + ['Hours']
+    assert len(cube) < len(df)
+    assert cube['Task'].isna().any()
+    assert cube['Hours'].astype('float64').sum() == pytest.approx(df['Hours'].astype('float64').sum())
+
+
+def test_empty_frame_gives_empty_cube():
+    cube = build_hours_cube(pd.DataFrame(columns=['Project name', 'Hours']))
+    assert cube.empty and list(cube.columns) == ['Project name', 'Hours']
+
+
+def test_filters_and_comparisons_on_cube_match_raw(raw):
+    cube = build_hours_cube(raw)
+    config = {'year': 2024, 'months': ['February', 'March'],
+              'project_filter_df': pd.DataFrame({'Project Name': ['P001', 'P002'], 'Include': ['yes', 'yes']})}
+    pd.testing.assert_series_equal(sum_hours(apply_filters(cube, config), 'Task'),
+                                   sum_hours(apply_filters(raw, config), 'Task'))
+
+    comparison = {'years': [2024], 'months': ['May'], 'selected_projects': ['P000', 'P001', 'P004']}
+    mode = "So Sánh Dự Án Trong Một Tháng"
+    from_cube, title_cube, projects = apply_comparison_filters(cube, comparison, mode)
+    from_raw, title_raw, _ = apply_comparison_filters(raw, comparison, mode)
+    assert title_cube == title_raw and projects == ['P000', 'P001', 'P004']
+    # Cube không có cột Date / Sheet row nên chỉ so tổng giờ theo dự án
+    pd.testing.assert_series_equal(sum_hours(from_cube, 'Project Name'), sum_hours(from_raw, 'Project Name'))
+
+    mode = "So Sánh Dự Án Trong Một Năm"
+    from_cube, title_cube, _ = apply_comparison_filters(cube, comparison, mode)
+    from_raw, title_raw, _ = apply_comparison_filters(raw, comparison, mode)
+    assert title_cube == title_raw and not from_cube.empty
+    pd.testing.assert_frame_equal(from_cube, from_raw)
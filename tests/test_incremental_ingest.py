@@ -0,0 +1,176 @@
+import re
+import zipfile
+from xml.sax.saxutils import escape, unescape
+
+import pandas as pd
+from openpyxl import load_workbook
+
+import a04ecaf1_1dae_4c90_8081_086cd7c7b725 as report
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import SHEET_ROW_COLUMN, TemplateWorkbook, load_template
+from conftest import raw_rows, write_template
+
+
+def fresh_parse(path):
+    df, _ = load_template(path, use_snapshot=False)
+    return df
+
+
+def assert_same_data(df, expected):
+    pd.testing.assert_frame_equal(df.reset_index(drop=True), expected.reset_index(drop=True),
+                                  check_categorical=False)
+
+
+def edit_cell(path, row, column, value):
+    wb = load_workbook(path)
+    wb['Raw Data'].cell(row=row, column=column, value=value)
+    wb.save(path)
+
+
+STRING_CELL = re.compile(r'<c r="([A-Z]+\d+)"([^>]*?) t="(?:inlineStr|s)"([^>]*)>'
+                         r'(?:<is><t[^>]*>(.*?)</t></is>|<v>(\d+)</v>)</c>')
+SHARED_STRINGS_PART = 'xl/sharedStrings.xml'
+SHARED_STRINGS_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+SHARED_STRINGS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"
+
+
+def shared_strings(path):
+    with zipfile.ZipFile(path) as archive:
+        if SHARED_STRINGS_PART not in archive.namelist():
+            return []
+        xml = archive.read(SHARED_STRINGS_PART).decode('utf-8')
+    return [unescape(re.sub(r'<[^>]+>', '', si)) for si in re.findall(r'<si>(.*?)</si>', xml, re.S)]
+
+
+def resave_excel_style(path):
+    """Ghi lại gói xlsx như Excel khi lưu: mọi ô chữ dùng bảng shared strings, được dựng lại và đánh số lại."""
+    old_strings = shared_strings(path)
+    with zipfile.ZipFile(path) as archive:
+        parts = {name: archive.read(name).decode('utf-8') for name in archive.namelist()}
+    sheets = [name for name in parts if name.startswith('xl/worksheets/sheet')]
+
+    def text(match):
+        return old_strings[int(match.group(5))] if match.group(5) is not None else unescape(match.group(4))
+
+    strings = sorted({text(m) for name in sheets for m in STRING_CELL.finditer(parts[name])})
+    index = {value: i for i, value in enumerate(strings)}
+    for name in sheets:
+        parts[name] = STRING_CELL.sub(
+            lambda m: f'<c r="{m.group(1)}"{m.group(2)} t="s"{m.group(3)}><v>{index[text(m)]}</v></c>', parts[name])
+    items = ''.join(f'<si><t xml:space="preserve">{escape(value)}</t></si>' for value in strings)
+    parts[SHARED_STRINGS_PART] = (
+        '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        f'count="{len(strings)}" uniqueCount="{len(strings)}">{items}</sst>')
+    if SHARED_STRINGS_TYPE not in parts['[Content_Types].xml']:
+        parts['[Content_Types].xml'] = parts['[Content_Types].xml'].replace(
+            '</Types>', f'<Override PartName="/{SHARED_STRINGS_PART}" ContentType="{SHARED_STRINGS_TYPE}"/></Types>')
+    rels = 'xl/_rels/workbook.xml.rels'
+    if SHARED_STRINGS_REL not in parts[rels]:
+        parts[rels] = parts[rels].replace(
+            '</Relationships>',
+            f'<Relationship Id="rIdSst" Type="{SHARED_STRINGS_REL}" Target="sharedStrings.xml"/></Relationships>')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in parts.items():
+            archive.writestr(name, data)
+
+
+def test_appended_rows_are_ingested_incrementally(template_path, capsys):
+    write_template(template_path, raw_rows(300))
+    load_template(template_path)
+    write_template(template_path, raw_rows(305))
+    capsys.readouterr()
+
+    df, _ = load_template(template_path)
+
+    assert "Ingest tăng dần: 5 dòng mới" in capsys.readouterr().out
+    assert_same_data(df, fresh_parse(template_path))
+
+
+def test_middle_row_number_edit_forces_full_reload(template_path, capsys):
+    write_template(template_path, raw_rows(300))
+    load_template(template_path)
+    edit_cell(template_path, 152, 10, 20.0)
+    capsys.readouterr()
+
+    df, _ = load_template(template_path)
+
+    assert "đọc lại toàn bộ sheet" in capsys.readouterr().out
+    expected = fresh_parse(template_path)
+    assert_same_data(df, expected)
+    assert round(float(df['Hours'].astype('float64').sum()), 2) == round(float(expected['Hours'].astype('float64').sum()), 2)
+
+
+def test_middle_row_string_edit_forces_full_reload(template_path, capsys):
+    # openpyxl dựng lại bảng shared strings khi lưu: chỉ số trong XML có thể giữ nguyên dù chuỗi đổi
+    write_template(template_path, raw_rows(300))
+    load_template(template_path)
+    edit_cell(template_path, 2, 3, "Renamed employee")
+    capsys.readouterr()
+
+    df, _ = load_template(template_path)
+
+    assert "đọc lại toàn bộ sheet" in capsys.readouterr().out
+    assert "Renamed employee" in set(df['Employee'].astype(str))
+    assert_same_data(df, fresh_parse(template_path))
+
+
+def test_edit_then_append_is_not_ingested_incrementally(template_path, capsys):
+    write_template(template_path, raw_rows(300))
+    load_template(template_path)
+    rows = raw_rows(310)
+    rows[150][9] = 23.5
+    write_template(template_path, rows)
+    capsys.readouterr()
+
+    df, _ = load_template(template_path)
+
+    assert "Ingest tăng dần" not in capsys.readouterr().out
+    assert_same_data(df, fresh_parse(template_path))
+
+
+def test_append_survives_shared_string_renumbering(template_path, capsys):
+    write_template(template_path, raw_rows(300))
+    resave_excel_style(template_path)
+    load_template(template_path)
+    before = shared_strings(template_path)
+    rows = raw_rows(305)
+    rows[-1][7] = "Aardvark review"  # chuỗi mới đứng đầu bảng -> mọi chỉ số cũ đều dịch đi
+    write_template(template_path, rows)
+    resave_excel_style(template_path)
+    assert shared_strings(template_path).index("Team1") != before.index("Team1")
+    capsys.readouterr()
+
+    df, _ = load_template(template_path)
+
+    assert "Ingest tăng dần: 5 dòng mới" in capsys.readouterr().out
+    assert "Aardvark review" in set(df['Task'].astype(str))
+    assert_same_data(df, fresh_parse(template_path))
+
+
+def test_trailing_rows_cleared_force_full_reload(template_path, capsys):
+    write_template(template_path, raw_rows(300))
+    load_template(template_path)
+    wb = load_workbook(template_path)
+    for cell in wb['Raw Data'][301]:
+        cell.value = None
+    wb.save(template_path)
+    capsys.readouterr()
+
+    df, _ = load_template(template_path)
+
+    assert "đọc lại toàn bộ sheet" in capsys.readouterr().out
+    assert len(df) == 299
+
+
+def test_sheet_scan_does_not_depend_on_block_size(template_path, monkeypatch):
+    rows = raw_rows(120)
+    write_template(template_path, rows)
+    resave_excel_style(template_path)
+    with TemplateWorkbook(template_path) as template:
+        expected = template.scan_raw_data(60)
+        monkeypatch.setattr(report, 'SHEET_XML_BLOCK_SIZE', 97)
+        assert template.scan_raw_data(60) == expected
+        appended = template.read_raw_data(min_row=62)
+
+    assert expected[0]['last_data_row'] == 121
+    assert list(appended[SHEET_ROW_COLUMN]) == list(range(62, 122))
+    assert list(appended['Task'].astype(str)) == [row[7] for row in rows[60:]]
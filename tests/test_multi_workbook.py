@@ -0,0 +1,64 @@
+import os
+
+import pandas as pd
+
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import (
+    config_workbook, load_raw_data, load_template, load_workbooks, resolve_workbooks,
+)
+from conftest import raw_rows, write_template
+
+
+def make_source(tmp_path, sizes=(30, 40, 50)):
+    source = tmp_path / "data"
+    source.mkdir()
+    start = 0
+    for year, n in zip(range(2022, 2022 + len(sizes)), sizes):
+        write_template(str(source / f"Time_report_{year}.xlsx"), raw_rows(n, start=start))
+        start += n
+    return source
+
+
+def test_resolve_directory_and_glob(tmp_path):
+    source = make_source(tmp_path)
+    (source / "~$Time_report_2024.xlsx").write_bytes(b"lock")
+    (source / "notes.txt").write_text("x")
+    expected = [str(source / f"Time_report_{year}.xlsx") for year in (2022, 2023, 2024)]
+
+    assert resolve_workbooks(str(source)) == expected
+    assert resolve_workbooks(str(source / "Time_report_202[34].xlsx")) == expected[1:]
+    assert resolve_workbooks(expected[0]) == expected[:1]
+    assert config_workbook(str(source)) == expected[-1]
+
+
+def test_parallel_load_matches_serial(tmp_path):
+    source = make_source(tmp_path)
+    paths = resolve_workbooks(str(source))
+
+    parallel, config = load_workbooks(paths, use_snapshot=False, max_workers=3)
+    serial, _ = load_workbooks(paths, use_snapshot=False, max_workers=1)
+
+    assert len(parallel) == 120
+    pd.testing.assert_frame_equal(parallel, serial)
+    assert config['year'] == 2024
+    one_by_one = pd.concat([load_raw_data(p, use_snapshot=False) for p in paths], ignore_index=True)
+    assert parallel['Hours'].sum() == one_by_one['Hours'].sum()
+    assert list(parallel['Employee'].astype(str)) == list(one_by_one['Employee'].astype(str))
+
+
+def test_only_changed_workbook_is_parsed(tmp_path, capsys):
+    source = make_source(tmp_path)
+    load_template(str(source))
+    write_template(str(source / "Time_report_2024.xlsx"), raw_rows(55, start=70))
+    capsys.readouterr()
+
+    df, _ = load_template(str(source))
+
+    assert len(df) == 125
+    assert "3 workbook, parse lại 1" in capsys.readouterr().out
+
+
+def test_empty_source_returns_defaults(tmp_path):
+    source = tmp_path / "empty"
+    os.makedirs(source)
+    df, config = load_template(str(source))
+    assert df.empty and config['mode'] == 'year'
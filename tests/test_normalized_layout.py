@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import apply_filters, export_frame, export_report, load_raw_data
+from conftest import raw_rows, write_template
+
+
+@pytest.fixture
+def report_data(template_path):
+    write_template(template_path, raw_rows(120))
+    config = {'mode': 'year', 'year': 2024, 'months': [], 'layout': 'Normalized',
+              'project_filter_df': pd.DataFrame({'Project Name': ['P000', 'P002', 'P004'],
+                                                 'Include': ['yes'] * 3})}
+    return apply_filters(load_raw_data(template_path, use_snapshot=False), config), config
+
+
+def test_raw_rows_written_once_as_table(report_data, tmp_path):
+    df, config = report_data
+    path = str(tmp_path / "Report.xlsx")
+
+    assert export_report(df, config, path)
+
+    wb = load_workbook(path)
+    columns = list(export_frame(df).columns)
+    raw = wb['RawData']
+    (table,) = raw.tables.values()
+    assert table.displayName == 'RawData'
+    assert table.ref == f"A1:{raw.cell(1, len(columns)).column_letter}{len(df) + 1}"
+    assert [c.name for c in table.tableColumns] == columns
+    assert [c.value for c in raw[1]] == columns
+    assert raw.max_row == len(df) + 1
+
+    for project in ('P000', 'P002', 'P004'):
+        ws = wb[project]
+        # Chỉ có bảng Task + dòng trống + liên kết; không lặp lại dòng thô
+        n_tasks = df.loc[df['Project name'] == project, 'Task'].nunique()
+        assert ws.max_row == n_tasks + 3
+        link = ws.cell(n_tasks + 3, 1)
+        assert link.value == "Raw data → RawData"
+        assert link.hyperlink.location == "'RawData'!A1"
+    assert dict(row for row in wb['Config_Info'].iter_rows(values_only=True))['Layout'] == 'Normalized'
+
+
+def test_normalized_part_files_only_hold_the_table(report_data, tmp_path):
+    df, config = report_data
+    path = str(tmp_path / "Report.xlsx")
+    config = dict(config, shard_by='rows', shard_rows=50, shard_target='files')
+
+    assert export_report(df, config, path)
+
+    parts = config['exported_files'][1:]
+    assert len(parts) == 2
+    total = 0
+    for part in parts:
+        wb = load_workbook(part)
+        assert wb.sheetnames == ['RawData']
+        assert len(wb['RawData'].tables) == 1
+        total += wb['RawData'].max_row - 1
+    assert total == len(df)
+    assert any(c.value == "Raw data → Manifest" for row in load_workbook(path)['P000'].iter_rows() for c in row)
@@ -0,0 +1,72 @@
+import math
+
+import pandas as pd
+import pytest
+
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import (
+    apply_comparison_filters, compute_period_delta, period_label, previous_period,
+)
+
+
+def frame():
+    rows = [
+        (2024, 'May', 'A', 'WC1', 10.0), (2024, 'May', 'A', 'WC2', 5.0), (2024, 'May', 'B', 'WC1', 4.0),
+        (2024, 'June', 'A', 'WC1', 12.0), (2024, 'June', 'C', 'WC2', 6.0), (2024, 'June', 'B', 'WC1', 0.0),
+        (2023, 'June', 'A', 'WC1', 100.0), (2023, 'December', 'B', 'WC2', 8.0), (2024, 'January', 'B', 'WC2', 2.0),
+    ]
+    return pd.DataFrame(rows, columns=['Year', 'MonthName', 'Project name', 'Workcentre', 'Hours'])
+
+
+def test_previous_period_and_label():
+    assert previous_period((2024, 'June')) == (2024, 'May')
+    assert previous_period((2024, 'January')) == (2023, 'December')
+    assert previous_period((2024, None)) == (2023, None)
+    assert period_label((2024, 'June')) == "June 2024" and period_label((2024, None)) == "2024"
+
+
+def test_delta_aligns_groups_missing_from_one_period():
+    table = compute_period_delta(frame(), (2024, 'June')).set_index('Project name')
+
+    assert list(table.columns) == ['Previous Hours', 'Current Hours', 'Change', 'Change %']
+    assert table.loc['A'].tolist() == [15.0, 12.0, -3.0, -20.0]
+    assert table.loc['B', 'Change'] == -4.0 and table.loc['B', 'Change %'] == -100.0
+    # Dự án mới (kỳ trước = 0): Change % để trống
+    assert table.loc['C', 'Previous Hours'] == 0.0 and table.loc['C', 'Change'] == 6.0
+    assert math.isnan(table.loc['C', 'Change %'])
+    assert table.index[-1] == 'Total'
+    assert table.loc['Total'].tolist()[:3] == [19.0, 18.0, -1.0]
+
+
+def test_delta_across_years_and_by_several_dimensions():
+    df = frame()
+
+    january = compute_period_delta(df, (2024, 'January')).set_index('Project name')
+    assert january.loc['B'].tolist()[:3] == [8.0, 2.0, -6.0]
+
+    year = compute_period_delta(df, (2024, None), by=['Project name', 'Workcentre'])
+    assert list(year.columns[:2]) == ['Project name', 'Workcentre']
+    a_wc1 = year[(year['Project name'] == 'A') & (year['Workcentre'] == 'WC1')].iloc[0]
+    assert a_wc1[['Previous Hours', 'Current Hours', 'Change']].tolist() == [100.0, 22.0, -78.0]
+
+
+def test_missing_base_period_gives_empty_change_percent():
+    table = compute_period_delta(frame(), (2024, 'May'), previous=(2020, 'May'))
+
+    assert (table['Previous Hours'] == 0).all()
+    assert table['Change'].tolist() == table['Current Hours'].tolist()
+    assert table['Change %'].isna().all()
+    assert compute_period_delta(frame(), (2030, 'May'))[['Previous Hours', 'Current Hours']].to_numpy().sum() == 0
+
+
+def test_period_over_period_comparison_mode():
+    df = frame()
+    config = {'years': [2024], 'months': [], 'selected_projects': ['A', 'B', 'C'],
+              'current_period': [2024, 'June'], 'delta_by': ['Workcentre', 'Unknown']}
+
+    table, title, projects = apply_comparison_filters(df, config, "Compare Period over Period")
+
+    assert title == "Chênh lệch giờ: June 2024 so với May 2024"
+    assert list(table.columns[:2]) == ['Project Name', 'Workcentre']
+    assert table['Change'].iloc[-1] == pytest.approx(-1.0)
+    assert projects == ['A', 'B', 'C']
+    assert apply_comparison_filters(df, dict(config, current_period=None), "Compare Period over Period")[0].empty
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import (
+    MONTH_ORDER, apply_comparison_filters, comparison_matrix, load_raw_data, pivot_hours,
+)
+from conftest import raw_rows, write_template
+
+
+@pytest.fixture
+def raw(template_path):
+    write_template(template_path, raw_rows(300))
+    return load_raw_data(template_path, use_snapshot=False)
+
+
+def reference_pivot(df, rows, columns):
+    # pivot_table của pandas với margins làm chuẩn so sánh
+    plain = df.astype({c: object for c in rows + [columns]}).assign(Hours=df['Hours'].astype('float64'))
+    return plain.pivot_table(index=rows, columns=columns, values='Hours', aggfunc='sum', fill_value=0,
+                             margins=True, margins_name='Total')
+
+
+def test_margins_match_pivot_table(raw):
+    table = pivot_hours(raw, 'Project name', 'Workcentre')
+    expected = reference_pivot(raw, ['Project name'], 'Workcentre')
+
+    assert list(table.columns) == ['Project name'] + [f"WC{i}" for i in range(6)] + ['Total']
+    assert list(table['Project name']) == [f"P{i:03d}" for i in range(5)] + ['Total']
+    np.testing.assert_allclose(table.drop(columns='Project name').to_numpy(), expected.to_numpy(), atol=1e-6)
+
+
+def test_month_columns_follow_calendar_order(raw):
+    table = pivot_hours(raw[raw['MonthName'].isin(['December', 'February', 'October'])], 'Task', 'MonthName',
+                        margins_name='Total Hours', row_label='All tasks')
+
+    assert list(table.columns) == ['Task', 'February', 'October', 'December', 'Total Hours']
+    assert table['Task'].iloc[-1] == 'All tasks'
+    assert table.iloc[-1, 1:].tolist() == pytest.approx(table.iloc[:-1, 1:].sum().tolist())
+    assert table['Total Hours'].iloc[:-1].tolist() == pytest.approx(table.iloc[:-1, 1:4].sum(axis=1).tolist())
+
+
+def test_year_month_columns_are_chronological():
+    df = pd.DataFrame({
+        'Project name': ['A', 'B', 'A', 'B', 'A'],
+        'Year': [2025, 2024, 2024, 2025, 2023],
+        'MonthName': ['January', 'December', 'March', 'January', 'November'],
+        'Hours': [1.0, 2.0, 3.0, 4.0, 5.0],
+    })
+
+    table = pivot_hours(df, 'Project name', 'YearMonth', margins=False)
+
+    assert list(table.columns) == ['Project name', '2023-11', '2024-03', '2024-12', '2025-01']
+    # Ô không có dữ liệu = 0
+    assert table.set_index('Project name').loc['B'].tolist() == [0.0, 0.0, 2.0, 4.0]
+
+
+def test_several_rows_and_no_columns(raw):
+    table = pivot_hours(raw, ['Project name', 'Task'])
+
+    assert list(table.columns) == ['Project name', 'Task', 'Total']
+    assert table.iloc[-1].tolist()[:2] == ['Total', '']
+    assert table['Total'].iloc[-1] == pytest.approx(raw['Hours'].astype('float64').sum())
+    assert len(table) == raw.groupby(['Project name', 'Task'], observed=True).ngroups + 1
+    assert pivot_hours(raw, 'Task', margins=False)['Total'].sum() == pytest.approx(table['Total'].iloc[-1])
+
+
+def test_comparison_matrices(raw):
+    config = {'years': [2024], 'months': ['March'], 'selected_projects': ['P000', 'P001', 'P002']}
+
+    mode = "So Sánh Dự Án Trong Một Tháng"
+    detail, _, _ = apply_comparison_filters(raw, config, mode)
+    matrix = comparison_matrix(detail, config, mode)
+    assert matrix.iloc[-1, 0] == 'Total'
+    assert matrix.iloc[-1, -1] == pytest.approx(detail['Hours'].astype('float64').sum())
+
+    mode = "So Sánh Dự Án Trong Một Năm"
+    year_matrix, _, _ = apply_comparison_filters(raw, dict(config, months=[]), mode)
+    assert comparison_matrix(year_matrix, config, mode) is year_matrix
+    assert list(year_matrix.columns[1:13]) == MONTH_ORDER
+    assert list(year_matrix['Project Name']) == ['P000', 'P001', 'P002', 'Total']
@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import (
+    build_hours_cube, hours_by_project, load_raw_data, split_by_project, sum_hours,
+)
+from conftest import raw_rows, write_template
+
+
+@pytest.fixture
+def raw(template_path):
+    write_template(template_path, raw_rows(250, start=3))
+    return load_raw_data(template_path, use_snapshot=False)
+
+
+def test_split_matches_per_project_filter(raw):
+    df = raw.copy()
+    df.loc[df.index[::11], 'Project name'] = None
+
+    parts = list(split_by_project(df))
+
+    # Thứ tự như unique(), bỏ dòng không có dự án
+    assert [project for project, _ in parts] == df['Project name'].dropna().unique().tolist()
+    for project, part in parts:
+        pd.testing.assert_frame_equal(part, df[df['Project name'] == project])
+    assert sum(len(part) for _, part in parts) == df['Project name'].notna().sum()
+
+
+@pytest.mark.parametrize('by', ['Task', 'Workcentre'])
+@pytest.mark.parametrize('use_cube', [False, True])
+def test_hours_by_project_matches_per_project_sums(raw, by, use_cube):
+    df = build_hours_cube(raw) if use_cube else raw
+
+    summaries = hours_by_project(df, by)
+
+    assert sorted(summaries) == sorted(df['Project name'].unique().tolist())
+    for project, totals in summaries.items():
+        pd.testing.assert_series_equal(totals, sum_hours(df[df['Project name'] == project], by))
+
+
+def test_empty_or_missing_columns_give_nothing(raw):
+    assert list(split_by_project(raw.iloc[:0].drop(columns='Project name'))) == []
+    assert hours_by_project(raw.iloc[:0], 'Task') == {}
+    assert hours_by_project(raw, 'Unknown column') == {}
@@ -0,0 +1,109 @@
+import os
+import threading
+
+import pandas as pd
+
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import ReportCache, cached_export, report_cache_key
+
+
+def render_to(path, payload=b'report', calls=None):
+    def render():
+        if calls is not None:
+            calls.append(path)
+        with open(path, 'wb') as f:
+            f.write(payload)
+        return True
+    return render
+
+
+def test_key_ignores_order_and_result_keys():
+    projects = pd.DataFrame({'Project Name': ['P1', 'P2'], 'Include': ['yes', 'no']})
+    base = {'mode': 'month', 'year': 2024, 'months': ['March', 'January'], 'project_filter_df': projects}
+    same = {'project_filter_df': projects.iloc[::-1], 'months': ['January', 'March'], 'year': 2024,
+            'mode': 'month', 'exported_files': ['x.xlsx']}
+    key = report_cache_key('v1', 'standard_excel', base)
+
+    assert key == report_cache_key('v1', 'standard_excel', same)
+    assert key != report_cache_key('v2', 'standard_excel', base)
+    assert key != report_cache_key('v1', 'standard_pdf', base)
+    assert key != report_cache_key('v1', 'standard_excel', {**base, 'months': ['January']})
+    assert key != report_cache_key('v1', 'standard_excel', base, language='en')
+    assert report_cache_key(None, 'standard_excel', base) is None
+
+
+def test_hit_serves_stored_files(tmp_path):
+    cache = ReportCache(str(tmp_path / 'cache'), 1 << 20)
+    out = str(tmp_path / 'out' / 'Report.xlsx')
+    os.makedirs(os.path.dirname(out))
+    calls = []
+
+    assert cached_export(cache, 'k1', out, render_to(out, b'first', calls))
+    assert not cache.last_hit
+    os.remove(out)
+    assert cached_export(cache, 'k1', out, render_to(out, b'second', calls))
+
+    assert cache.last_hit
+    assert len(calls) == 1
+    with open(out, 'rb') as f:
+        assert f.read() == b'first'
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_part_files_are_cached_with_the_report(tmp_path):
+    cache = ReportCache(str(tmp_path / 'cache'), 1 << 20)
+    out = str(tmp_path / 'Report.xlsx')
+    part = str(tmp_path / 'Report_part_2024.xlsx')
+
+    def render():
+        for path in (out, part):
+            with open(path, 'wb') as f:
+                f.write(path.encode())
+        config['exported_files'] = [out, part]
+        return True, "ok"
+
+    config = {}
+    assert cached_export(cache, 'k1', out, render, config) == (True, "ok")
+    os.remove(part)
+    config = {}
+    assert cached_export(cache, 'k1', out, render, config) == (True, "ok")
+    assert cache.last_hit
+    assert config['exported_files'] == [out, part]
+    assert os.path.exists(part)
+
+
+def test_failed_render_is_not_cached(tmp_path):
+    cache = ReportCache(str(tmp_path / 'cache'), 1 << 20)
+    out = str(tmp_path / 'Report.xlsx')
+    assert not cached_export(cache, 'k1', out, lambda: False)
+    assert cache.lookup('k1', out) is None
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = ReportCache(str(tmp_path / 'cache'), 1 << 20)
+    out = str(tmp_path / 'Report.xlsx')
+    for i, key in enumerate(('a', 'b', 'c')):
+        cached_export(cache, key, out, render_to(out, b'x' * 1000))
+        # mtime của meta.json là thời điểm dùng gần nhất
+        os.utime(os.path.join(cache.cache_dir, key, 'meta.json'), (1000 + i, 1000 + i))
+    os.utime(os.path.join(cache.cache_dir, 'a', 'meta.json'), (2000, 2000))
+    # Chỗ cho hai mục: thêm 'd' -> loại 'b' và 'c' (dùng ít gần đây nhất), giữ 'a' vừa dùng lại
+    entry_size = max(size for _, size, _ in cache.entries())
+    cache.max_bytes = 2 * entry_size + 100
+
+    cached_export(cache, 'd', out, render_to(out, b'x' * 1000))
+
+    assert sorted(os.listdir(cache.cache_dir)) == ['a', 'd']
+
+
+def test_last_hit_is_per_thread(tmp_path):
+    cache = ReportCache(str(tmp_path / 'cache'), 1 << 20)
+    out = str(tmp_path / 'Report.xlsx')
+    cached_export(cache, 'k1', out, render_to(out))
+    cached_export(cache, 'k1', out, render_to(out))
+    assert cache.last_hit
+
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(cache.last_hit))
+    thread.start()
+    thread.join()
+    assert seen == [False]
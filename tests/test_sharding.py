@@ -0,0 +1,117 @@
+import os
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+import Time_report
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import (
+    MANIFEST_COLUMNS, SHARD_ROW_BUDGET, apply_filters, build_config, count_shards, export_report,
+    load_raw_data, plan_shards, shard_file_path, shard_policy, shard_sheet_title,
+)
+from conftest import raw_rows, write_template
+
+
+def frame(years):
+    rows = [(year, f"{year}-{i}") for year, n in years for i in range(n)]
+    return pd.DataFrame(rows, columns=['Year', 'Date'])
+
+
+def test_shard_policy_normalizes_config():
+    assert shard_policy({}) == ('none', SHARD_ROW_BUDGET, 'sheets')
+    assert shard_policy({'shard_by': ' Rows ', 'shard_rows': '50', 'shard_target': 'FILES'}) == ('rows', 50, 'files')
+    assert shard_policy({'shard_by': 'year', 'shard_rows': 'abc', 'shard_target': 'zip'}) == \
+        ('year', SHARD_ROW_BUDGET, 'sheets')
+    assert shard_policy({'shard_by': 'rows', 'shard_rows': 10 ** 9})[1] == SHARD_ROW_BUDGET
+    assert shard_policy({'shard_by': 'bogus', 'shard_rows': 5})[:2] == ('none', SHARD_ROW_BUDGET)
+
+
+@pytest.mark.parametrize('shard_by, budget, labels', [
+    ('none', 100, [None]),
+    ('rows', 4, ['1', '2', '3']),
+    ('year', 100, ['2023', '2024']),
+    ('year', 3, ['2023', '2024-1', '2024-2']),
+])
+def test_plan_shards_labels_and_sizes(shard_by, budget, labels):
+    df = frame([(2024, 6), (2023, 3)])
+
+    parts = list(plan_shards(df, shard_by, budget))
+
+    assert [label for label, _ in parts] == labels
+    assert count_shards(df, shard_by, budget) == len(parts)
+    assert all(len(part) <= budget for _, part in parts)
+    assert sorted(i for _, part in parts for i in part.index) == list(df.index)
+    assert list(plan_shards(df.iloc[:0], shard_by, budget))[0][0] is None
+
+
+def test_shard_names():
+    assert shard_sheet_title("RawData", None) == "RawData"
+    assert shard_sheet_title("RawData", "2024-1") == "RawData 2024-1"
+    assert len(shard_sheet_title("A" * 30, "2024")) == 31
+    assert shard_file_path(os.path.join("out", "Report.xlsx"), "2024") == os.path.join("out", "Report_part_2024.xlsx")
+    assert shard_file_path("Report", None) == "Report_part_1.xlsx"
+
+
+@pytest.fixture
+def report_data(template_path):
+    write_template(template_path, raw_rows(90))
+    config = {'mode': 'year', 'year': 2024, 'months': [],
+              'project_filter_df': pd.DataFrame({'Project Name': ['P000', 'P001'], 'Include': ['yes', 'yes']})}
+    return apply_filters(load_raw_data(template_path, use_snapshot=False), config), config
+
+
+def manifest(path):
+    rows = list(load_workbook(path)['Manifest'].iter_rows(values_only=True))
+    assert list(rows[0]) == MANIFEST_COLUMNS
+    return [dict(zip(MANIFEST_COLUMNS, row)) for row in rows[1:]]
+
+
+def test_rows_sharded_across_sheets(report_data, tmp_path):
+    df, config = report_data
+    path = str(tmp_path / "Report.xlsx")
+
+    assert export_report(df, dict(config, shard_by='rows', shard_rows=15), path)
+
+    wb = load_workbook(path)
+    raw_sheets = [name for name in wb.sheetnames if name.startswith('RawData')]
+    assert raw_sheets == ['RawData 1', 'RawData 2', 'RawData 3']
+    entries = manifest(path)
+    raw_entries = [e for e in entries if e['Content'] == 'RawData']
+    assert [e['Sheet'] for e in raw_entries] == raw_sheets
+    assert sum(e['Rows'] for e in raw_entries) == len(df)
+    assert all(wb[e['Sheet']].max_row == e['Rows'] + 1 for e in raw_entries)
+    # Dòng thô của mỗi dự án cũng được đếm đủ trong Manifest
+    for project in ('P000', 'P001'):
+        assert sum(e['Rows'] for e in entries if e['Content'] == project) == (df['Project name'] == project).sum()
+
+
+def test_year_shards_written_to_part_files(report_data, tmp_path):
+    df, config = report_data
+    path = str(tmp_path / "Report.xlsx")
+    config = dict(config, shard_by='year', shard_target='files')
+
+    assert export_report(df, config, path)
+
+    part = str(tmp_path / "Report_part_2024.xlsx")
+    assert config['exported_files'] == [path, part]
+    assert load_workbook(part).sheetnames == ['RawData', 'P000', 'P001']
+    entries = manifest(path)
+    assert {e['File'] for e in entries} == {"Report_part_2024.xlsx"}
+    assert sum(e['Rows'] for e in entries if e['Content'] == 'RawData') == len(df)
+    assert 'RawData' not in load_workbook(path).sheetnames
+
+
+def test_cli_config_uses_shared_parser():
+    year_mode = pd.DataFrame({'Key': ['mode', 'year', 'months', 'shard_by'],
+                              'Value': ['Month', None, 'march, april', 'year']})
+    projects = pd.DataFrame({'Project Name': ['P1'], 'Include': ['YES']})
+
+    config = Time_report.parse_configs(year_mode, projects)
+
+    assert config['year'] is None and config['shard_by'] == 'year'
+    assert config['months'] == ['March', 'April'] and config['mode'] == 'month'
+    app_config = build_config(year_mode, projects)
+    assert {k: v for k, v in app_config.items() if k != 'year'} == {k: v for k, v in config.items() if k != 'year'}
+    assert isinstance(app_config['year'], int)
+    with pytest.raises(ValueError):
+        Time_report.parse_configs(year_mode[year_mode['Key'] != 'year'], projects)
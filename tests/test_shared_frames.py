@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import (
+    apply_comparison_filters, build_filter_index, build_hierarchy_table, build_hours_cube,
+    create_comparison_chart, export_comparison_report, load_raw_data, select_rows,
+)
+from conftest import raw_rows, write_template
+
+
+@pytest.fixture
+def raw(template_path):
+    write_template(template_path, raw_rows(300))
+    return load_raw_data(template_path, use_snapshot=False)
+
+
+def test_unfiltered_selection_is_a_shallow_copy(raw):
+    before = raw.copy()
+    index = build_filter_index(raw)
+
+    selected = select_rows(index)
+    selected['Hours'] = 0
+    selected['Extra'] = 1
+
+    assert selected is not raw
+    pd.testing.assert_frame_equal(raw, before)
+    assert select_rows(index, limit=5) is not raw
+
+
+def test_comparison_helpers_leave_shared_frame_untouched(raw, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cube = build_hours_cube(raw)
+    index = build_filter_index(cube, version="v1:cube")
+    before = cube.copy()
+    config = {'years': [2024], 'months': [], 'selected_projects': ['P000', 'P001', 'P002']}
+
+    for mode in ("So Sánh Dự Án Trong Một Năm", "So Sánh Nhiều Dự Án Qua Các Tháng/Năm"):
+        df_comparison, title, _ = apply_comparison_filters(index, config, mode)
+        detail = df_comparison.copy()
+        assert create_comparison_chart(df_comparison, mode, title, "x", "y", None, config)
+        export_comparison_report(df_comparison, config, str(tmp_path / "out" / "cmp.xlsx"), mode)
+        assert (tmp_path / "out" / "cmp.xlsx").exists()
+        # Biểu đồ / xuất file không ghi vào frame của người gọi
+        pd.testing.assert_frame_equal(df_comparison, detail)
+
+    pd.testing.assert_frame_equal(cube, before)
+    assert cube['Hours'].dtype == 'float32'
+
+
+def test_hierarchy_table_does_not_modify_input(raw):
+    df = raw.copy()
+    df.loc[df.index[::5], 'Workcentre'] = None
+    before = df.copy()
+
+    build_hierarchy_table(df, ['Project name', 'Workcentre', 'Task'], top_n=2)
+
+    pd.testing.assert_frame_equal(df, before)
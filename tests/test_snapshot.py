@@ -0,0 +1,78 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import a04ecaf1_1dae_4c90_8081_086cd7c7b725 as report
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import get_snapshot_dir, load_raw_data
+from conftest import raw_rows, write_template
+
+
+def test_second_load_reads_snapshot(template_path, capsys, monkeypatch):
+    write_template(template_path, raw_rows(50))
+    first = load_raw_data(template_path)
+    assert os.path.exists(os.path.join(get_snapshot_dir(template_path), "raw_data.parquet"))
+    capsys.readouterr()
+
+    # Snapshot còn khớp -> không mở workbook
+    monkeypatch.setattr(report, 'TemplateWorkbook', None)
+    second = load_raw_data(template_path)
+
+    assert "Đọc snapshot dữ liệu thô: 50 dòng" in capsys.readouterr().out
+    pd.testing.assert_frame_equal(second, first)
+
+
+def test_touch_keeps_snapshot_and_skips_rehash(template_path, capsys, monkeypatch):
+    write_template(template_path, raw_rows(50))
+    load_raw_data(template_path)
+    stat = os.stat(template_path)
+    os.utime(template_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    capsys.readouterr()
+
+    assert len(load_raw_data(template_path)) == 50
+    assert "Đọc snapshot" in capsys.readouterr().out
+    with open(os.path.join(get_snapshot_dir(template_path), "meta.json"), encoding='utf-8') as f:
+        assert json.load(f)['fingerprint']['mtime_ns'] == stat.st_mtime_ns + 10 ** 9
+
+    # Fingerprint đã cập nhật: size và mtime trùng -> không hash lại file
+    monkeypatch.setattr(report, '_hash_file', lambda path: pytest.fail("file was re-hashed"))
+    assert len(load_raw_data(template_path)) == 50
+
+
+def test_changed_workbook_misses_snapshot(template_path, capsys):
+    write_template(template_path, raw_rows(50))
+    load_raw_data(template_path)
+    rows = raw_rows(50)
+    rows[10][9] = 99.0
+    write_template(template_path, rows)
+    capsys.readouterr()
+
+    df = load_raw_data(template_path)
+
+    assert "Đọc snapshot" not in capsys.readouterr().out
+    assert df['Hours'].max() == 99.0
+    # Lần sau lại đọc từ snapshot mới
+    assert load_raw_data(template_path)['Hours'].max() == 99.0
+    assert "Đọc snapshot" in capsys.readouterr().out
+
+
+def test_old_snapshot_format_is_ignored(template_path, capsys):
+    write_template(template_path, raw_rows(20))
+    load_raw_data(template_path)
+    meta_path = os.path.join(get_snapshot_dir(template_path), "meta.json")
+    with open(meta_path, encoding='utf-8') as f:
+        meta = json.load(f)
+    meta['format_version'] = report.SNAPSHOT_FORMAT_VERSION - 1
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    capsys.readouterr()
+
+    assert len(load_raw_data(template_path)) == 20
+    assert "Đọc snapshot" not in capsys.readouterr().out
+
+
+def test_without_snapshot_nothing_is_written(template_path):
+    write_template(template_path, raw_rows(20))
+    assert len(load_raw_data(template_path, use_snapshot=False)) == 20
+    assert not os.path.exists(get_snapshot_dir(template_path))
@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import (
+    build_hours_cube, distinct_values, latest_date, load_raw_data, load_store, select_rows, sum_hours,
+)
+from conftest import raw_rows, write_template
+
+
+@pytest.fixture
+def store_and_frame(template_path, tmp_path):
+    write_template(template_path, raw_rows(300))
+    store, config = load_store(template_path, db_path=str(tmp_path / "store.sqlite"))
+    return store, load_raw_data(template_path), config
+
+
+def same_rows(actual, expected):
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected.reset_index(drop=True),
+                                  check_categorical=False, check_dtype=False)
+
+
+@pytest.mark.parametrize('years, months, projects', [
+    (None, None, None),
+    ([2024], None, None),
+    (None, ['March', 'July'], None),
+    ([2024], ['January'], ['P001', 'P003']),
+    ([2023], None, None),
+])
+def test_store_filters_match_frame(store_and_frame, years, months, projects):
+    store, df, _ = store_and_frame
+    same_rows(select_rows(store, years, months, projects), select_rows(df, years, months, projects))
+
+
+def test_store_aggregates_match_frame(store_and_frame):
+    store, df, config = store_and_frame
+
+    pd.testing.assert_series_equal(store.sum_hours('Project name'), sum_hours(df, 'Project name'),
+                                   check_index_type=False, check_categorical=False)
+    by_month = store.sum_hours(['Year', 'MonthName'], projects=['P002'])
+    expected = sum_hours(df[df['Project name'] == 'P002'], ['Year', 'MonthName'])
+    assert list(by_month.round(4)) == list(expected)
+    assert sum_hours(store.hours_cube(), 'Workcentre').equals(sum_hours(build_hours_cube(df), 'Workcentre'))
+    assert len(store) == len(df)
+    assert distinct_values(store, 'Project name') == [f"P{i:03d}" for i in range(5)]
+    assert latest_date(store) == df['Date'].max()
+    assert config['year'] == 2024
+
+
+def test_store_is_rebuilt_only_when_source_changes(template_path, tmp_path, capsys):
+    db_path = str(tmp_path / "store.sqlite")
+    write_template(template_path, raw_rows(100))
+    load_store(template_path, db_path=db_path)
+    capsys.readouterr()
+
+    store, _ = load_store(template_path, db_path=db_path)
+    assert "SQLite store" not in capsys.readouterr().out
+    assert len(store) == 100
+
+    write_template(template_path, raw_rows(120))
+    store, _ = load_store(template_path, db_path=db_path)
+    assert "Đã nạp 120 dòng vào SQLite store" in capsys.readouterr().out
+    assert len(store) == 120
@@ -0,0 +1,64 @@
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import (
+    SHEET_ROW_COLUMN, iter_sheet_chunks, load_raw_data, read_raw_data_stream, read_sheet_stream,
+)
+from conftest import RAW_HEADER, raw_rows, write_template
+
+
+def test_stream_matches_pandas_engine(template_path):
+    write_template(template_path, raw_rows(120))
+
+    streamed = load_raw_data(template_path, use_snapshot=False, engine="stream")
+    parsed = load_raw_data(template_path, use_snapshot=False, engine="pandas")
+
+    assert len(streamed) == 120
+    pd.testing.assert_frame_equal(streamed, parsed, check_categorical=False)
+
+
+def test_chunk_size_does_not_change_result(template_path):
+    write_template(template_path, raw_rows(120))
+    whole = read_raw_data_stream(template_path)
+    for chunk_size in (1, 7, 119, 120):
+        pd.testing.assert_frame_equal(read_raw_data_stream(template_path, chunk_size=chunk_size), whole)
+
+
+def test_chunks_skip_blank_rows_and_keep_sheet_row_numbers(template_path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Raw Data'
+    ws.append(RAW_HEADER)
+    rows = raw_rows(6)
+    for i, row in enumerate(rows):
+        ws.append(row[:4] if i == 2 else row)  # dòng thiếu ô ở cuối
+        if i == 3:
+            ws.append([None] * len(RAW_HEADER))
+    wb.save(template_path)
+
+    wb = load_workbook(template_path, read_only=True)
+    chunks = list(iter_sheet_chunks(wb['Raw Data'], chunk_size=4))
+    wb.close()
+
+    assert [len(c) for c in chunks] == [4, 2]
+    frame = pd.concat(chunks)
+    assert list(frame.index) == [2, 3, 4, 5, 7, 8]
+    assert list(frame.columns) == RAW_HEADER
+    assert frame.loc[4, 'Hou'] is None
+    assert frame.loc[8, 'Hou'] == rows[5][9]
+
+
+def test_sheet_rows_are_traced_after_normalizing(template_path):
+    write_template(template_path, raw_rows(10))
+    df = read_raw_data_stream(template_path, chunk_size=3)
+    assert list(df[SHEET_ROW_COLUMN]) == list(range(2, 12))
+
+
+def test_config_sheets_are_read_as_frames(template_path):
+    write_template(template_path, raw_rows(3))
+
+    year_mode = read_sheet_stream(template_path, 'Config_Year_Mode')
+    project_filter = read_sheet_stream(template_path, 'Config_Project_Filter')
+
+    assert year_mode.to_dict('list') == {'Key': ['mode', 'year'], 'Value': ['year', 2024]}
+    assert list(project_filter['Project Name']) == [f"P{i:03d}" for i in range(5)]
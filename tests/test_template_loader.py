@@ -0,0 +1,59 @@
+import pandas as pd
+
+import a04ecaf1_1dae_4c90_8081_086cd7c7b725 as report
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import load_raw_data, load_template, read_configs
+from conftest import raw_rows, write_template
+
+
+def count_workbook_opens(monkeypatch):
+    opened = []
+    real_load_workbook = report.load_workbook
+
+    def load_workbook(*args, **kwargs):
+        opened.append(args[0])
+        return real_load_workbook(*args, **kwargs)
+
+    monkeypatch.setattr(report, 'load_workbook', load_workbook)
+    return opened
+
+
+def test_raw_data_and_config_from_one_open(template_path, monkeypatch):
+    write_template(template_path, raw_rows(40))
+    opened = count_workbook_opens(monkeypatch)
+
+    df, config = load_template(template_path, use_snapshot=False)
+
+    assert opened == [template_path]
+    assert len(df) == 40
+    assert config['mode'] == 'year' and config['year'] == 2024
+    assert list(config['project_filter_df']['Include']) == ['yes'] * 5
+
+
+def test_matches_separate_readers(template_path):
+    write_template(template_path, raw_rows(40))
+
+    df, config = load_template(template_path, use_snapshot=False)
+    expected = read_configs(template_path)
+
+    pd.testing.assert_frame_equal(df, load_raw_data(template_path, use_snapshot=False))
+    assert {k: v for k, v in config.items() if k != 'project_filter_df'} == \
+        {k: v for k, v in expected.items() if k != 'project_filter_df'}
+    pd.testing.assert_frame_equal(config['project_filter_df'], expected['project_filter_df'])
+
+
+def test_snapshot_hit_does_not_open_workbook(template_path, monkeypatch):
+    write_template(template_path, raw_rows(40))
+    load_template(template_path)
+    opened = count_workbook_opens(monkeypatch)
+
+    df, config = load_template(template_path)
+
+    assert opened == []
+    assert len(df) == 40
+    assert config['year'] == 2024
+
+
+def test_missing_template_returns_defaults(tmp_path):
+    df, config = load_template(str(tmp_path / "missing.xlsm"))
+    assert df.empty
+    assert config['mode'] == 'year' and config['months'] == []
@@ -0,0 +1,59 @@
+import os
+import time
+
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import TemplateWatcher
+from conftest import raw_rows, write_template
+
+
+def test_version_changes_only_when_template_changes(template_path):
+    write_template(template_path, raw_rows(10))
+    watcher = TemplateWatcher(template_path)
+    version = watcher.version
+
+    assert not watcher.poll()
+    assert watcher.version == version
+
+    write_template(template_path, raw_rows(11))
+    assert watcher.poll()
+    assert watcher.version != version
+    assert not watcher.poll()
+
+
+def test_touch_is_a_new_version(template_path):
+    # Watcher chỉ dùng os.stat: mtime đổi là phiên bản mới (snapshot vẫn dùng lại nhờ sha256)
+    write_template(template_path, raw_rows(10))
+    watcher = TemplateWatcher(template_path)
+    version = watcher.version
+    stat = os.stat(template_path)
+    os.utime(template_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert watcher.poll()
+    assert watcher.version != version
+
+
+def test_new_workbook_in_directory_changes_version(tmp_path):
+    source = tmp_path / "data"
+    source.mkdir()
+    write_template(str(source / "Time_report_2023.xlsx"), raw_rows(10))
+    watcher = TemplateWatcher(str(source))
+    version = watcher.version
+
+    write_template(str(source / "Time_report_2024.xlsx"), raw_rows(10))
+
+    assert watcher.poll()
+    assert watcher.version != version
+
+
+def test_background_thread_picks_up_changes(template_path):
+    write_template(template_path, raw_rows(10))
+    watcher = TemplateWatcher(template_path, interval=0.05).start()
+    try:
+        version = watcher.version
+        write_template(template_path, raw_rows(12))
+        deadline = time.monotonic() + 5
+        while watcher.version == version and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert watcher.version != version
+        assert watcher.modified_at is not None
+    finally:
+        watcher.stop()
@@ -0,0 +1,46 @@
+from openpyxl import Workbook
+
+from a04ecaf1_1dae_4c90_8081_086cd7c7b725 import (
+    SHEET_ROW_COLUMN, load_raw_data, load_rejected_rows, load_template, missing_column_issues,
+)
+from conftest import RAW_HEADER, raw_rows, write_template
+
+
+def test_missing_required_column_is_reported(template_path, capsys):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Raw Data'
+    hours = RAW_HEADER.index('Hou')
+    ws.append(RAW_HEADER[:hours])
+    for row in raw_rows(20):
+        ws.append(row[:hours])
+    wb.save(template_path)
+
+    df = load_raw_data(template_path)
+
+    assert df.empty
+    rejected = load_rejected_rows(template_path)
+    assert list(rejected['Row']) == [1]
+    assert list(rejected['Severity']) == ['rejected']
+    assert "Missing required column 'Hours'" in rejected['Reason'].iloc[0]
+    assert "Missing required column 'Hours'" in capsys.readouterr().out
+
+
+def test_missing_column_reason_without_header():
+    issues = missing_column_issues([], ['Hours'])
+    assert list(issues['Reason']) == ["Missing required column 'Hours' (all rows rejected; columns found: none)"]
+
+
+def test_duplicate_warnings_keep_sheet_rows(template_path):
+    rows = raw_rows(30)
+    rows[20] = list(rows[3])
+    rows[25] = list(rows[3])
+    write_template(template_path, rows)
+
+    df, _ = load_template(template_path, chunk_size=8)
+
+    duplicates = load_rejected_rows(template_path)
+    duplicates = duplicates[duplicates['Reason'] == "Duplicate row"]
+    # Dòng dữ liệu i nằm ở dòng i + 2 của sheet (dòng 1 là header)
+    assert list(duplicates['Row']) == [22, 27]
+    assert list(df[SHEET_ROW_COLUMN]) == list(range(2, 32))